@@ -2,7 +2,6 @@ import os.path
 import shutil
 import gradio as gr
 import subprocess
-import uuid
 # 延迟导入，避免启动时加载所有依赖
 # from data_preparation_mini import data_preparation_mini
 # from data_preparation_web import data_preparation_web
@@ -26,12 +25,15 @@ def data_preparation(video1, resize_option):
     from data_preparation_mini import data_preparation_mini
     from data_preparation_web import data_preparation_web
     
-    # 处理视频的逻辑
-    video_dir_path = "video_data/{}".format(uuid.uuid4())
-    data_preparation_mini(video1, video_dir_path, resize_option)
-    data_preparation_web(video_dir_path)
+    from talkingface.stage_cache import StageCache
 
-    return "视频处理完成，保存至目录{}".format(video_dir_path)
+    # 处理视频的逻辑：目录名取视频内容哈希，同一视频再次处理时复用已完成的阶段
+    cache = StageCache()
+    video_dir_path = "video_data/{}{}".format(cache.file_hash(video1)[:16], "_resize" if resize_option else "")
+    data_preparation_mini(video1, video_dir_path, resize_option, cache=cache)
+    data_preparation_web(video_dir_path, cache=cache)
+
+    return "视频处理完成，保存至目录{}\n{}".format(video_dir_path, cache.summary())
 
 def demo_mini(audio):
     global video_dir_path
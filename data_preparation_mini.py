@@ -4,10 +4,12 @@ import numpy as np
 import cv2
 import sys
 import os
-import math
 import pickle
 import mediapipe as mp
 import shutil
+from talkingface.keypoint_store import KeypointStore, create_keypoints, save_keypoints
+from talkingface.stage_cache import StageCache
+from talkingface.web_video import WEB_GOP, WEB_CRF, web_encode_args
 
 # 自定义异常类
 class VideoProcessingError(Exception):
@@ -96,8 +98,24 @@ def calc_face_interact(face0, face1):
     return min(tmp0, tmp1)
 
 
+def landmarks_to_array(landmarks, image_width: int, image_height: int) -> np.ndarray:
+    """mediapipe 归一化关键点 -> (478, 3) 像素坐标，取整规则与逐点计算一致"""
+    # 一次遍历写入预分配的缓冲区，不经过逐点的中间列表
+    pts = np.empty((len(landmarks), 3), dtype=np.float64)
+    buf = memoryview(pts).cast("B").cast("d")
+    i = 0
+    for lm in landmarks:
+        buf[i] = lm.x
+        buf[i + 1] = lm.y
+        buf[i + 2] = lm.z
+        i += 3
+    pts *= [image_width, image_height, image_width]
+    np.floor(pts, out=pts)
+    return np.minimum(pts, [image_width - 1, image_height - 1, image_width - 1])
+
+
 def detect_face_mesh(frame: np.ndarray) -> np.ndarray:
-    """面部网格检测"""
+    """面部网格检测（单张图片，每次重新加载模型）"""
     with mp_face_mesh.FaceMesh(
             static_image_mode=True,
             max_num_faces=1,
@@ -106,139 +124,294 @@ def detect_face_mesh(frame: np.ndarray) -> np.ndarray:
     ) as face_mesh:
 
         results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        pts_3d = np.zeros((478, 3))
 
         if not results.multi_face_landmarks:
             raise FaceMeshDetectionError("未检测到面部网格")
 
         image_height, image_width = frame.shape[:2]
-        for idx, landmark in enumerate(results.multi_face_landmarks[0].landmark):
-            pts_3d[idx] = [
-                min(math.floor(landmark.x * image_width), image_width - 1),
-                min(math.floor(landmark.y * image_height), image_height - 1),
-                min(math.floor(landmark.z * image_width), image_width - 1)
-            ]
-        return pts_3d
+        return landmarks_to_array(results.multi_face_landmarks[0].landmark, image_width, image_height)
 
 
-def extract_from_video(
+class FaceMeshTracker:
+    """
+    视频模式的面部网格跟踪器：整段视频复用同一个 FaceMesh 实例。
+    跟踪置信度不低于 min_tracking_confidence 时沿用上一帧的人脸区域，否则 mediapipe 自动重新检测；
+    视频模式仍然丢失人脸时，再用静态模式对当前帧单独检测一次。
+    输入帧尺寸需保持不变（extract_from_video 中为固定的人脸裁剪区域）。
+    """
+
+    def __init__(self, min_detection_confidence: float = 0.5, min_tracking_confidence: float = 0.5):
+        self.min_detection_confidence = min_detection_confidence
+        self.face_mesh = mp_face_mesh.FaceMesh(
+            static_image_mode=False,
+            max_num_faces=1,
+            refine_landmarks=True,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence
+        )
+        self._static_mesh = None
+        self.redetect_count = 0
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = self.face_mesh.process(rgb)
+        if not results.multi_face_landmarks:
+            if self._static_mesh is None:
+                self._static_mesh = mp_face_mesh.FaceMesh(
+                    static_image_mode=True,
+                    max_num_faces=1,
+                    refine_landmarks=True,
+                    min_detection_confidence=self.min_detection_confidence
+                )
+            self.redetect_count += 1
+            results = self._static_mesh.process(rgb)
+            if not results.multi_face_landmarks:
+                raise FaceMeshDetectionError("未检测到面部网格")
+        image_height, image_width = frame.shape[:2]
+        return landmarks_to_array(results.multi_face_landmarks[0].landmark, image_width, image_height)
+
+    def close(self):
+        self.face_mesh.close()
+        if self._static_mesh is not None:
+            self._static_mesh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compute_face_rect(frame: np.ndarray) -> tuple:
+    """根据首帧人脸检测结果计算整段视频固定的人脸裁剪区域 (x_min, y_min, x_max, y_max)"""
+    vid_height, vid_width = frame.shape[:2]
+    try:
+        rect = detect_face(frame, 0.25)
+        x_min = int(rect[0] * vid_width)
+        y_min = int(rect[2] * vid_height)
+        x_max = int(rect[1] * vid_width)
+        y_max = int(rect[3] * vid_height)
+    except FaceDetectionError:
+        # 尝试裁剪后检测
+        cropped = frame[
+                  int(0.1 * vid_height):int(0.9 * vid_height),
+                  int(0.1 * vid_width):int(0.9 * vid_width)
+                  ]
+        try:
+            rect = detect_face(cropped, 0.25)
+        except FaceDetectionError as e:
+            raise FirstFrameFaceDetectionError("首帧人脸检测失败") from e
+
+        # 转换坐标到原图
+        x_min = int(rect[0] * vid_width + 0.1 * vid_width)
+        y_min = int(rect[2] * vid_height + 0.1 * vid_height)
+        x_max = int(rect[1] * vid_width + 0.1 * vid_width)
+        y_max = int(rect[3] * vid_height + 0.1 * vid_height)
+
+    y_mid = (y_min + y_max) / 2.
+    x_mid = (x_min + x_max) / 2.
+    len_ = max(x_max - x_min, y_max - y_min)
+    face_rect = [x_mid - len_, y_mid - len_, x_mid + len_, y_mid + len_]
+    x_min, y_min, x_max, y_max = face_rect
+    seq_w, seq_h = x_max - x_min, y_max - y_min
+    x_mid, y_mid = (x_min + x_max) / 2, (y_min + y_max) / 2
+    crop_size = int(max(seq_w * 1.35, seq_h * 1.35))
+    x_min = int(max(0, x_mid - crop_size * 0.5))
+    y_min = int(max(0, y_mid - crop_size * 0.45))
+    x_max = int(min(vid_width, x_min + crop_size))
+    y_max = int(min(vid_height, y_min + crop_size))
+    return (x_min, y_min, x_max, y_max)
+
+
+PROGRESS_INTERVAL = 25
+
+
+def write_progress(path, done, total):
+    """
+    进度文件（"已完成帧数 总帧数"），供 process_video 批量处理的看板读取。先写临时文件再替换，读取方不会读到半行。
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(f"{done} {total}")
+    os.replace(tmp_path, path)
+
+
+def extract_range(
         video_path: str,
-        output_pkl_path: str
-) -> None:
-    """从视频提取关键点"""
+        output_kps_path: str,
+        face_rect: tuple,
+        start: int,
+        end: int,
+        warmup: int = 0,
+        static_image_mode: bool = False,
+        progress: bool = False,
+        progress_path: str = None
+) -> int:
+    """
+    提取 [start, end) 帧的关键点，直接写入 output_kps_path（KeypointStore，np.memmap），返回实际读取到的最后一帧 +1。
+    从 start - warmup 开始解码，预热帧只用于让跟踪器稳定，不写入结果，避免分块边界处出现跳变。
+    progress_path 不为空时每 PROGRESS_INTERVAL 帧写一次进度。
+    """
+    pts_3d = KeypointStore(output_kps_path, mode="r+")
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise VideoProcessingError("无法打开视频文件")
+    first = max(0, start - warmup)
+    if first > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
 
+    tracker = None if static_image_mode else FaceMeshTracker()
+    x0, y0, x1, y1 = face_rect
+    frame_index = first
     try:
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        vid_width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-        vid_height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-
-        pts_3d = np.zeros((total_frames, 478, 3))
-        face_rect = None
-        for frame_index in tqdm.tqdm(range(total_frames)):
+        frame_range = range(first, end)
+        for frame_index in (tqdm.tqdm(frame_range) if progress else frame_range):
             ret, frame = cap.read()  # 按帧读取视频
             # #到视频结尾时终止
             if ret is False:
-                break
-
-            if frame_index == 0:
-                try:
-                    rect = detect_face(frame, 0.25)
-                    x_min = int(rect[0] * vid_width)
-                    y_min = int(rect[2] * vid_height)
-                    x_max = int(rect[1] * vid_width)
-                    y_max = int(rect[3] * vid_height)
-                except FaceDetectionError:
-                    # 尝试裁剪后检测
-                    cropped = frame[
-                              int(0.1 * vid_height):int(0.9 * vid_height),
-                              int(0.1 * vid_width):int(0.9 * vid_width)
-                              ]
-                    try:
-                        rect = detect_face(cropped, 0.25)
-                    except FaceDetectionError as e:
-                        raise FirstFrameFaceDetectionError("首帧人脸检测失败") from e
-
-                    # 转换坐标到原图
-                    x_min = int(rect[0] * vid_width + 0.1 * vid_width)
-                    y_min = int(rect[2] * vid_height + 0.1 * vid_height)
-                    x_max = int(rect[1] * vid_width + 0.1 * vid_width)
-                    y_max = int(rect[3] * vid_height + 0.1 * vid_height)
-
-                y_mid = (y_min + y_max) / 2.
-                x_mid = (x_min + x_max) / 2.
-                len_ = max(x_max - x_min, y_max - y_min)
-                face_rect = [x_mid - len_, y_mid - len_, x_mid + len_, y_mid + len_]
-                x_min, y_min, x_max, y_max = face_rect
-                seq_w, seq_h = x_max - x_min, y_max - y_min
-                x_mid, y_mid = (x_min + x_max) / 2, (y_min + y_max) / 2
-                crop_size = int(max(seq_w * 1.35, seq_h * 1.35))
-                x_min = int(max(0, x_mid - crop_size * 0.5))
-                y_min = int(max(0, y_mid - crop_size * 0.45))
-                x_max = int(min(vid_width, x_min + crop_size))
-                y_max = int(min(vid_height, y_min + crop_size))
-                face_rect = (x_min, y_min, x_max, y_max)
-
+                return frame_index
             # 裁剪人脸区域
-            x0, y0, x1, y1 = face_rect
             face_region = frame[y0:y1, x0:x1]
-            # print(y_min, y_max, x_min, x_max)
-            # cv2.imshow("s", frame_face)
-            # cv2.waitKey(10)
             try:
-                frame_kps = detect_face_mesh(face_region)
+                frame_kps = detect_face_mesh(face_region) if tracker is None else tracker.process(face_region)
             except FaceMeshDetectionError as e:
                 raise VideoProcessingError(f"第{frame_index}帧面部网格检测失败") from e
-            pts_3d[frame_index] = frame_kps + [x0, y0, 0]
+            if frame_index >= start:
+                pts_3d.write(frame_index, frame_kps + [x0, y0, 0])
+                if progress_path and (frame_index - start + 1) % PROGRESS_INTERVAL == 0:
+                    write_progress(progress_path, frame_index - start + 1, end - start)
+        if progress_path:
+            write_progress(progress_path, end - start, end - start)
+        return end
+    finally:
+        cap.release()  # 释放视频对象
+        if tracker is not None:
+            tracker.close()
+        pts_3d.close()
 
 
+def _extract_range_worker(task):
+    return extract_range(*task)
 
-            # point_size = 1
-            # point_color = (0, 0, 255)  # BGR
-            # thickness = 4  # 0 、4、8
-            # for coor in pts_3d[frame_index]:
-            #     # coor = (coor +1 )/2.
-            #     cv2.circle(frame, (int(coor[0]), int(coor[1])), point_size, point_color, thickness)
-            # cv2.imshow("a", frame)
-            # cv2.waitKey(30)
-        # 保存关键点
-        with open(output_pkl_path, "wb") as f:
-            pickle.dump(pts_3d, f)
+
+def extract_from_video(
+        video_path: str,
+        output_path: str,
+        static_image_mode: bool = False,
+        num_workers: int = None,
+        min_chunk_frames: int = 500,
+        warmup_frames: int = 25,
+        progress_dir: str = None
+) -> np.ndarray:
+    """
+    从视频提取关键点。static_image_mode=True 时逐帧独立检测（旧方式，速度慢，用于对比）。
+    长视频按帧区间切块，由多个进程各自定位解码、跟踪（相邻块重叠 warmup_frames 帧用于跟踪预热），
+    结果由子进程直接写入同一个关键点文件（.kps，np.memmap），不经过父进程序列化。
+    output_path 以 .pkl 结尾时另存为旧的 float64 pickle。
+    num_workers 默认取 CPU 核数，每块不少于 min_chunk_frames 帧；只有一块时在当前进程内执行。
+    progress_dir 不为空时每块在其中写 keypoints_<块号>.txt 进度文件。
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise VideoProcessingError("无法打开视频文件")
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        ret, first_frame = cap.read()
     finally:
-        cap.release()  # 释放视频对象
+        cap.release()
+    if not ret:
+        raise VideoProcessingError("无法读取视频首帧")
+    face_rect = compute_face_rect(first_frame)
+
+    num_workers = num_workers or os.cpu_count() or 1
+    num_chunks = max(1, min(num_workers, total_frames // min_chunk_frames))
+    bounds = np.linspace(0, total_frames, num_chunks + 1).astype(int)
+
+    legacy = output_path.endswith(".pkl")
+    output_kps_path = output_path + ".kps" if legacy else output_path
+    vid_height, vid_width = first_frame.shape[:2]
+    create_keypoints(output_kps_path, total_frames, fps=25, width=vid_width, height=vid_height).close()
+    try:
+        tasks = [(video_path, output_kps_path, face_rect, int(bounds[i]), int(bounds[i + 1]),
+                  warmup_frames, static_image_mode, num_chunks == 1,
+                  os.path.join(progress_dir, f"keypoints_{i}.txt") if progress_dir else None)
+                 for i in range(num_chunks)]
+        if num_chunks == 1:
+            ends = [extract_range(*tasks[0])]
+        else:
+            import multiprocessing
+            # spawn：mediapipe/TFLite 的线程状态不能 fork
+            with multiprocessing.get_context("spawn").Pool(num_chunks) as pool:
+                ends = list(tqdm.tqdm(pool.imap(_extract_range_worker, tasks), total=num_chunks))
+        # 实际可读帧数可能少于 CAP_PROP_FRAME_COUNT，与逐帧读取一致：读不到的帧保持为 0
+        for (_, _, _, start, end, *_), stop in zip(tasks, ends):
+            if stop < end:
+                print(f"视频在第{stop}帧提前结束（区间 {start}-{end}）")
+        pts_3d = KeypointStore(output_kps_path).read().astype(np.float64)
+    finally:
+        if legacy:
+            os.remove(output_kps_path)
+
+    if legacy:
+        # 保存关键点（旧格式）
+        with open(output_path, "wb") as f:
+            pickle.dump(pts_3d, f)
     return pts_3d
 
 
+def check_landmark_parity(video_path: str, max_frames: int = 100) -> dict:
+    """
+    对比跟踪模式与逐帧静态检测的关键点（前 max_frames 帧），返回像素误差统计。
+    """
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        clip_path = os.path.join(tmp_dir, "clip.mp4")
+        cmd = ["ffmpeg", "-i", video_path, "-frames:v", str(max_frames), "-an", "-y", clip_path]
+        subprocess.run(cmd, check=True, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        tracked = extract_from_video(clip_path, os.path.join(tmp_dir, "tracked.pkl"))
+        static = extract_from_video(clip_path, os.path.join(tmp_dir, "static.pkl"), static_image_mode=True)
+    diff = np.linalg.norm(tracked[:, :, :2] - static[:, :, :2], axis=-1)
+    return {"frames": len(diff), "mean_px": float(diff.mean()), "p99_px": float(np.percentile(diff, 99)),
+            "max_px": float(diff.max())}
+
+
+def target_size(input_path: str, resize_option: bool = False) -> tuple:
+    """预处理后视频的宽高；resize_option 时缩放到 720x1280 以内且为偶数"""
+    cap = cv2.VideoCapture(input_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if resize_option:
+        scale = min(720 / width, 1280 / height)
+        # 确保新的宽高为偶数
+        width = int(width * scale) // 2 * 2
+        height = int(height * scale) // 2 * 2
+    return width, height
+
+
 def prepare_video(
         input_path: str,
         output_path: str,
-        resize_option: bool = False
+        resize_option: bool = False,
+        threads: int = None
 ) -> int:
-    # 1 视频转换为25FPS
+    # 1 视频转换为25FPS，按 Web 播放参数编码（直接作为 01.mp4）
     if resize_option:
-        cap = cv2.VideoCapture(input_path)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        scale = min(720 / width, 1280 / height)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        # 确保新的宽高为偶数
-        new_width = new_width //2*2
-        new_height = new_height //2*2
-        cap.release()
+        new_width, new_height = target_size(input_path, resize_option)
         vf_arg = f"scale={new_width}:{new_height}"
         cmd = [
             "ffmpeg", "-i", input_path,
             "-vf", vf_arg,
-            "-r", "25", "-an", "-y", output_path
+            "-r", "25", *web_encode_args(), "-an", "-y", output_path
         ]
     else:
         cmd = [
             "ffmpeg", "-i", input_path,
-            "-r", "25", "-an", "-y", output_path
+            "-r", "25", *web_encode_args(), "-an", "-y", output_path
         ]
+    if threads:
+        # 批量并行时限制每个 ffmpeg 的线程数
+        cmd[-1:-1] = ["-threads", str(threads)]
     try:
         result = subprocess.run(
             cmd,
@@ -252,41 +425,144 @@ def prepare_video(
         raise FFmpegError(f"FFmpeg处理失败: {e.stderr}") from e
 
 
+def prepare_and_extract(
+        input_path: str,
+        output_path: str,
+        output_keypoints_path: str,
+        resize_option: bool = False,
+        threads: int = None,
+        progress_path: str = None
+) -> np.ndarray:
+    """
+    流水线模式：ffmpeg 只解码一次，split 成两路——一路按 Web 播放参数编码为 output_path（25fps），
+    另一路以 bgr24 原始帧写到管道，直接送入关键点跟踪，不再回读 processed.mp4。
+    单进程跟踪；超长视频在多核机器上用 extract_from_video 的分块并行可能更快。
+    """
+    import tempfile
+    width, height = target_size(input_path, resize_option)
+    filters = "fps=25" + (f",scale={width}:{height}" if resize_option else "")
+    cmd = [
+        "ffmpeg", "-loglevel", "error", "-i", input_path,
+        "-filter_complex", f"[0:v]{filters},split=2[enc][raw]",
+        "-map", "[enc]", *web_encode_args(), "-an", "-y", output_path,
+        "-map", "[raw]", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"
+    ]
+    if threads:
+        cmd[1:1] = ["-threads", str(threads)]
+    frame_bytes = width * height * 3
+    frames_kps = []
+    # stderr 写临时文件，避免管道写满阻塞 ffmpeg
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        tracker = FaceMeshTracker()
+        finished = False
+        try:
+            face_rect = None
+            with tqdm.tqdm() as progress:
+                while True:
+                    buf = proc.stdout.read(frame_bytes)
+                    if len(buf) < frame_bytes:
+                        break
+                    frame = np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3)
+                    if face_rect is None:
+                        face_rect = compute_face_rect(frame)
+                    x0, y0, x1, y1 = face_rect
+                    try:
+                        frame_kps = tracker.process(frame[y0:y1, x0:x1])
+                    except FaceMeshDetectionError as e:
+                        raise VideoProcessingError(f"第{len(frames_kps)}帧面部网格检测失败") from e
+                    frames_kps.append(frame_kps + [x0, y0, 0])
+                    progress.update(1)
+                    if progress_path and len(frames_kps) % PROGRESS_INTERVAL == 0:
+                        # 管道模式不知道总帧数，总数记 0
+                        write_progress(progress_path, len(frames_kps), 0)
+            finished = True
+        finally:
+            tracker.close()
+            proc.stdout.close()
+            if not finished:
+                # 跟踪出错：结束 ffmpeg，保留原异常
+                proc.kill()
+                proc.wait()
+        if proc.wait() != 0 or not frames_kps:
+            stderr_file.seek(0)
+            raise FFmpegError(f"FFmpeg处理失败: {stderr_file.read().decode(errors='ignore')}")
+
+    pts_3d = np.stack(frames_kps)
+    # 保存关键点
+    if output_keypoints_path.endswith(".pkl"):
+        with open(output_keypoints_path, "wb") as f:
+            pickle.dump(pts_3d, f)
+    else:
+        save_keypoints(output_keypoints_path, pts_3d, fps=25, width=width, height=height)
+    return pts_3d
+
 
-def data_preparation_mini(input_video, video_dir_path, resize_option = False):
+def data_preparation_mini(input_video, video_dir_path, resize_option = False, pipeline = False, cache = None,
+                          num_workers = None, progress_dir = None):
+    """
+    pipeline=True 时转码与关键点提取共用一次解码（prepare_and_extract），否则先转码再分块并行提取。
+    cache 为 StageCache：输入视频和参数未变化时跳过转码/关键点阶段；None 时新建一个。
+    num_workers 限制 ffmpeg 线程数和关键点提取的进程数（默认 CPU 核数）；progress_dir 用于写进度文件。
+    """
     # 检测系统环境是否有ffmpeg
     if not shutil.which("ffmpeg"):
         raise EnvironmentError("FFmpeg未安装或不在PATH中，请安装ffmpeg并设置为环境变量")
+    if cache is None:
+        cache = StageCache()
 
     # 创建输出目录
     data_dir = os.path.join(video_dir_path, "data")
     os.makedirs(data_dir, exist_ok=True)
 
-    # 预处理视频
     output_video = os.path.join(data_dir, "processed.mp4")
-    prepare_video(input_video, output_video, resize_option = resize_option)
-
-    # 提取关键点
-    output_pkl = output_video.replace(".mp4", ".pkl")
-    extract_from_video(output_video, output_pkl)
+    # 关键点保存为 processed.kps（int16 量化 + memmap 读取）
+    output_kps = output_video.replace(".mp4", ".kps")
+    if pipeline:
+        progress_path = os.path.join(progress_dir, "keypoints_0.txt") if progress_dir else None
+        cache.run("prepare_extract",
+                  lambda: prepare_and_extract(input_video, output_video, output_kps, resize_option = resize_option,
+                                              threads = num_workers, progress_path = progress_path),
+                  inputs=[input_video], outputs=[output_video, output_kps],
+                  params={"resize_option": resize_option, "fps": 25, "gop": WEB_GOP, "crf": WEB_CRF})
+    else:
+        # 预处理视频
+        cache.run("transcode",
+                  lambda: prepare_video(input_video, output_video, resize_option = resize_option, threads = num_workers),
+                  inputs=[input_video], outputs=[output_video],
+                  params={"resize_option": resize_option, "fps": 25, "gop": WEB_GOP, "crf": WEB_CRF})
+
+        # 提取关键点
+        cache.run("keypoints",
+                  lambda: extract_from_video(output_video, output_kps, num_workers=num_workers, progress_dir=progress_dir),
+                  inputs=[output_video], outputs=[output_kps], params={"landmarks": "mediapipe478", "dtype": "int16"})
     result = {
         "status": "success",
         "output_video": output_video,
-        "output_pkl": output_pkl
+        "output_keypoints": output_kps
     }
     return result
 
 def main():
+    # 对比跟踪模式与逐帧检测的关键点差异
+    if len(sys.argv) == 3 and sys.argv[1] == "--check-parity":
+        print(check_landmark_parity(sys.argv[2]))
+        return
+    pipeline = "--pipeline" in sys.argv
+    force = "--force" in sys.argv
+    argv = [a for a in sys.argv if a not in ("--pipeline", "--force")]
     # 检查命令行参数的数量
-    if len(sys.argv) != 3:
-        print("Usage: python data_preparation_mini.py <静默视频> <输出文件夹位置>")
+    if len(argv) != 3:
+        print("Usage: python data_preparation_mini.py [--pipeline] [--force] <静默视频> <输出文件夹位置>")
         sys.exit(1)  # 参数数量不正确时退出程序
 
     # 获取video_name参数
-    video = sys.argv[1]
-    video_dir_path = sys.argv[2]
+    video = argv[1]
+    video_dir_path = argv[2]
     print(f"Video dir path is set to: {video_dir_path}")
-    data_preparation_mini(video, video_dir_path)
+    cache = StageCache(enabled=not force)
+    data_preparation_mini(video, video_dir_path, pipeline=pipeline, cache=cache)
+    cache.print_summary()
     print("Done!")
 
 
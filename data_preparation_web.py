@@ -5,41 +5,137 @@ import cv2
 import sys
 import os
 import gzip
+import subprocess
 from talkingface.data.few_shot_dataset import get_image
 import shutil
-from talkingface.utils import crop_mouth, main_keypoints_index, smooth_array,normalizeLips
+from talkingface.utils import crop_mouth, crop_mouth_batch, main_keypoints_index, smooth_array,normalizeLips
 import json
 from mini_live.obj.wrap_utils import index_wrap, index_edge_wrap
 import pickle
 from talkingface.models.DINet_mini import model_size
+from talkingface.keypoint_store import load_keypoints, keypoint_path
+from talkingface.stage_cache import StageCache
+from talkingface.character_data import CharacterData, save_character_data
+from talkingface.web_video import WEB_GOP, WEB_CRF, web_encode_args
+
+RENDER_CHECKPOINT = "checkpoint/DINet_mini/epoch_40.pth"
+
+# 低分辨率版本的高度，只生成低于原视频高度的；网页按设备能力选择
+WEB_RENDITIONS = (720, 480)
+
 
 def step0_keypoints(video_path, out_path):
-    Path_output_pkl = video_path + "/processed.pkl"
-    with open(Path_output_pkl, "rb") as f:
-        pts_3d = pickle.load(f)
+    # processed.kps（旧数据为 processed.pkl）
+    pts_3d = load_keypoints(video_path + "/processed.pkl").astype(np.float64)
 
     pts_3d = pts_3d.reshape(len(pts_3d), -1)
     smooth_array_ = smooth_array(pts_3d, weight=[0.02, 0.09, 0.78, 0.09, 0.02])
     pts_3d = smooth_array_.reshape(len(pts_3d), 478, 3)
 
-    video_path = os.path.join(video_path, "processed.mp4")
+    vid_width, vid_height = video_size(os.path.join(video_path, "processed.mp4"))
+    return pts_3d,vid_width,vid_height
+
+def video_size(video_path):
     cap = cv2.VideoCapture(video_path)
-    vid_width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)  # 宽度
-    vid_height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)  # 高度
+    vid_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))  # 宽度
+    vid_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))  # 高度
     cap.release()
-    out_path = os.path.join(out_path, "01.mp4")
+    return vid_width, vid_height
+
+def web_rendition_sizes(vid_width, vid_height, heights=WEB_RENDITIONS):
+    """
+    低分辨率版本的 (文件名, 宽, 高)，宽按比例取偶数
+    """
+    sizes = []
+    for height in sorted(set(heights), reverse=True):
+        if height < vid_height:
+            sizes.append((f"01_{height}p.mp4", int(round(vid_width * height / vid_height / 2)) * 2, height))
+    return sizes
+
+def scale_rects(rects, scale_x, scale_y):
+    """
+    裁剪框换算到低分辨率视频：左上角和宽高分别取整，保证各帧框的宽高一致
+    """
+    rects = np.asarray(rects)
+    x0 = np.round(rects[:, 0] * scale_x)
+    y0 = np.round(rects[:, 1] * scale_y)
+    w = np.round((rects[:, 2] - rects[:, 0]) * scale_x)
+    h = np.round((rects[:, 3] - rects[:, 1]) * scale_y)
+    return np.stack([x0, y0, x0 + w, y0 + h], axis=1).astype(int)
+
+def moov_before_mdat(mp4_path):
+    """
+    检查 mp4 顶层 box 的顺序：moov 在 mdat 之前时浏览器拿到文件头就能开始解析（faststart）
+    """
+    with open(mp4_path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return False
+            size = int.from_bytes(header[:4], "big")
+            box_type = header[4:8]
+            if box_type == b"moov":
+                return True
+            if box_type == b"mdat":
+                return False
+            if size == 1:
+                size = int.from_bytes(f.read(8), "big") - 8
+            elif size == 0:
+                return False
+            f.seek(size - 8, 1)
+
+def package_web_video(src, dst, size=None, gop=WEB_GOP, crf=WEB_CRF):
+    """
+    编码为 Web 播放用的 H.264 mp4（低分辨率版本）；size=(宽, 高) 时缩放
+    """
+    cmd = ["ffmpeg", "-loglevel", "error", "-i", src]
+    if size is not None:
+        cmd += ["-vf", f"scale={size[0]}:{size[1]}"]
+    cmd += web_encode_args(gop, crf) + ["-an", "-y", dst]
+    result = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg处理失败: {result.stderr}")
+
+def step0_web_video(video_path, out_path, renditions=WEB_RENDITIONS, package=True):
+    """
+    01.mp4 直接硬链接 processed.mp4（预处理时已按 Web 参数编码，不再重新编码），
+    再生成低分辨率版本，打印各文件大小。package=False 时不生成低分辨率版本。
+    """
+    src = os.path.join(video_path, "processed.mp4")
+    dst = os.path.join(out_path, "01.mp4")
+    # 优先硬链接，避免再复制一遍视频
+    if os.path.exists(dst):
+        os.remove(dst)
     try:
-        # 复制文件
-        shutil.copy(video_path, out_path)
-        print(f"视频已成功复制到 {out_path}")
-    except Exception as e:
-        print(f"复制文件时出错: {e}")
-    return pts_3d,vid_width,vid_height
-
-def step1_crop_mouth(pts_3d, vid_width, vid_height):
-    list_source_crop_rect = [crop_mouth(source_pts[main_keypoints_index], vid_width, vid_height) for source_pts in
-                             pts_3d]
-    list_source_crop_rect = np.array(list_source_crop_rect).reshape(len(pts_3d), -1)
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+    print(f"视频已成功复制到 {dst}")
+    if not package:
+        return
+
+    vid_width, vid_height = video_size(src)
+    outputs = [(dst, vid_width, vid_height)]
+    for name, width, height in web_rendition_sizes(vid_width, vid_height, renditions):
+        package_web_video(src, os.path.join(out_path, name), (width, height))
+        outputs.append((os.path.join(out_path, name), width, height))
+    print(f"processed.mp4: {os.path.getsize(src) / 1e6:.2f}MB")
+    for path, width, height in outputs:
+        print(f"{os.path.basename(path)}: {width}x{height} {os.path.getsize(path) / 1e6:.2f}MB "
+              f"faststart={moov_before_mdat(path)}")
+
+def standardize_vertices(pts_3d, crop_rects, resize):
+    """
+    get_image(..., input_type="mediapipe") 的批量版本：[N, 478, 3] 关键点投影到各帧裁剪框的标准尺寸坐标
+    """
+    pts = pts_3d - np.array([0, 0, 1]) * np.max(pts_3d[:, :, 2:3], axis=1, keepdims=True)
+    offset = np.zeros([len(crop_rects), 1, 3])
+    offset[:, 0, :2] = crop_rects[:, :2]
+    size_x = (crop_rects[:, 2] - crop_rects[:, 0])[:, np.newaxis, np.newaxis]
+    return (pts - offset) * resize / size_x
+
+def step1_crop_mouth(pts_3d, vid_width, vid_height, verbose=False):
+    list_source_crop_rect = crop_mouth_batch(pts_3d[:, main_keypoints_index], vid_width, vid_height)
     face_size = (list_source_crop_rect[:,2] - list_source_crop_rect[:,0]).mean()/2.0 + (list_source_crop_rect[:,3] - list_source_crop_rect[:,1]).mean()/2.0
     face_size = int(face_size)//2 * 2
     face_mid = (list_source_crop_rect[:,2:] + list_source_crop_rect[:,0:2])/2.
@@ -55,19 +151,19 @@ def step1_crop_mouth(pts_3d, vid_width, vid_height):
     # import pandas as pd
     # pd.DataFrame(list_source_crop_rect).to_csv("sss.csv")
 
-    standard_size = model_size
-    list_standard_v = []
-    for frame_index in range(len(list_source_crop_rect)):
-        source_pts = pts_3d[frame_index]
-        source_crop_rect = list_source_crop_rect[frame_index]
-        print(source_crop_rect)
-        standard_v = get_image(source_pts, source_crop_rect, input_type="mediapipe", resize=standard_size)
+    if verbose:
+        for source_crop_rect in list_source_crop_rect:
+            print(source_crop_rect)
 
-        list_standard_v.append(standard_v)
+    standard_size = model_size
+    list_standard_v = standardize_vertices(pts_3d, list_source_crop_rect, standard_size)
 
     return list_source_crop_rect, list_standard_v
 
-def generate_combined_data(list_source_crop_rect, list_standard_v, video_path, out_path):
+def generate_combined_data(list_source_crop_rect, list_standard_v, video_path, out_path, renditions=()):
+    """
+    renditions 为 web_rendition_sizes 的结果，写入原视频和各低分辨率视频对应的裁剪框
+    """
     from mini_live.obj.obj_utils import generateRenderInfo, generateWrapModel
     from talkingface.run_utils import calc_face_mat
     from mini_live.obj.wrap_utils import newWrapModel
@@ -93,11 +189,9 @@ def generate_combined_data(list_source_crop_rect, list_standard_v, video_path, o
 
     # Step 3: Generate ref_data.txt data
     renderModel_mini = RenderModel_Mini()
-    renderModel_mini.loadModel("checkpoint/DINet_mini/epoch_40.pth")
+    renderModel_mini.loadModel(RENDER_CHECKPOINT)
 
-    Path_output_pkl = "{}/processed.pkl".format(video_path)
-    with open(Path_output_pkl, "rb") as f:
-        ref_images_info = pickle.load(f)
+    keypoints_path = "{}/processed.pkl".format(video_path)
 
     video_path = "{}/processed.mp4".format(video_path)
     cap = cv2.VideoCapture(video_path)
@@ -112,7 +206,8 @@ def generate_combined_data(list_source_crop_rect, list_standard_v, video_path, o
     ret, frame = cap.read()
     cap.release()
     frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-    source_pts = ref_images_info[frame_index]
+    # 只读取参考帧的关键点
+    source_pts = load_keypoints(keypoints_path, frames=[frame_index])[0]
     source_crop_rect = crop_mouth(source_pts[main_keypoints_index], vid_width_ref, vid_height_ref)
 
     standard_img = get_image(frame, source_crop_rect, input_type="image", resize=standard_size)
@@ -136,14 +231,19 @@ def generate_combined_data(list_source_crop_rect, list_standard_v, video_path, o
         "authorized": False,
     }
 
-    for frame_index in range(len(list_source_crop_rect)):
-        source_crop_rect = list_source_crop_rect[frame_index]
-        standard_v = list_standard_v[frame_index]
-
-        standard_v = standard_v[index_wrap, :2].flatten().tolist()
-        mat = mat_list[frame_index].T.flatten().tolist()
-        standard_v_rounded = [round(i, 5) for i in mat] + [round(i, 1) for i in standard_v]
-        combined_data["json_data"].append({"rect": source_crop_rect.tolist(), "points": standard_v_rounded})
+    # 整批取 index_wrap、转置矩阵并取整，再逐帧转成列表
+    num_frames = len(list_source_crop_rect)
+    mats = np.round(np.array(mat_list).transpose(0, 2, 1).reshape(num_frames, 16), 5)
+    verts = np.round(np.asarray(list_standard_v)[:, index_wrap, :2].reshape(num_frames, -1), 1)
+    points = np.concatenate([mats, verts], axis=1).tolist()
+    rects = np.asarray(list_source_crop_rect).tolist()
+    combined_data["json_data"] = [{"rect": rect, "points": pts} for rect, pts in zip(rects, points)]
+    if renditions:
+        # 第一项为原视频，网页按设备能力从中选择
+        combined_data["renditions"] = [
+            {"file": name, "width": width, "height": height,
+             "rects": scale_rects(list_source_crop_rect, width / vid_width_ref, height / vid_height_ref).tolist()}
+            for name, width, height in [("01.mp4", vid_width_ref, vid_height_ref)] + list(renditions)]
 
     # with open(os.path.join(out_path, "combined_data.json"), "w") as f:
     #     json.dump(combined_data, f)
@@ -153,24 +253,51 @@ def generate_combined_data(list_source_crop_rect, list_standard_v, video_path, o
     with gzip.open(output_file, 'wt', encoding='UTF-8') as f:
         json.dump(combined_data, f)
 
-def data_preparation_web(path):
+    # 二进制格式，内容与 json 相同，体积更小、解析更快
+    save_character_data(os.path.join(out_path, "combined_data.bin.gz"), CharacterData.from_json_dict(combined_data))
+
+def data_preparation_web(path, verbose=False, cache=None, renditions=WEB_RENDITIONS, package=True):
+    """
+    cache 为 StageCache：输入未变化时跳过视频打包（web_video）和人物数据（web_data）阶段；None 时新建一个。
+    renditions 为低分辨率版本的高度；01.mp4 始终直接使用 processed.mp4，package=False 时不生成低分辨率版本。
+    """
     video_path = os.path.join(path, "data")
     out_path = os.path.join(path, "assets")
     os.makedirs(out_path, exist_ok=True)
-    pts_3d, vid_width,vid_height = step0_keypoints(video_path, out_path)
-    list_source_crop_rect, list_standard_v = step1_crop_mouth(pts_3d, vid_width, vid_height)
-    generate_combined_data(list_source_crop_rect, list_standard_v, video_path, out_path)
+    if cache is None:
+        cache = StageCache()
+    processed_mp4 = os.path.join(video_path, "processed.mp4")
+    rendition_sizes = web_rendition_sizes(*video_size(processed_mp4), renditions) if package else []
+
+    cache.run("web_video", lambda: step0_web_video(video_path, out_path, renditions, package),
+              inputs=[processed_mp4],
+              outputs=[os.path.join(out_path, "01.mp4")] + [os.path.join(out_path, i[0]) for i in rendition_sizes],
+              params={"package": package, "gop": WEB_GOP, "crf": WEB_CRF, "renditions": rendition_sizes})
+
+    def run():
+        pts_3d, vid_width,vid_height = step0_keypoints(video_path, out_path)
+        list_source_crop_rect, list_standard_v = step1_crop_mouth(pts_3d, vid_width, vid_height, verbose=verbose)
+        generate_combined_data(list_source_crop_rect, list_standard_v, video_path, out_path, rendition_sizes)
+
+    cache.run("web_data", run,
+              inputs=[processed_mp4, keypoint_path(os.path.join(video_path, "processed.pkl")), RENDER_CHECKPOINT],
+              outputs=[os.path.join(out_path, "combined_data.json.gz"), os.path.join(out_path, "combined_data.bin.gz")],
+              params={"renditions": rendition_sizes})
 
 def main():
+    package = "--no-package" not in sys.argv
+    argv = [a for a in sys.argv if a != "--no-package"]
     # 检查命令行参数的数量
-    if len(sys.argv) != 2:
-        print("Usage: python data_preparation_web.py <video_dir_path>")
+    if len(argv) != 2:
+        print("Usage: python data_preparation_web.py [--no-package] <video_dir_path>")
         sys.exit(1)  # 参数数量不正确时退出程序
 
     # 获取video_name参数
-    video_dir_path = sys.argv[1]
+    video_dir_path = argv[1]
 
-    data_preparation_web(video_dir_path)
+    cache = StageCache()
+    data_preparation_web(video_dir_path, cache=cache, package=package)
+    cache.print_summary()
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,5 @@
 import os
 import uuid
-import gzip
-import json
 import cv2
 import numpy as np
 import sys
@@ -11,6 +9,7 @@ from talkingface.data.few_shot_dataset import get_image
 from mini_live.render import create_render_model
 from talkingface.models.DINet_mini import input_height,input_width
 from talkingface.model_utils import device
+from talkingface.character_data import load_character_data
 
 from talkingface.models.DINet_mini import model_size
 
@@ -31,19 +30,14 @@ def interface_mini(path, wav_path, output_video_path):
     out_size = (out_w, out_h)
     renderModel_gl = create_render_model((out_w, out_h), floor=20)
 
-    # 读取 Gzip 压缩的 JSON 文件
-    combined_data_path = os.path.join(path, "combined_data.json.gz")
+    # 读取人物数据（优先 combined_data.bin.gz，兼容 combined_data.json.gz）
     try:
-        with gzip.open(combined_data_path, 'rt', encoding='UTF-8') as f:
-            combined_data = json.load(f)
+        character = load_character_data(path)
     except Exception as e:
-        print(f"读取combined_data.json.gz文件失败: {e}")
+        print(f"读取人物数据失败: {e}")
         return
 
-    # 从 combined_data 中提取数据
-    face3D_obj = combined_data["face3D_obj"]
-    json_data = combined_data["json_data"]
-    ref_data = np.array(combined_data["ref_data"], dtype=np.float32).reshape([1, 20, input_height//4, input_width//4])
+    ref_data = character.ref_data.reshape([1, 20, input_height//4, input_width//4])
 
     # 设置 ref_data 到渲染模型
     renderModel_mini.net.infer_model.ref_in_feature = torch.from_numpy(ref_data).float().to(device)
@@ -62,11 +56,11 @@ def interface_mini(path, wav_path, output_video_path):
     list_standard_v = []
 
     # 处理每一帧
-    for frame_index in range(min(vid_frame_count, len(json_data))):
+    for frame_index in range(min(vid_frame_count, character.frame_num)):
         ret, frame = cap.read()
         frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-        standard_v = json_data[frame_index]["points"][16:]
-        source_crop_rect = json_data[frame_index]["rect"]
+        standard_v = character.verts[frame_index]
+        source_crop_rect = character.rects[frame_index].tolist()
 
         standard_img = get_image(frame, source_crop_rect, input_type="image", resize=standard_size)
 
@@ -77,7 +71,7 @@ def interface_mini(path, wav_path, output_video_path):
     cap.release()
 
     # 生成矩阵列表
-    mat_list = [np.array(i["points"][:16]).reshape(4, 4) * 2 for i in json_data]
+    mat_list = list(character.mats.astype(np.float64).reshape(-1, 4, 4) * 2)
 
     # 反转列表中的数据
     list_video_img_reversed = list_video_img[::-1]
@@ -93,17 +87,8 @@ def interface_mini(path, wav_path, output_video_path):
     list_standard_v = list_standard_v + list_standard_v_reversed
     mat_list = mat_list + mat_list_reversed
 
-    # 解析 face3D.obj 数据
-    v_ = []
-    for line in face3D_obj:
-        if line.startswith("v "):
-            v0, v1, v2, v3, v4 = line[2:].split()
-            v_.append(float(v0))
-            v_.append(float(v1))
-            v_.append(float(v2))
-            v_.append(float(v3))
-            v_.append(float(v4))
-    face_wrap_entity = np.array(v_).reshape(-1, 5)
+    # face3D.obj 顶点
+    face_wrap_entity = character.mesh_v.astype(np.float64)
 
     # 生成 VBO
     renderModel_gl.GenVBO(face_wrap_entity)
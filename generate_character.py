@@ -16,7 +16,7 @@ import os
 import shutil
 from pathlib import Path
 
-def generate_character(input_video, output_name, web_folder_name=None):
+def generate_character(input_video, output_name, web_folder_name=None, force=False):
     """
     从视频生成完整的人物数据
     
@@ -24,6 +24,7 @@ def generate_character(input_video, output_name, web_folder_name=None):
         input_video: 输入视频文件路径
         output_name: 输出目录名称（在video_data下）
         web_folder_name: Web资源文件夹名称（默认与output_name相同）
+        force: 忽略阶段缓存，全部重新执行
     """
     if web_folder_name is None:
         web_folder_name = output_name
@@ -54,9 +55,12 @@ def generate_character(input_video, output_name, web_folder_name=None):
         print("步骤1: 预处理视频...")
         print("=" * 60)
         from data_preparation_mini import data_preparation_mini
+        from talkingface.stage_cache import StageCache
         
+        # 输入未变化的阶段直接跳过，中途失败后重跑会从失效的阶段继续
+        cache = StageCache(enabled=not force)
         video_dir_path = f"video_data/{output_name}"
-        result = data_preparation_mini(input_video, video_dir_path)
+        result = data_preparation_mini(input_video, video_dir_path, cache=cache)
         
         if result.get("status") != "success":
             print("❌ 步骤1失败！")
@@ -64,7 +68,7 @@ def generate_character(input_video, output_name, web_folder_name=None):
         
         print("✅ 步骤1完成！")
         print(f"   输出视频: {result['output_video']}")
-        print(f"   输出数据: {result['output_pkl']}")
+        print(f"   输出数据: {result['output_keypoints']}")
         
         # 步骤2：生成Web资源
         print("\n" + "=" * 60)
@@ -72,7 +76,7 @@ def generate_character(input_video, output_name, web_folder_name=None):
         print("=" * 60)
         from data_preparation_web import data_preparation_web
         
-        data_preparation_web(video_dir_path)
+        data_preparation_web(video_dir_path, cache=cache)
         
         # 检查输出文件
         assets_dir = f"{video_dir_path}/assets"
@@ -101,7 +105,12 @@ def generate_character(input_video, output_name, web_folder_name=None):
         
         # 复制文件
         shutil.copy(mp4_path, f"{web_dir}/01.mp4")
+        # 低分辨率版本 01_<高度>p.mp4
+        for rendition in sorted(Path(assets_dir).glob("01_*p.mp4")):
+            shutil.copy(rendition, f"{web_dir}/{rendition.name}")
         shutil.copy(json_path, f"{web_dir}/combined_data.json.gz")
+        if os.path.exists(f"{assets_dir}/combined_data.bin.gz"):
+            shutil.copy(f"{assets_dir}/combined_data.bin.gz", f"{web_dir}/combined_data.bin.gz")
         
         print("✅ 步骤3完成！")
         print(f"   Web目录: {web_dir}")
@@ -120,6 +129,7 @@ def generate_character(input_video, output_name, web_folder_name=None):
         print("\n" + "=" * 60)
         print("✅ 所有步骤完成！")
         print("=" * 60)
+        cache.print_summary()
         print(f"Web资源已保存到: {web_dir}")
         print(f"下一步: 修改HTML文件并刷新浏览器")
         print("=" * 60)
@@ -139,22 +149,25 @@ def generate_character(input_video, output_name, web_folder_name=None):
 
 def main():
     """主函数"""
-    if len(sys.argv) < 3:
-        print("用法: python generate_character.py <输入视频> <输出名称> [Web文件夹名称]")
+    force = "--force" in sys.argv
+    argv = [a for a in sys.argv if a != "--force"]
+    if len(argv) < 3:
+        print("用法: python generate_character.py [--force] <输入视频> <输出名称> [Web文件夹名称]")
         print("\n参数说明:")
         print("  输入视频: 要处理的视频文件路径")
         print("  输出名称: 输出目录名称（在video_data下）")
         print("  Web文件夹名称: Web资源文件夹名称（可选，默认与输出名称相同）")
+        print("  --force: 忽略阶段缓存，全部重新执行")
         print("\n示例:")
         print("  python generate_character.py person.mp4 person_001")
         print("  python generate_character.py person.mp4 person_001 my_character")
         sys.exit(1)
     
-    input_video = sys.argv[1]
-    output_name = sys.argv[2]
-    web_folder_name = sys.argv[3] if len(sys.argv) > 3 else None
+    input_video = argv[1]
+    output_name = argv[2]
+    web_folder_name = argv[3] if len(argv) > 3 else None
     
-    success = generate_character(input_video, output_name, web_folder_name)
+    success = generate_character(input_video, output_name, web_folder_name, force)
     
     if not success:
         sys.exit(1)
@@ -0,0 +1,413 @@
+"""
+服务端渲染：为无法运行 WebGL + 端侧推理的客户端（kiosk、WebView）在服务器上合成数字人视频。
+
+由 TTS 音频驱动 Audio2bs 得到口型系数，用 RenderModel_gl 渲染网格、RenderModel_Mini 推理嘴部，
+再贴回人物 01.mp4 的原始帧，编码成 JPEG（MJPEG over WebSocket）推送给客户端。
+所有会话共享一个渲染线程：每个 tick 收集各会话到期的帧，按截止时间排序，嘴部推理按 batch 一次完成。
+
+过载时按会话分级降级（DEGRADE_*）：先跳过闭嘴/静音帧的推理，再隔帧重复上一帧，最后降低输出分辨率。
+帧的 pts 始终由时钟决定，降级只改变画面内容，不会让音视频错位。
+"""
+import os
+import time
+import queue
+import base64
+import struct
+import threading
+import asyncio
+import io
+import logging
+
+import cv2
+import numpy as np
+import soundfile
+import torch
+from scipy.signal import resample
+
+from talkingface.model_utils import LoadAudioModel, Audio2bs_pcm, device
+from talkingface.data.few_shot_dataset import get_image
+from talkingface.models.DINet_mini import input_height, input_width, model_size
+from talkingface.character_data import load_character_data
+
+logger = logging.getLogger(__file__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+FPS = 25
+
+# 降级级别
+DEGRADE_NONE = 0
+DEGRADE_SKIP_SILENT = 1     # 闭嘴/静音帧不做推理，直接用原视频帧
+DEGRADE_REPEAT = 2          # 说话帧隔帧推理，其余重复上一帧
+DEGRADE_LOW_RES = 3         # 输出分辨率减半
+LOW_RES_SCALE = 0.5
+
+# Audio2bs_pcm 按 16k 输入计算；口型输出比音频晚 5 帧（即 demo_mini 中的 [5:]）
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_DELAY_FRAMES = 5
+
+
+class CharacterAssets:
+    """
+    人物素材：01.mp4 原始帧、裁剪框、标准化人脸图、顶点、矩阵（正放+倒放拼接成循环）以及参考特征。
+    读取方式与 demo_mini.interface_mini 相同。
+    """
+
+    def __init__(self, path, standard_size=model_size * 2):
+        self.path = path
+        self.standard_size = standard_size
+        character = load_character_data(path)
+        self.ref_data = torch.from_numpy(character.ref_data.reshape(
+            [1, 20, input_height // 4, input_width // 4])).float().to(device)
+
+        cap = cv2.VideoCapture(os.path.join(path, "01.mp4"))
+        vid_frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        video_img, rects, standard_img, standard_v = [], [], [], []
+        for frame_index in range(min(vid_frame_count, character.frame_num)):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
+            rect = character.rects[frame_index].tolist()
+            video_img.append(frame)
+            rects.append(rect)
+            standard_img.append(cv2.resize(get_image(frame, rect, input_type="image", resize=standard_size),
+                                           (model_size, model_size)))
+            standard_v.append(character.verts[frame_index] * 2)
+        cap.release()
+        mats = list(character.mats[:len(video_img)].astype(np.float64).reshape(-1, 4, 4) * 2)
+
+        # 正放 + 倒放，保证循环无跳变
+        self.video_img = video_img + video_img[::-1]
+        self.rects = rects + rects[::-1]
+        self.standard_img = standard_img + standard_img[::-1]
+        self.standard_v = standard_v + standard_v[::-1]
+        self.mats = mats + mats[::-1]
+        self.num_frames = len(self.mats)
+
+        self.face_wrap_entity = character.mesh_v.astype(np.float64)
+
+        # 空闲帧（不说话）直接使用原视频帧，预先编码
+        self._idle_jpeg = {}
+
+    def idle_jpeg(self, source_index, quality, scale=1.0):
+        key = (source_index, scale)
+        jpeg = self._idle_jpeg.get(key)
+        if jpeg is None:
+            jpeg = encode_jpeg(scale_image(self.video_img[source_index][:, :, :3], scale), quality)
+            self._idle_jpeg[key] = jpeg
+        return jpeg
+
+
+_characters = {}
+_characters_lock = threading.Lock()
+
+
+def load_character(path):
+    with _characters_lock:
+        character = _characters.get(path)
+    if character is None:
+        character = CharacterAssets(path)
+        with _characters_lock:
+            character = _characters.setdefault(path, character)
+    return character
+
+
+def scale_image(rgb, scale):
+    if scale == 1.0:
+        return rgb
+    return cv2.resize(rgb, (int(rgb.shape[1] * scale), int(rgb.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+
+
+def encode_jpeg(rgb, quality):
+    ok, buf = cv2.imencode(".jpg", rgb[:, :, ::-1], [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buf.tobytes()
+
+
+def audio_to_bs(samples, sample_rate, audio_model):
+    """
+    一段 TTS 音频 -> 口型系数，帧数与音频时长一致（round(时长 * FPS)）。
+    每段单独推理：末尾补静音再去掉开头的延迟帧，否则每段最后 200ms 没有口型；
+    多补 1 帧抵消 fbank 末帧的窗长。
+    """
+    num_frames = int(round(len(samples) / sample_rate * FPS))
+    if sample_rate != AUDIO_SAMPLE_RATE:
+        samples = resample(samples, int(len(samples) * AUDIO_SAMPLE_RATE / sample_rate))
+    pad = np.zeros((AUDIO_DELAY_FRAMES + 1) * AUDIO_SAMPLE_RATE // FPS, dtype=samples.dtype)
+    bs_array = Audio2bs_pcm(np.concatenate([samples, pad]), audio_model)
+    return bs_array[AUDIO_DELAY_FRAMES:AUDIO_DELAY_FRAMES + num_frames]
+
+
+def pack_frame(pts_ms, jpeg):
+    # 二进制帧：4 字节小端 pts（毫秒）+ JPEG
+    return struct.pack("<I", pts_ms) + jpeg
+
+
+class RenderSession:
+    """
+    单个客户端的渲染状态。frame_index 之前的帧已经渲染；bs_frames 记录由音频驱动的帧的口型系数。
+    out 队列在会话的事件循环中消费：bytes 为视频帧，dict 为控制消息（音频、清空）。
+    """
+
+    def __init__(self, session_id, character, loop):
+        self.session_id = session_id
+        self.character = character
+        self.loop = loop
+        self.out = None
+        self.start = time.perf_counter()
+        self.frame_index = 0
+        self.bs_frames = {}
+        self.audio_end = 0
+        self.closed = False
+        self.last_jpeg = None
+        # 降级级别按会话统计：只有错过截止时间的会话降级
+        self.degrade_level = DEGRADE_NONE
+        self.healthy_ticks = 0
+        # 截止时间统计：帧在其 pts 对应的时刻之后才发出即记为错过
+        self.frames_sent = 0
+        self.frames_missed = 0
+
+    def post(self, item):
+        self.loop.call_soon_threadsafe(self.out.put_nowait, item)
+
+    def source_index(self, frame_index):
+        return frame_index % self.character.num_frames
+
+    def deadline(self, frame_index):
+        return self.start + frame_index / FPS
+
+    @property
+    def scale(self):
+        return LOW_RES_SCALE if self.degrade_level >= DEGRADE_LOW_RES else 1.0
+
+    @property
+    def miss_rate(self):
+        return self.frames_missed / self.frames_sent if self.frames_sent else 0.0
+
+
+class ServerRenderer:
+    """
+    共享渲染线程。OpenGL 上下文和模型都只在该线程中使用。
+    """
+
+    def __init__(self, render_ckpt, audio_ckpt, lookahead=0.2, jpeg_quality=80, max_batch=16,
+                 silent_threshold=0.05, recover_ticks=50):
+        self.render_ckpt = render_ckpt
+        self.audio_ckpt = audio_ckpt
+        self.lookahead = lookahead
+        self.jpeg_quality = jpeg_quality
+        self.max_batch = max_batch
+        self.silent_threshold = silent_threshold
+        # 连续 recover_ticks 个 tick 都留有余量才降低一级降级
+        self.recover_ticks = recover_ticks
+        self.frame_dt = 1.0 / FPS
+        self.commands = queue.Queue()
+        self.sessions = []
+        self._ready = threading.Event()
+        self._init_error = None
+        self.thread = threading.Thread(target=self._run, name="server-render", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self._init_error is not None:
+            raise self._init_error
+
+    # ---- 事件循环侧接口 ----
+    def open_session(self, session_id, character, loop):
+        session = RenderSession(session_id, character, loop)
+        session.out = asyncio.Queue()
+        self.commands.put(("open", session, None))
+        return session
+
+    def close_session(self, session):
+        session.closed = True
+        self.commands.put(("close", session, None))
+
+    def push_audio(self, session, wav_base64):
+        self.commands.put(("audio", session, wav_base64))
+
+    def interrupt(self, session):
+        self.commands.put(("interrupt", session, None))
+
+    def session_stats(self):
+        """
+        [(session_id, 已发送帧数, 错过截止时间的帧数, 错过率, 降级级别)]，供 /metrics 导出。
+        """
+        return [(s.session_id, s.frames_sent, s.frames_missed, s.miss_rate, s.degrade_level)
+                for s in list(self.sessions)]
+
+    # ---- 渲染线程 ----
+    def _init_models(self):
+        from mini_live.render import create_render_model
+        from talkingface.render_model_mini import RenderModel_Mini
+        self.audio_model = LoadAudioModel(self.audio_ckpt)
+        self.render_model = RenderModel_Mini()
+        # 多个会话的帧合并成一个 batch 推理，CPU 上同样需要按 batch 计算的 AdaAT
+        self.render_model.loadModel(self.render_ckpt, batch_infer=True)
+        standard_size = model_size * 2
+        self.out_size = (standard_size, standard_size)
+        self.gl_model = create_render_model(self.out_size, floor=20)
+        self.gl_character = None
+
+    def _apply(self, command, session, data):
+        if command == "open":
+            self.sessions.append(session)
+        elif command == "close":
+            if session in self.sessions:
+                self.sessions.remove(session)
+        elif command == "interrupt":
+            session.bs_frames.clear()
+            session.audio_end = session.frame_index
+            session.post({"type": "clear", "pts": int(session.frame_index * self.frame_dt * 1000)})
+        elif command == "audio":
+            samples, sample_rate = soundfile.read(io.BytesIO(base64.b64decode(data)), dtype="int16")
+            if len(samples) == 0:
+                return
+            bs_array = audio_to_bs(samples, sample_rate, self.audio_model) * 0.5
+            start = max(session.frame_index, session.audio_end)
+            for i in range(len(bs_array)):
+                bs = np.zeros([12], dtype=np.float32)
+                bs[:6] = bs_array[i, :6]
+                bs[1] = bs[1] / 2 * 1.6
+                session.bs_frames[start + i] = bs
+            session.audio_end = start + int(round(len(samples) / sample_rate * FPS))
+            session.post({"type": "audio", "pts": int(start * self.frame_dt * 1000), "audio": data})
+
+    def _due_frames(self, now):
+        """
+        收集各会话在 lookahead 窗口内到期、尚未渲染的帧。
+        """
+        due = []
+        for session in self.sessions:
+            while session.frame_index * self.frame_dt <= now - session.start + self.lookahead:
+                due.append((session, session.frame_index))
+                session.frame_index += 1
+        return due
+
+    def _render_gl(self, session, frame_index, bs):
+        character = session.character
+        if self.gl_character is not character:
+            self.gl_model.GenVBO(character.face_wrap_entity)
+            self.gl_character = character
+        source_index = session.source_index(frame_index)
+        verts = character.standard_v[source_index][:, :2] / model_size - 1
+        rgba = self.gl_model.render2cv(verts, out_size=self.out_size, mat_world=character.mats[source_index],
+                                       bs_array=bs)
+        return rgba[::2, ::2, :]
+
+    def _infer_batch(self, batch):
+        """
+        batch: [(session, frame_index, gl_rgba)]，不同会话/人物的嘴部推理合并为一次前向，
+        返回按各会话当前输出尺寸合成后的 JPEG。
+        """
+        gl_tensor = torch.from_numpy(np.stack([b[2] for b in batch]) / 255.).float().permute(0, 3, 1, 2)
+        source = np.stack([s.character.standard_img[s.source_index(i)] for s, i, _ in batch])
+        source_tensor = torch.from_numpy(source / 255.).float().permute(0, 3, 1, 2)
+        net = self.render_model.net
+        net.infer_model.ref_in_feature = torch.cat([s.character.ref_data for s, _, _ in batch], 0)
+        with torch.no_grad():
+            warped = net.interface(source_tensor.to(device), gl_tensor.to(device))
+        images = (warped.permute(0, 2, 3, 1).cpu().float().numpy() * 255.0).clip(0, 255).astype(np.uint8)
+
+        jpegs = []
+        for (session, frame_index, _), image_numpy in zip(batch, images):
+            character = session.character
+            source_index = session.source_index(frame_index)
+            x_min, y_min, x_max, y_max = character.rects[source_index]
+            img_face = cv2.resize(image_numpy, (x_max - x_min, y_max - y_min))
+            img_bg = character.video_img[source_index][:, :, :3].copy()
+            img_bg[y_min:y_max, x_min:x_max, :3] = img_face[:, :, :3]
+            jpegs.append(encode_jpeg(scale_image(img_bg, session.scale), self.jpeg_quality))
+        return jpegs
+
+    def _render(self, due):
+        """
+        按截止时间从早到晚分块渲染，返回 {会话: (错过截止时间的帧数, 最小余量秒数)}。
+        """
+        due.sort(key=lambda f: f[0].deadline(f[1]))
+        stats = {}
+        for i in range(0, len(due), self.max_batch):
+            self._render_chunk(due[i:i + self.max_batch], stats)
+        return stats
+
+    def _render_chunk(self, chunk, stats):
+        now = time.perf_counter()
+        jpegs = [None] * len(chunk)
+        speaking = []
+        for k, (session, frame_index) in enumerate(chunk):
+            level = session.degrade_level
+            bs = session.bs_frames.pop(frame_index, None)
+            silent = bs is None or (level >= DEGRADE_SKIP_SILENT and np.abs(bs).max() < self.silent_threshold)
+            if silent:
+                jpegs[k] = session.character.idle_jpeg(session.source_index(frame_index), self.jpeg_quality,
+                                                       session.scale)
+            elif session.last_jpeg is not None and (now > session.deadline(frame_index)
+                                                     or (level >= DEGRADE_REPEAT and frame_index % 2)):
+                # 已经来不及或隔帧降级：重复上一帧，pts 照常推进
+                jpegs[k] = session.last_jpeg
+            else:
+                speaking.append((k, (session, frame_index, self._render_gl(session, frame_index, bs))))
+        if speaking:
+            for (k, _), jpeg in zip(speaking, self._infer_batch([c[1] for c in speaking])):
+                jpegs[k] = jpeg
+
+        # 按会话内的帧顺序发送
+        sent_at = time.perf_counter()
+        for (session, frame_index), jpeg in zip(chunk, jpegs):
+            session.post(pack_frame(int(frame_index * self.frame_dt * 1000), jpeg))
+            session.last_jpeg = jpeg
+            session.frames_sent += 1
+            frame_slack = session.deadline(frame_index) - sent_at
+            missed, slack = stats.get(session, (0, float("inf")))
+            if frame_slack < 0:
+                session.frames_missed += 1
+                missed += 1
+            stats[session] = (missed, min(slack, frame_slack))
+
+    def _update_degrade_level(self, session, missed, slack):
+        # 有帧错过截止时间或余量不足 lookahead 的四分之一时立即升一级；持续健康一段时间后逐级恢复
+        scale = session.scale
+        if missed or slack < self.lookahead / 4:
+            session.healthy_ticks = 0
+            session.degrade_level = min(session.degrade_level + 1, DEGRADE_LOW_RES)
+        elif session.degrade_level > DEGRADE_NONE:
+            session.healthy_ticks += 1
+            if session.healthy_ticks >= self.recover_ticks:
+                session.healthy_ticks = 0
+                session.degrade_level -= 1
+        if session.scale != scale:
+            # 输出尺寸变化后不能再重复旧尺寸的帧
+            session.last_jpeg = None
+
+    def _safe_apply(self, command, session, data):
+        try:
+            self._apply(command, session, data)
+        except Exception:
+            logger.exception(f"render: {command} failed for session {session.session_id}")
+
+    def _run(self):
+        try:
+            self._init_models()
+        except Exception as e:
+            # 交给 __init__ 抛出，避免启动时一直等待
+            self._init_error = e
+            return
+        finally:
+            self._ready.set()
+        while True:
+            try:
+                item = self.commands.get(timeout=self.frame_dt / 2)
+                self._safe_apply(*item)
+                while True:
+                    self._safe_apply(*self.commands.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                due = self._due_frames(time.perf_counter())
+                if due:
+                    for session, (missed, slack) in self._render(due).items():
+                        self._update_degrade_level(session, missed, slack)
+            except Exception:
+                # 本 tick 的帧丢弃，渲染线程继续服务其他会话
+                logger.exception("render: tick failed")
@@ -1,3 +1,11 @@
+"""
+DINet_mini 训练。
+单卡 / 单进程：python mini_live/train.py --train_shards <分片目录>
+CPU：         python mini_live/train.py --device cpu --bf16 --threads 16
+多进程/多机：  torchrun --nproc_per_node 4 [--nnodes N --node_rank i --master_addr ...] mini_live/train.py --device cpu ...
+多进程时 CPU 用 gloo、GPU 用 nccl 做 DistributedDataParallel，每个进程按 DistributedSampler 取各自的一份样本；
+checkpoint 只由 rank 0 保存，net_g 为未包装的 state_dict，RenderModel_Mini.loadModel 可直接加载。
+"""
 import os
 os.environ["kmp_duplicate_lib_ok"] = "true"
 from talkingface.models.common.Discriminator import Discriminator
@@ -11,13 +19,18 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import DataLoader
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data.distributed import DistributedSampler
+import contextlib
+import time
 import random
 import numpy as np
 import os
-import pandas as pd
 import torch.nn.functional as F
 import cv2
-from talkingface.data.DHLive_mini_dataset import Few_Shot_Dataset,data_preparation
+from talkingface.data.DHLive_mini_dataset import Few_Shot_Dataset,data_preparation,worker_init_fn
+from talkingface.data.batch_augment import BatchColorAugment
 from talkingface.model_utils import device
 def Tensor2img(tensor_, channel_index):
     frame = tensor_[channel_index:channel_index + 3, :, :].detach().squeeze(0).cpu().float().numpy()
@@ -25,13 +38,45 @@ def Tensor2img(tensor_, channel_index):
     frame = frame.clip(0, 255)
     return frame.astype(np.uint8)
 
+def bf16_supported(device):
+    if device.startswith("cuda"):
+        return torch.cuda.is_bf16_supported()
+    # CPU 需要 AVX512-BF16 或 AMX，否则 bf16 比 fp32 更慢
+    return any(getattr(torch.cpu, name, lambda: False)() for name in
+               ("_is_avx512_bf16_supported", "_is_amx_tile_supported"))
+
+def no_sync(model):
+    # G 的反向传播不需要同步判别器的梯度（下一轮 D 更新前会清零）
+    return model.no_sync() if isinstance(model, DDP) else contextlib.nullcontext()
+
 if __name__ == "__main__":
     '''
     training code of person image generation
     '''
-    assert device == "cuda", "不支持CPU训练"
     # load config
     opt = DINetTrainingOptions().parse_args()
+    if opt.device:
+        device = opt.device
+
+    # torchrun 启动时按环境变量初始化进程组
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    rank = int(os.environ.get("RANK", 0))
+    local_rank = int(os.environ.get("LOCAL_RANK", 0))
+    if world_size > 1:
+        dist.init_process_group(backend="nccl" if device == "cuda" else "gloo")
+        if device == "cuda":
+            torch.cuda.set_device(local_rank)
+            device = "cuda:{}".format(local_rank)
+    is_main = rank == 0
+    if device == "cpu":
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", 1))
+        torch.set_num_threads(opt.threads or max(1, (os.cpu_count() or 1) // local_world_size))
+    use_bf16 = opt.bf16 and bf16_supported(device)
+    if opt.bf16 and not use_bf16:
+        print("{} 不支持 bf16 加速，使用 fp32".format(device))
+    if is_main:
+        print("device: {}, world_size: {}, threads: {}, bf16: {}".format(device, world_size, torch.get_num_threads(),
+                                                                        use_bf16))
 
     model_name = "DINet_mini"
     n_ref = 3
@@ -46,28 +91,48 @@ if __name__ == "__main__":
     train_log_path = os.path.join("../checkpoint/{}/log".format(model_name), "")
     opt.seed = 1009
 
-    # set seed
-    random.seed(opt.seed)
-    np.random.seed(opt.seed)
-    torch.cuda.manual_seed(opt.seed)
-
-    df = pd.read_csv(r"F:\C\AI\CV\DH008_few_shot\DH0119_mouth64_48/imageVar2.csv")
-    video_list = df[df["imageVar"] > 350000]["name"].tolist()
-    video_list = [i for i in video_list if os.path.exists(i)]
-    video_list = [os.path.dirname(os.path.dirname(i)) for i in video_list]
-    path_ = r"F:\C\AI\CV\DH008_few_shot/preparation_bilibili"
-    video_list += [os.path.join(path_, i) for i in os.listdir(path_)]
-
-    print("video_selected final: ", len(video_list))
-    video_list.sort()
-    train_dict_info = data_preparation(video_list[:])
-    train_set = Few_Shot_Dataset(train_dict_info, n_ref=n_ref, is_train=True)
-    training_data_loader = DataLoader(dataset=train_set, num_workers=0, batch_size=opt.batch_size, shuffle=True)
-
-    # init network
-    net_g = DINet(opt.source_channel,opt.ref_channel, cuda= True).cuda()
-    net_d = Discriminator(opt.target_channel, opt.D_block_expansion, opt.D_num_blocks, opt.D_max_features).cuda()
-    net_vgg = Vgg19().cuda()
+    # set seed（各进程取不同的随机序列，网络初始化由 DDP 从 rank 0 广播）
+    random.seed(opt.seed + rank)
+    np.random.seed(opt.seed + rank)
+    torch.manual_seed(opt.seed + rank)
+    torch.cuda.manual_seed(opt.seed + rank)
+
+    if opt.train_shards:
+        # 预裁剪分片：python -m talkingface.data.training_shards pack --out <dir> <视频目录>...
+        from talkingface.data.training_shards import Shard_Few_Shot_Dataset
+        train_set = Shard_Few_Shot_Dataset(opt.train_shards, n_ref=n_ref, is_train=True)
+    else:
+        import pandas as pd
+        df = pd.read_csv(r"F:\C\AI\CV\DH008_few_shot\DH0119_mouth64_48/imageVar2.csv")
+        video_list = df[df["imageVar"] > 350000]["name"].tolist()
+        video_list = [i for i in video_list if os.path.exists(i)]
+        video_list = [os.path.dirname(os.path.dirname(i)) for i in video_list]
+        path_ = r"F:\C\AI\CV\DH008_few_shot/preparation_bilibili"
+        video_list += [os.path.join(path_, i) for i in os.listdir(path_)]
+
+        print("video_selected final: ", len(video_list))
+        video_list.sort()
+        train_dict_info = data_preparation(video_list[:])
+        train_set = Few_Shot_Dataset(train_dict_info, n_ref=n_ref, is_train=True)
+
+    # 数据集在 __getitem__ 中不修改自身状态，可以多进程读取；worker 常驻并预取，锁页内存配合异步拷贝到 GPU
+    loader_kwargs = {}
+    if opt.num_workers > 0:
+        loader_kwargs = {"persistent_workers": True, "prefetch_factor": opt.prefetch_factor}
+    train_sampler = None
+    if world_size > 1:
+        train_sampler = DistributedSampler(train_set, num_replicas=world_size, rank=rank, shuffle=True, seed=opt.seed)
+    training_data_loader = DataLoader(dataset=train_set, num_workers=opt.num_workers, batch_size=opt.batch_size,
+                                      shuffle=train_sampler is None, sampler=train_sampler,
+                                      pin_memory=device.startswith("cuda"), worker_init_fn=worker_init_fn,
+                                      generator=torch.Generator().manual_seed(opt.seed + rank), **loader_kwargs)
+    # 对比度/色相增强在训练设备上按 batch 做，每个样本一组参数
+    augment = BatchColorAugment(generator=torch.Generator().manual_seed(opt.seed + rank))
+
+    # init network（cuda=True 为 AdaAT 的 batch 训练路径，CPU 上同样使用）
+    net_g = DINet(opt.source_channel,opt.ref_channel, cuda= True).to(device)
+    net_d = Discriminator(opt.target_channel, opt.D_block_expansion, opt.D_num_blocks, opt.D_max_features).to(device)
+    net_vgg = Vgg19().to(device)
 
     # set optimizer
     optimizer_g = optim.Adam(net_g.parameters(), lr=opt.lr_g)
@@ -75,7 +140,7 @@ if __name__ == "__main__":
 
     if opt.resume:
         print('loading checkpoint {}'.format(opt.resume_path))
-        checkpoint = torch.load(opt.resume_path)
+        checkpoint = torch.load(opt.resume_path, map_location=device)
         # opt.start_epoch = checkpoint['epoch']
         # opt.start_epoch = 200
         net_g_static = checkpoint['state_dict']['net_g']
@@ -84,19 +149,31 @@ if __name__ == "__main__":
         optimizer_g.load_state_dict(checkpoint['optimizer']['net_g'])
         optimizer_d.load_state_dict(checkpoint['optimizer']['net_d'])
 
+    if world_size > 1:
+        net_g = DDP(net_g)
+        net_d = DDP(net_d)
+    # 保存 checkpoint 用未包装的模型，state_dict 的 key 与单卡训练一致
+    net_g_module = net_g.module if world_size > 1 else net_g
+    net_d_module = net_d.module if world_size > 1 else net_d
+    autocast = lambda: torch.autocast(device_type=device.split(":")[0], dtype=torch.bfloat16, enabled=use_bf16)
+
     # set criterion
-    criterionGAN = GANLoss().cuda()
-    criterionL1 = nn.L1Loss().cuda()
+    criterionGAN = GANLoss().to(device)
+    criterionL1 = nn.L1Loss().to(device)
     # set scheduler
     net_g_scheduler = get_scheduler(optimizer_g, opt.non_decay, opt.decay)
     net_d_scheduler = get_scheduler(optimizer_d, opt.non_decay, opt.decay)
 
-    os.makedirs(train_log_path, exist_ok=True)
-    train_logger = SummaryWriter(train_log_path)
+    if is_main:
+        os.makedirs(train_log_path, exist_ok=True)
+        train_logger = SummaryWriter(train_log_path)
     tag_index = 0
     # start train
     for epoch in range(opt.start_epoch, opt.non_decay + opt.decay + 1):
         net_g.train()
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+        epoch_start = time.time()
         avg_loss_g_perception = 0
         avg_Loss_DI = 0
         avg_Loss_GI = 0
@@ -104,54 +181,63 @@ if __name__ == "__main__":
         for iteration, data in enumerate(training_data_loader):
             # read data
             source_tensor, ref_tensor, target_tensor, image_name = data
-            source_tensor = source_tensor.float().cuda()
-            ref_tensor = ref_tensor.float().cuda()
-            target_tensor = target_tensor.float().cuda()
-
-            # network forward
-            fake_out = net_g(ref_tensor, source_tensor)
-            # down sample output image and real image
-            fake_out_half = F.avg_pool2d(fake_out, 3, 2, 1, count_include_pad=False)
-            target_tensor_half = F.interpolate(target_tensor, scale_factor=0.5, mode='bilinear')
+            source_tensor = source_tensor.float().to(device, non_blocking=True)
+            ref_tensor = ref_tensor.float().to(device, non_blocking=True)
+            target_tensor = target_tensor.float().to(device, non_blocking=True)
+            source_tensor, ref_tensor, target_tensor = augment(source_tensor, ref_tensor, target_tensor)
+
+            with autocast():
+                # network forward
+                fake_out = net_g(ref_tensor, source_tensor)
+                # down sample output image and real image
+                fake_out_half = F.avg_pool2d(fake_out, 3, 2, 1, count_include_pad=False)
+                target_tensor_half = F.interpolate(target_tensor, scale_factor=0.5, mode='bilinear')
             # (1) Update D network
             optimizer_d.zero_grad()
-            # compute fake loss
-            _,pred_fake_d = net_d(fake_out)
-            loss_d_fake = criterionGAN(pred_fake_d, False)
-            # compute real loss
-            _,pred_real_d = net_d(target_tensor)
-            loss_d_real = criterionGAN(pred_real_d, True)
-            # Combine D loss
-            loss_dI = (loss_d_fake + loss_d_real) * 0.5
-            loss_dI.backward(retain_graph=True)
+            with autocast():
+                # compute fake loss（D 的梯度不回传到 G：G 的梯度在 G 更新前会清零）
+                _,pred_fake_d = net_d(fake_out.detach())
+                loss_d_fake = criterionGAN(pred_fake_d, False)
+                # compute real loss
+                _,pred_real_d = net_d(target_tensor)
+                loss_d_real = criterionGAN(pred_real_d, True)
+                # Combine D loss
+                loss_dI = (loss_d_fake + loss_d_real) * 0.5
+            loss_dI.backward()
             optimizer_d.step()
             # (2) Update G network
-            _, pred_fake_dI = net_d(fake_out)
             optimizer_g.zero_grad()
-            # compute perception loss
-            perception_real = net_vgg(target_tensor)
-            perception_fake = net_vgg(fake_out)
-            perception_real_half = net_vgg(target_tensor_half)
-            perception_fake_half = net_vgg(fake_out_half)
-            loss_g_perception = 0
-            for i in range(len(perception_real)):
-                loss_g_perception += criterionL1(perception_fake[i], perception_real[i])
-                loss_g_perception += criterionL1(perception_fake_half[i], perception_real_half[i])
-            loss_g_perception = (loss_g_perception / (len(perception_real) * 2)) * opt.lamb_perception
-
-            # 计算像素级损失
-            loss_g_pixel = criterionL1(fake_out, target_tensor) + criterionL1(fake_out_half, target_tensor_half)
-            loss_g_pixel = loss_g_pixel * opt.lamb_pixel  # 假设 opt.lamb_pixel 是像素级损失的权重
-
-            # gan dI loss
-            loss_g_dI = criterionGAN(pred_fake_dI, True)
-            # combine perception loss and gan loss
-            loss_g = loss_g_perception + loss_g_dI + loss_g_pixel
-            loss_g.backward()
+            with no_sync(net_d):
+                with autocast():
+                    _, pred_fake_dI = net_d(fake_out)
+                    # compute perception loss
+                    perception_real = net_vgg(target_tensor)
+                    perception_fake = net_vgg(fake_out)
+                    perception_real_half = net_vgg(target_tensor_half)
+                    perception_fake_half = net_vgg(fake_out_half)
+                    loss_g_perception = 0
+                    for i in range(len(perception_real)):
+                        loss_g_perception += criterionL1(perception_fake[i], perception_real[i])
+                        loss_g_perception += criterionL1(perception_fake_half[i], perception_real_half[i])
+                    loss_g_perception = (loss_g_perception / (len(perception_real) * 2)) * opt.lamb_perception
+
+                    # 计算像素级损失
+                    loss_g_pixel = criterionL1(fake_out, target_tensor) + criterionL1(fake_out_half, target_tensor_half)
+                    loss_g_pixel = loss_g_pixel * opt.lamb_pixel  # 假设 opt.lamb_pixel 是像素级损失的权重
+
+                    # gan dI loss
+                    loss_g_dI = criterionGAN(pred_fake_dI, True)
+                    # combine perception loss and gan loss
+                    loss_g = loss_g_perception + loss_g_dI + loss_g_pixel
+                loss_g.backward()
             optimizer_g.step()
-            message = "===> Epoch[{}]({}/{}): Loss_DI: {:.4f} Loss_GI: {:.4f} loss_g_pixel: {:.4f} Loss_perception: {:.4f} lr_g = {:.7f} lr_d = {:.7f}".format(
+            if not is_main:
+                continue
+            steps_per_sec = (iteration + 1) / (time.time() - epoch_start)
+            message = "===> Epoch[{}]({}/{}): Loss_DI: {:.4f} Loss_GI: {:.4f} loss_g_pixel: {:.4f} Loss_perception: {:.4f} lr_g = {:.7f} lr_d = {:.7f} {:.2f} steps/s".format(
                     epoch, iteration, len(training_data_loader), float(loss_dI), float(loss_g_dI), float(loss_g_pixel),
-                    float(loss_g_perception), optimizer_g.param_groups[0]['lr'], optimizer_d.param_groups[0]['lr'])
+                    float(loss_g_perception), optimizer_g.param_groups[0]['lr'], optimizer_d.param_groups[0]['lr'],
+                    steps_per_sec)
             print(message)
             # with open("train_log.txt", "a") as f:
             #     f.write(message + "\n")
@@ -181,6 +267,16 @@ if __name__ == "__main__":
             avg_Loss_DI += loss_dI.item()
             avg_Loss_GI += loss_g_dI.item()
             avg_Loss_Pixel += loss_g_pixel.item()
+        update_learning_rate(net_g_scheduler, optimizer_g)
+        update_learning_rate(net_d_scheduler, optimizer_d)
+        if not is_main:
+            continue
+        # 所有进程同步更新，全局吞吐 = 每进程 steps/s * batch_size * world_size
+        steps_per_sec = len(training_data_loader) / (time.time() - epoch_start)
+        print("===> Epoch[{}] world_size: {} {:.2f} steps/s {:.1f} samples/s".format(
+            epoch, world_size, steps_per_sec, steps_per_sec * opt.batch_size * world_size))
+        train_logger.add_scalar("Speed/steps_per_s", steps_per_sec, epoch)
+        train_logger.add_scalar("Speed/samples_per_s", steps_per_sec * opt.batch_size * world_size, epoch)
         train_logger.add_scalar("Loss/{}".format("epoch_g_perception"), avg_loss_g_perception / len(training_data_loader), epoch)
         train_logger.add_scalar("Loss/{}".format("epoch_DI"),
                                 avg_Loss_DI / len(training_data_loader), epoch)
@@ -188,8 +284,6 @@ if __name__ == "__main__":
                                 avg_Loss_GI / len(training_data_loader), epoch)
         train_logger.add_scalar("Loss/{}".format("epoch_Pixel"),
                                 avg_Loss_Pixel / len(training_data_loader), epoch)
-        update_learning_rate(net_g_scheduler, optimizer_g)
-        update_learning_rate(net_d_scheduler, optimizer_d)
 
         # checkpoint
         if epoch % opt.checkpoint == 0:
@@ -198,8 +292,10 @@ if __name__ == "__main__":
             model_out_path = os.path.join(opt.result_path, 'epoch_{}.pth'.format(epoch))
             states = {
                 'epoch': epoch + 1,
-                'state_dict': {'net_g': net_g.state_dict(), 'net_d': net_d.state_dict()},
+                'state_dict': {'net_g': net_g_module.state_dict(), 'net_d': net_d_module.state_dict()},
                 'optimizer': {'net_g': optimizer_g.state_dict(), 'net_d': optimizer_d.state_dict()}
             }
             torch.save(states, model_out_path)
-            print("Checkpoint saved to {}".format(epoch))
\ No newline at end of file
+            print("Checkpoint saved to {}".format(epoch))
+    if world_size > 1:
+        dist.destroy_process_group()
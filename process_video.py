@@ -64,25 +64,68 @@ def check_requirements():
     return True
 
 
-def get_character_name(video_path, custom_name=None):
+def get_character_name(video_path, custom_name=None, cache=None):
     """生成角色名称"""
     if custom_name:
         return custom_name
     
-    # 使用视频文件名（不含扩展名）+ 时间戳
+    # 使用视频文件名（不含扩展名）+ 内容哈希：同一视频重复处理时落到同一目录，命中阶段缓存
+    from talkingface.stage_cache import StageCache
+    if cache is None:
+        cache = StageCache()
     video_name = Path(video_path).stem
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return f"{video_name}_{timestamp}"
+    return f"{video_name}_{cache.file_hash(video_path)[:8]}"
 
 
-def process_video(video_path, character_name=None, auto_update_html=False):
+def update_html(character_name, auto_update_html=False):
+    """在 MiniLive_new.html 的角色下拉框中添加选项；auto_update_html=False 时只打印提示"""
+    html_file = "web_demo/static/MiniLive_new.html"
+    
+    if auto_update_html and os.path.exists(html_file):
+        try:
+            # 读取HTML文件
+            with open(html_file, 'r', encoding='utf-8') as f:
+                html_content = f.read()
+            
+            # 检查是否已存在该选项
+            if f'value="{character_name}"' in html_content:
+                print(f"⚠️  HTML中已存在角色选项: {character_name}")
+            else:
+                # 查找 select 标签的结束位置
+                select_end = html_content.find('</select>')
+                if select_end != -1:
+                    # 在结束标签前插入新选项
+                    new_option = f'    <option value="{character_name}">{character_name}</option>\n'
+                    new_content = html_content[:select_end] + new_option + html_content[select_end:]
+                    
+                    # 写回文件
+                    with open(html_file, 'w', encoding='utf-8') as f:
+                        f.write(new_content)
+                    
+                    print(f"✅ 已自动添加角色选项到HTML文件")
+                else:
+                    print("⚠️  未找到 <select> 标签，请手动添加")
+        except Exception as e:
+            print(f"⚠️  自动更新HTML失败: {e}")
+            print("请手动更新HTML文件")
+    else:
+        print("📝 需要手动更新HTML文件:")
+        print(f"\n在 {html_file} 的 <select id=\"characterDropdown\"> 中添加:")
+        print(f'<option value="{character_name}">{character_name}</option>')
+
+
+def process_video(video_path, character_name=None, auto_update_html=False, force=False,
+                  num_workers=None, progress_dir=None):
     """
     自动化处理视频文件
     
     参数:
         video_path: 输入视频文件路径
-        character_name: 角色名称（可选，默认使用视频文件名）
+        character_name: 角色名称（可选，默认使用视频文件名 + 内容哈希）
         auto_update_html: 是否自动更新HTML文件（默认False）
+        force: 忽略阶段缓存，全部重新执行（默认False）
+        num_workers: 关键点提取进程数 / ffmpeg 线程数（默认CPU核数）
+        progress_dir: 关键点提取进度文件目录（批量处理看板使用）
     
     返回:
         成功返回True，失败返回False
@@ -97,8 +140,12 @@ def process_video(video_path, character_name=None, auto_update_html=False):
     print(f"📹 开始处理视频: {video_path}")
     print(f"{'='*60}\n")
     
+    # 同一角色重复处理时，输入未变化的阶段直接跳过
+    from talkingface.stage_cache import StageCache
+    cache = StageCache(enabled=not force)
+
     # 生成角色名称
-    character_name = get_character_name(video_path, character_name)
+    character_name = get_character_name(video_path, character_name, cache)
     print(f"📝 角色名称: {character_name}\n")
     
     # 定义路径
@@ -110,7 +157,7 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         # 步骤1: 预处理视频
         # ============================================================
         print(f"{'='*60}")
-        print("🔄 步骤1: 预处理视频 (生成 processed.mp4 和 processed.pkl)")
+        print("🔄 步骤1: 预处理视频 (生成 processed.mp4 和 processed.kps)")
         print(f"{'='*60}")
         
         from data_preparation_mini import data_preparation_mini
@@ -119,19 +166,20 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         print(f"输出目录: {video_data_dir}")
         print("开始处理...\n")
         
-        data_preparation_mini(video_path, video_data_dir)
+        data_preparation_mini(video_path, video_data_dir, cache=cache,
+                              num_workers=num_workers, progress_dir=progress_dir)
         
         # 验证输出文件
         processed_mp4 = os.path.join(video_data_dir, "data", "processed.mp4")
-        processed_pkl = os.path.join(video_data_dir, "data", "processed.pkl")
+        processed_kps = os.path.join(video_data_dir, "data", "processed.kps")
         
-        if not os.path.exists(processed_mp4) or not os.path.exists(processed_pkl):
+        if not os.path.exists(processed_mp4) or not os.path.exists(processed_kps):
             print("❌ 步骤1失败: 未生成必要的文件")
             return False
         
         print("\n✅ 步骤1完成!")
         print(f"  - {processed_mp4}")
-        print(f"  - {processed_pkl}\n")
+        print(f"  - {processed_kps}\n")
         
         # ============================================================
         # 步骤2: 生成Web资源
@@ -145,11 +193,12 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         print(f"处理目录: {video_data_dir}")
         print("开始生成Web资源...\n")
         
-        data_preparation_web(video_data_dir)
+        data_preparation_web(video_data_dir, cache=cache)
         
         # 验证输出文件
         assets_mp4 = os.path.join(video_data_dir, "assets", "01.mp4")
         assets_json = os.path.join(video_data_dir, "assets", "combined_data.json.gz")
+        assets_bin = os.path.join(video_data_dir, "assets", "combined_data.bin.gz")
         
         if not os.path.exists(assets_mp4) or not os.path.exists(assets_json):
             print("❌ 步骤2失败: 未生成必要的Web资源文件")
@@ -157,7 +206,8 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         
         print("\n✅ 步骤2完成!")
         print(f"  - {assets_mp4}")
-        print(f"  - {assets_json}\n")
+        print(f"  - {assets_json}")
+        print(f"  - {assets_bin}\n")
         
         # ============================================================
         # 步骤3: 复制到Web目录
@@ -175,11 +225,17 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         web_json = os.path.join(web_static_dir, "combined_data.json.gz")
         
         shutil.copy2(assets_mp4, web_mp4)
+        # 低分辨率版本 01_<高度>p.mp4
+        for rendition in sorted(Path(video_data_dir, "assets").glob("01_*p.mp4")):
+            shutil.copy2(rendition, os.path.join(web_static_dir, rendition.name))
         shutil.copy2(assets_json, web_json)
+        if os.path.exists(assets_bin):
+            shutil.copy2(assets_bin, os.path.join(web_static_dir, "combined_data.bin.gz"))
         
         print(f"复制文件:")
         print(f"  - {web_mp4}")
         print(f"  - {web_json}")
+        print(f"  - {os.path.join(web_static_dir, 'combined_data.bin.gz')}")
         
         print("\n✅ 步骤3完成!\n")
         
@@ -190,39 +246,7 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         print("🔄 步骤4: 更新HTML文件")
         print(f"{'='*60}")
         
-        html_file = "web_demo/static/MiniLive_new.html"
-        
-        if auto_update_html and os.path.exists(html_file):
-            try:
-                # 读取HTML文件
-                with open(html_file, 'r', encoding='utf-8') as f:
-                    html_content = f.read()
-                
-                # 检查是否已存在该选项
-                if f'value="{character_name}"' in html_content:
-                    print(f"⚠️  HTML中已存在角色选项: {character_name}")
-                else:
-                    # 查找 select 标签的结束位置
-                    select_end = html_content.find('</select>')
-                    if select_end != -1:
-                        # 在结束标签前插入新选项
-                        new_option = f'    <option value="{character_name}">{character_name}</option>\n'
-                        new_content = html_content[:select_end] + new_option + html_content[select_end:]
-                        
-                        # 写回文件
-                        with open(html_file, 'w', encoding='utf-8') as f:
-                            f.write(new_content)
-                        
-                        print(f"✅ 已自动添加角色选项到HTML文件")
-                    else:
-                        print("⚠️  未找到 <select> 标签，请手动添加")
-            except Exception as e:
-                print(f"⚠️  自动更新HTML失败: {e}")
-                print("请手动更新HTML文件")
-        else:
-            print("📝 需要手动更新HTML文件:")
-            print(f"\n在 {html_file} 的 <select id=\"characterDropdown\"> 中添加:")
-            print(f'<option value="{character_name}">{character_name}</option>')
+        update_html(character_name, auto_update_html)
         
         print("\n✅ 步骤4完成!\n")
         
@@ -232,6 +256,7 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         print(f"{'='*60}")
         print("🎉 处理完成!")
         print(f"{'='*60}")
+        cache.print_summary()
         print(f"\n角色名称: {character_name}")
         print(f"Web资源目录: {web_static_dir}")
         print(f"\n生成的文件:")
@@ -253,14 +278,72 @@ def process_video(video_path, character_name=None, auto_update_html=False):
         return False
 
 
-def batch_process(video_dir, auto_update_html=False):
+def _batch_worker(video_path, character_name, log_path, progress_dir, threads, force):
+    """
+    批量处理的子进程：限制各库线程数，stdout/stderr（包括 ffmpeg 等子进程的输出）重定向到单独的日志文件。
+    """
+    for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    log_file = open(log_path, "w", encoding="utf-8", buffering=1)
+    os.dup2(log_file.fileno(), 1)
+    os.dup2(log_file.fileno(), 2)
+    sys.stdout = sys.stderr = log_file
+
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    ok = process_video(video_path, character_name, auto_update_html=False, force=force,
+                       num_workers=threads, progress_dir=progress_dir)
+    log_file.flush()
+    sys.exit(0 if ok else 1)
+
+
+def _read_progress(progress_dir):
+    """汇总各分块的进度文件，返回 (已完成帧数, 总帧数)"""
+    done = total = 0
+    if os.path.isdir(progress_dir):
+        for name in os.listdir(progress_dir):
+            if not name.endswith(".txt"):
+                continue
+            try:
+                with open(os.path.join(progress_dir, name)) as f:
+                    d, t = f.read().split()
+                done += int(d)
+                total += int(t)
+            except (OSError, ValueError):
+                pass
+    return done, total
+
+
+def _tail(path, lines=5):
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read().splitlines()[-lines:]
+    except OSError:
+        return []
+
+
+def batch_process(video_dir, auto_update_html=False, force=False, workers=None, threads=2, log_dir=None,
+                  refresh=2.0):
     """
     批量处理目录下的所有视频文件
     
     参数:
         video_dir: 视频文件目录
         auto_update_html: 是否自动更新HTML
+        force: 忽略阶段缓存
+        workers: 同时处理的视频数（默认 CPU核数 // threads）
+        threads: 每个视频使用的线程/进程数，总占用约 workers * threads 个核
+        log_dir: 每个视频的日志目录（默认 video_data/batch_logs/<时间>）
+        refresh: 看板刷新间隔（秒）
     """
+    import time
+    import multiprocessing
+
     print(f"\n📁 批量处理目录: {video_dir}\n")
     
     # 支持的视频格式
@@ -275,34 +358,126 @@ def batch_process(video_dir, auto_update_html=False):
         print(f"❌ 目录中没有找到视频文件: {video_dir}")
         return
     
+    # 预先确定角色名：同一批内不能重名，否则会共用 video_data 目录、日志和进度目录
+    # （如内容相同的 a.mp4 和 a.mov），重名时加扩展名，仍重复再加序号
+    from talkingface.stage_cache import StageCache
+    name_cache = StageCache()
+    names = {}
+    for video_file in video_files:
+        name = get_character_name(str(video_file), cache=name_cache)
+        if name in names.values():
+            name = f"{name}_{video_file.suffix.lstrip('.').lower()}"
+        base, i = name, 2
+        while name in names.values():
+            name = f"{base}_{i}"
+            i += 1
+        names[video_file] = name
+
     print(f"找到 {len(video_files)} 个视频文件:\n")
     for i, video_file in enumerate(video_files, 1):
-        print(f"{i}. {video_file.name}")
+        print(f"{i}. {video_file.name} -> {names[video_file]}")
     print()
-    
-    # 处理每个视频
-    success_count = 0
-    failed_count = 0
-    
-    for i, video_file in enumerate(video_files, 1):
-        print(f"\n{'#'*60}")
-        print(f"处理第 {i}/{len(video_files)} 个视频")
-        print(f"{'#'*60}\n")
-        
-        result = process_video(str(video_file), auto_update_html=auto_update_html)
-        
-        if result:
-            success_count += 1
-        else:
-            failed_count += 1
+
+    cpu_count = os.cpu_count() or 1
+    threads = max(1, threads)
+    workers = max(1, min(workers or cpu_count // threads, len(video_files)))
+    if workers * threads > cpu_count:
+        print(f"⚠️  {workers} 个任务 × {threads} 线程 超过了 CPU 核数 {cpu_count}")
+    log_dir = log_dir or os.path.join("video_data", "batch_logs", datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(log_dir, exist_ok=True)
+    print(f"并行: {workers} 个任务 × {threads} 线程，日志目录: {log_dir}\n")
+
+    # spawn：子进程里还会再启动关键点提取进程，mediapipe 也不能 fork
+    ctx = multiprocessing.get_context("spawn")
+    pending = list(video_files)
+    running = {}    # 槽位 -> 任务信息
+    finished = []
+    interactive = sys.stdout.isatty()
+    dashboard_lines = 0
+    last_print = 0
+
+    while pending or running:
+        # 空闲槽位启动新任务
+        for slot in range(workers):
+            if slot in running or not pending:
+                continue
+            video_file = pending.pop(0)
+            character_name = names[video_file]
+            log_path = os.path.join(log_dir, f"{character_name}.log")
+            progress_dir = os.path.join(log_dir, f"{character_name}.progress")
+            os.makedirs(progress_dir, exist_ok=True)
+            proc = ctx.Process(target=_batch_worker,
+                               args=(str(video_file), character_name, log_path, progress_dir, threads, force))
+            proc.start()
+            running[slot] = {"video": video_file, "name": character_name, "log": log_path,
+                             "progress": progress_dir, "proc": proc, "start": time.time(),
+                             "last": (time.time(), 0), "fps": 0.}
+
+        time.sleep(min(refresh, 0.5))
+
+        # 回收结束的任务
+        for slot, task in list(running.items()):
+            if task["proc"].exitcode is None:
+                continue
+            task["proc"].join()
+            task["elapsed"] = time.time() - task["start"]
+            task["frames"] = _read_progress(task["progress"])[0]
+            task["ok"] = task["proc"].exitcode == 0
+            finished.append(task)
+            del running[slot]
+            status = "✅" if task["ok"] else "❌"
+            line = f"{status} {task['video'].name} -> {task['name']} ({task['elapsed']:.0f}s)"
+            if interactive and dashboard_lines:
+                # 清掉看板再打印结果行
+                print(f"\033[{dashboard_lines}F\033[J", end="")
+                dashboard_lines = 0
+            print(line)
+
+        # 看板：每个槽位当前的视频、帧进度和关键点提取速度
+        now = time.time()
+        if running and now - last_print >= refresh:
+            last_print = now
+            lines = [f"[{len(finished)}/{len(video_files)} 完成，{len(pending)} 等待]"]
+            for slot in sorted(running):
+                task = running[slot]
+                done, total = _read_progress(task["progress"])
+                last_time, last_done = task["last"]
+                if now > last_time and done >= last_done:
+                    # 指数平滑，避免看板数字跳动
+                    task["fps"] = 0.7 * task["fps"] + 0.3 * (done - last_done) / (now - last_time)
+                task["last"] = (now, done)
+                frames = f"{done}/{total}" if total else f"{done}"
+                lines.append(f"  worker{slot}: {task['video'].name:<30} 帧 {frames:<12} "
+                             f"{task['fps']:6.1f} 帧/s  {now - task['start']:6.0f}s")
+            if interactive:
+                if dashboard_lines:
+                    print(f"\033[{dashboard_lines}F\033[J", end="")
+                dashboard_lines = len(lines)
+            print("\n".join(lines), flush=True)
+
+    # 自动更新HTML在主进程里串行执行，避免多个任务同时改同一个文件
+    if auto_update_html:
+        for task in finished:
+            if task["ok"]:
+                update_html(task["name"], auto_update_html=True)
     
     # 汇总结果
+    success = [t for t in finished if t["ok"]]
+    failed = [t for t in finished if not t["ok"]]
+    total_frames = sum(t["frames"] for t in finished)
+    wall_time = max((t["start"] + t["elapsed"] for t in finished)) - min(t["start"] for t in finished)
     print(f"\n{'='*60}")
     print("批量处理完成!")
     print(f"{'='*60}")
     print(f"总计: {len(video_files)} 个视频")
-    print(f"成功: {success_count} 个")
-    print(f"失败: {failed_count} 个")
+    print(f"成功: {len(success)} 个")
+    print(f"失败: {len(failed)} 个")
+    print(f"总耗时: {wall_time:.0f}s，关键点帧数: {total_frames}，"
+          f"整体 {total_frames / max(wall_time, 1e-6):.1f} 帧/s")
+    for task in failed:
+        print(f"\n❌ {task['video']}  日志: {task['log']}")
+        for line in _tail(task["log"]):
+            print(f"    {line}")
     print(f"{'='*60}\n")
 
 
@@ -327,17 +502,31 @@ def main():
   
   # 批量处理并自动更新HTML
   python process_video.py --batch D:/videos/ --auto-html
+  
+  # 批量并行：4 个视频同时处理，每个 2 线程
+  python process_video.py --batch D:/videos/ --workers 4 --threads 2
+  
+  # 重新处理同一角色：输入未变化的阶段自动跳过，--force 全部重做
+  python process_video.py D:/videos/person.mp4 --name my_character --force
         """
     )
     
     parser.add_argument('video_path', nargs='?', help='视频文件路径')
-    parser.add_argument('--name', '-n', help='角色名称（可选，默认使用视频文件名）')
+    parser.add_argument('--name', '-n', help='角色名称（可选，默认使用视频文件名 + 内容哈希）')
     parser.add_argument('--auto-html', '-a', action='store_true', 
                        help='自动更新HTML文件')
     parser.add_argument('--batch', '-b', metavar='DIR', 
                        help='批量处理模式，指定视频文件目录')
     parser.add_argument('--no-check', action='store_true',
                        help='跳过环境检查')
+    parser.add_argument('--force', action='store_true',
+                       help='忽略阶段缓存，全部重新执行')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='批量模式同时处理的视频数（默认 CPU核数 // threads）')
+    parser.add_argument('--threads', type=int, default=2,
+                       help='批量模式每个视频使用的线程数（默认2）')
+    parser.add_argument('--log-dir', default=None,
+                       help='批量模式每个视频的日志目录')
     
     args = parser.parse_args()
     
@@ -356,7 +545,7 @@ def main():
     
     # 批量处理模式
     if args.batch:
-        batch_process(args.batch, args.auto_html)
+        batch_process(args.batch, args.auto_html, args.force, args.workers, args.threads, args.log_dir)
         return
     
     # 单文件处理模式
@@ -369,7 +558,8 @@ def main():
     result = process_video(
         args.video_path, 
         args.name,
-        args.auto_html
+        args.auto_html,
+        args.force
     )
     
     if result:
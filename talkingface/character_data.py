@@ -0,0 +1,206 @@
+"""
+人物数据二进制格式 combined_data.bin.gz，替代 combined_data.json.gz（内容相同，gzip 后仍可用 pako 解压）。
+
+容器 = 文件头 + 若干带类型的段，段数据按 4 字节对齐，方便 JS 直接建 TypedArray：
+    文件头   magic "DHCD" | version u16 | 段数 u16
+    段头     name 8s | dtype u8 | ndim u8 | 保留 u16 | shape 3*u32 | scale f32 | nbytes u32   （32 字节）
+段：
+    meta    uint8    JSON：uid、frame_num、authorized
+    ref     float16  参考特征 ref_data
+    mat     float32  (N, 16) 每帧矩阵（与 json 的 points[:16] 顺序相同，即转置后展开）
+    rect    int16    (N, 4) 裁剪框
+    vmean   int32    (V, 2) 顶点均值，值 = 存储值 / scale
+    vdelta  int16    (N, V, 2) 顶点相对均值的差，值 = (vmean + vdelta) / scale
+    meshv   float32  (M, 5) face3D_obj 的 v 行
+    meshf   uint16   (K, 3) face3D_obj 的 f 行（从 0 开始）
+    rect<i> int16    (N, 4) 第 i 个低分辨率视频（rendition）对应的裁剪框，meta 的 renditions 列表记录文件名和宽高
+顶点在 json 中保留 1 位小数，scale=10 时量化无损。
+"""
+import os
+import gzip
+import json
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"DHCD"
+VERSION = 1
+FILE_HEADER = "<4sHH"
+SECTION_HEADER = "<8sBBH3IfI"
+DTYPES = {0: np.uint8, 1: np.float16, 2: np.float32, 3: np.int16, 4: np.int32, 5: np.uint16}
+DTYPE_CODES = {np.dtype(v): k for k, v in DTYPES.items()}
+VERTEX_SCALE = 10.
+
+BIN_NAME = "combined_data.bin.gz"
+JSON_NAME = "combined_data.json.gz"
+
+
+class CharacterData:
+    """
+    combined_data 的数组形式。to_json_dict() 还原为 combined_data.json.gz 的结构。
+    """
+
+    def __init__(self, uid, frame_num, authorized, ref_data, mats, rects, verts, mesh_v, mesh_f, renditions=None):
+        self.uid = uid
+        self.frame_num = frame_num
+        self.authorized = authorized
+        self.ref_data = ref_data      # float32 (L,)
+        self.mats = mats              # float32 (N, 16)
+        self.rects = rects            # int (N, 4)
+        self.verts = verts            # float64 (N, V, 2)
+        self.mesh_v = mesh_v          # float32 (M, 5)
+        self.mesh_f = mesh_f          # int (K, 3)，从 0 开始
+        # [{"file": "01_480p.mp4", "width": .., "height": .., "rects": int (N, 4)}]
+        self.renditions = renditions or []
+
+    @classmethod
+    def from_json_dict(cls, combined_data):
+        json_data = combined_data["json_data"]
+        points = np.array([i["points"] for i in json_data], dtype=np.float64).reshape(len(json_data), -1)
+        mesh_v, mesh_f = [], []
+        for line in combined_data["face3D_obj"]:
+            if line.startswith("v "):
+                mesh_v.append([float(i) for i in line[2:].split()])
+            elif line.startswith("f "):
+                mesh_f.append([int(i) - 1 for i in line[2:].split()])
+        return cls(combined_data["uid"], combined_data["frame_num"], combined_data.get("authorized", False),
+                   np.array(combined_data["ref_data"], dtype=np.float32),
+                   points[:, :16].astype(np.float32),
+                   np.array([i["rect"] for i in json_data], dtype=np.int64).reshape(len(json_data), 4),
+                   points[:, 16:].reshape(len(json_data), -1, 2),
+                   np.array(mesh_v, dtype=np.float32).reshape(-1, 5),
+                   np.array(mesh_f, dtype=np.int64).reshape(-1, 3),
+                   [dict(r, rects=np.array(r["rects"], dtype=np.int64).reshape(-1, 4))
+                    for r in combined_data.get("renditions", [])])
+
+    def face3D_obj(self):
+        lines = ["v {:.3f} {:.3f} {:.3f} {:.02f} {:.0f}\n".format(*i) for i in self.mesh_v.tolist()]
+        lines += ["f {0} {1} {2}\n".format(*i) for i in (self.mesh_f + 1).tolist()]
+        return lines
+
+    def to_json_dict(self):
+        points = np.concatenate([self.mats.astype(np.float64),
+                                 self.verts.reshape(len(self.verts), -1)], axis=1).tolist()
+        combined_data = {
+            "uid": self.uid,
+            "frame_num": self.frame_num,
+            "face3D_obj": self.face3D_obj(),
+            "ref_data": self.ref_data.tolist(),
+            "json_data": [{"rect": rect, "points": pts} for rect, pts in zip(self.rects.tolist(), points)],
+            "authorized": self.authorized,
+        }
+        if self.renditions:
+            combined_data["renditions"] = [dict(r, rects=r["rects"].tolist()) for r in self.renditions]
+        return combined_data
+
+
+def _section(name, array, scale=1.):
+    array = np.ascontiguousarray(array)
+    shape = list(array.shape) + [0] * (3 - array.ndim)
+    data = array.tobytes()
+    header = struct.pack(SECTION_HEADER, name.encode(), DTYPE_CODES[array.dtype], array.ndim, 0, *shape,
+                         scale, len(data))
+    return header + data + b"\0" * (-len(data) % 4)
+
+
+def pack(character):
+    verts_q = np.round(character.verts * VERTEX_SCALE).astype(np.int64)
+    vmean = np.round(verts_q.mean(axis=0)).astype(np.int32)
+    vdelta = verts_q - vmean
+    assert np.abs(vdelta).max(initial=0) < 32768, "顶点偏差超出 int16 范围"
+    renditions = [{"file": r["file"], "width": r["width"], "height": r["height"], "section": f"rect{i}"}
+                  for i, r in enumerate(character.renditions)]
+    meta = json.dumps({"uid": character.uid, "frame_num": character.frame_num,
+                       "authorized": character.authorized, "renditions": renditions}).encode()
+    sections = [
+        _section("meta", np.frombuffer(meta, dtype=np.uint8)),
+        _section("ref", character.ref_data.astype(np.float16)),
+        _section("mat", character.mats.astype(np.float32)),
+        _section("rect", character.rects.astype(np.int16)),
+        _section("vmean", vmean, VERTEX_SCALE),
+        _section("vdelta", vdelta.astype(np.int16), VERTEX_SCALE),
+        _section("meshv", character.mesh_v.astype(np.float32)),
+        _section("meshf", character.mesh_f.astype(np.uint16)),
+    ] + [_section(f"rect{i}", r["rects"].astype(np.int16)) for i, r in enumerate(character.renditions)]
+    return struct.pack(FILE_HEADER, MAGIC, VERSION, len(sections)) + b"".join(sections)
+
+
+def unpack(raw):
+    magic, version, num_sections = struct.unpack_from(FILE_HEADER, raw, 0)
+    if magic != MAGIC:
+        raise ValueError("不是人物数据文件")
+    if version > VERSION:
+        raise ValueError(f"人物数据格式版本 {version} 过新")
+    offset = struct.calcsize(FILE_HEADER)
+    sections = {}
+    for _ in range(num_sections):
+        name, dtype, ndim, _, s0, s1, s2, scale, nbytes = struct.unpack_from(SECTION_HEADER, raw, offset)
+        offset += struct.calcsize(SECTION_HEADER)
+        array = np.frombuffer(raw, dtype=DTYPES[dtype], count=nbytes // np.dtype(DTYPES[dtype]).itemsize,
+                              offset=offset).reshape([s0, s1, s2][:ndim])
+        sections[name.rstrip(b"\0").decode()] = (array, scale)
+        offset += nbytes + (-nbytes % 4)
+
+    meta = json.loads(sections["meta"][0].tobytes().decode())
+    vmean, scale = sections["vmean"]
+    verts = (vmean.astype(np.int64) + sections["vdelta"][0]) / scale
+    return CharacterData(meta["uid"], meta["frame_num"], meta["authorized"],
+                         sections["ref"][0].astype(np.float32),
+                         sections["mat"][0].astype(np.float32),
+                         sections["rect"][0].astype(np.int64),
+                         verts,
+                         sections["meshv"][0].astype(np.float32),
+                         sections["meshf"][0].astype(np.int64),
+                         [{"file": r["file"], "width": r["width"], "height": r["height"],
+                           "rects": sections[r["section"]][0].astype(np.int64)} for r in meta.get("renditions", [])])
+
+
+def save_character_data(path, character):
+    with gzip.open(path, "wb") as f:
+        f.write(pack(character))
+
+
+def load_character_data(path):
+    """
+    path 为人物目录：优先读取 combined_data.bin.gz，没有或比 combined_data.json.gz 旧（如替换了授权后的 json）时读取 json。
+    """
+    bin_path = os.path.join(path, BIN_NAME)
+    json_path = os.path.join(path, JSON_NAME)
+    if os.path.exists(bin_path) and (not os.path.exists(json_path)
+                                     or os.path.getmtime(bin_path) >= os.path.getmtime(json_path)):
+        with gzip.open(bin_path, "rb") as f:
+            return unpack(f.read())
+    with gzip.open(json_path, "rt", encoding="UTF-8") as f:
+        return CharacterData.from_json_dict(json.load(f))
+
+
+def convert(path):
+    """
+    把人物目录中的 combined_data.json.gz 转成 combined_data.bin.gz，返回大小和解析耗时对比。
+    """
+    json_path = os.path.join(path, JSON_NAME)
+    bin_path = os.path.join(path, BIN_NAME)
+    with open(json_path, "rb") as f:
+        json_gz = f.read()
+    st = time.perf_counter()
+    combined_data = json.loads(gzip.decompress(json_gz).decode("UTF-8"))
+    json_parse = time.perf_counter() - st
+
+    character = CharacterData.from_json_dict(combined_data)
+    save_character_data(bin_path, character)
+    with open(bin_path, "rb") as f:
+        bin_gz = f.read()
+    st = time.perf_counter()
+    unpack(gzip.decompress(bin_gz))
+    bin_parse = time.perf_counter() - st
+    return {"path": path, "json_gz_bytes": len(json_gz), "json_raw_bytes": len(gzip.decompress(json_gz)),
+            "bin_gz_bytes": len(bin_gz), "bin_raw_bytes": len(gzip.decompress(bin_gz)),
+            "json_parse_ms": round(json_parse * 1000, 2), "bin_parse_ms": round(bin_parse * 1000, 2)}
+
+
+if __name__ == "__main__":
+    # python -m talkingface.character_data web_demo/static/assets [...]
+    import sys
+    for character_dir in sys.argv[1:]:
+        print(convert(character_dir))
@@ -44,6 +44,14 @@ class DINetTrainingOptions():
         self.parser.add_argument('--train_data', type=str, default=r"./asserts/training_data/training_json.json",
                             help='path of training json')
         self.parser.add_argument('--batch_size', type=int, default=24, help='training batch size')
+        self.parser.add_argument('--num_workers', type=int, default=4, help='num of DataLoader worker processes')
+        self.parser.add_argument('--prefetch_factor', type=int, default=2, help='batches prefetched by each worker')
+        self.parser.add_argument('--device', type=str, default='', help='cuda / cpu, default: cuda if available')
+        self.parser.add_argument('--threads', type=int, default=0,
+                                 help='torch threads per process on CPU, 0: cpu_count / local processes')
+        self.parser.add_argument('--bf16', action='store_true', help='bfloat16 autocast where the device supports it')
+        self.parser.add_argument('--train_shards', type=str, default='',
+                                 help='path of packed training shards (talkingface/data/training_shards.py)')
         self.parser.add_argument('--lamb_perception', type=int, default=10, help='weight of perception loss')
         self.parser.add_argument('--lamb_syncnet_perception', type=int, default=0.1, help='weight of perception loss')
         self.parser.add_argument('--lamb_pixel', type=int, default=10, help='weight of perception loss')
@@ -6,6 +6,7 @@ from talkingface.utils import *
 import glob
 import pickle
 import torch
+from talkingface.keypoint_store import load_keypoints
 import torch.utils.data as data
 from talkingface.models.DINet_mini import input_height,input_width
 model_size = (256, 256)
@@ -72,7 +73,16 @@ def get_ref_images_fromVideo(cap, ref_img_index_list, ref_keypoints):
     ref_img = np.concatenate(ref_img_list, axis=2)
     return ref_img
 
-
+def worker_init_fn(worker_id):
+    """
+    DataLoader 的 worker 初始化：按 torch 给每个 worker 分配的种子（base_seed + worker_id）设置 random/np.random，
+    主进程固定 torch 种子后各 worker 的随机序列可复现且互不相同。
+    """
+    seed = torch.initial_seed() % 2 ** 32
+    random.seed(seed)
+    np.random.seed(seed)
+    # 多个 worker 时 OpenCV 内部线程只会互相抢占
+    cv2.setNumThreads(1)
 
 
 class Few_Shot_Dataset(data.Dataset):
@@ -98,21 +108,51 @@ class Few_Shot_Dataset(data.Dataset):
         for path in self.driven_images:
             self.clip_count_list.append(len(path))
         self.n_ref = n_ref
+        # 测试时所有帧共用同一组参考图，构造时选定，__getitem__ 不依赖调用顺序
+        if not self.is_train:
+            self.eval_ref_index_list = select_ref_index(self.driven_keypoints[0], n_ref=self.n_ref)
+
+    def load_image(self, video_index, frame_index):
+        """
+        读取一帧 RGB 图像。子类（如打包好的训练分片）可以改为从预裁剪的数组读取。
+        """
+        return cv2.imread(self.driven_images[video_index][frame_index])[:, :, ::-1]
+
+    def image_keypoints(self, video_index, frame_index, keypoints):
+        """
+        把关键点换算到 load_image 返回的图像坐标系
+        """
+        return keypoints
+
+    def load_teeth_edge(self, video_index, frame_index, shape):
+        """
+        牙齿分割图贴到与 load_image 相同坐标系的空白图上：通道1为非牙齿区域，通道2为牙齿区域
+        """
+        ref_face_edge = np.zeros(shape, np.uint8)
+        [x_min, y_min, x_max, y_max] = self.driven_teeth_rect[video_index][frame_index]
+        teeth_img = cv2.imread(self.driven_teeth_images[video_index][frame_index])
+        # print(ref_face_edge.shape, crop_coords, [x_min, y_min, x_max, y_max])
+        ref_face_edge[int(y_min):int(y_max), int(x_min):int(x_max), 1][
+            np.where(teeth_img[:, teeth_img.shape[1] // 2:, 0] == 0)] = 255
+        ref_face_edge[int(y_min):int(y_max), int(x_min):int(x_max), 2][
+            np.where(teeth_img[:, teeth_img.shape[1] // 2:, 0] == 255)] = 255
+        return ref_face_edge
 
     def get_ref_images(self, video_index, ref_img_index_list):
         # 参考图片
-        self.ref_img_list = []
+        ref_img_list = []
         for index_,ref_img_index in enumerate(ref_img_index_list):
-            ref_img = cv2.imread(self.driven_images[video_index][ref_img_index])[:, :, ::-1]
+            ref_img = self.load_image(video_index, ref_img_index)
             # ref_img = cv2.convertScaleAbs(ref_img, alpha=self.alpha, beta=self.beta)
-            ref_keypoints = self.driven_keypoints[video_index][ref_img_index]
+            ref_keypoints = self.image_keypoints(video_index, ref_img_index,
+                                                 self.driven_keypoints[video_index][ref_img_index])
             if index_ > 0:
                 ref_img = generate_ref(ref_img, ref_keypoints, self.is_train, teeth = True)
             else:
                 ref_img = generate_ref(ref_img, ref_keypoints, self.is_train)
 
-            self.ref_img_list.append(ref_img)
-        # self.ref_img = np.concatenate(ref_img_list, axis=2)
+            ref_img_list.append(ref_img)
+        return ref_img_list
 
     def __getitem__(self, index):
         if self.is_train:
@@ -122,52 +162,25 @@ class Few_Shot_Dataset(data.Dataset):
             ref_img_index_list = select_ref_index(self.driven_keypoints[video_index], n_ref = self.n_ref - 1, ratio = 0.33)      # 从当前视频选n_ref个图片
             ref_img_index_list = [random.randint(0, self.clip_count_list[video_index] - 1)] + ref_img_index_list
 
-            self.get_ref_images(video_index, ref_img_index_list)
         else:
             video_index = 0
             current_clip = index
-
-            if index == 0:
-                ref_img_index_list = select_ref_index(self.driven_keypoints[video_index], n_ref=self.n_ref)  # 从当前视频选n_ref个图片
-                self.get_ref_images(video_index, ref_img_index_list)
+            ref_img_index_list = self.eval_ref_index_list
+        ref_img_list = self.get_ref_images(video_index, ref_img_index_list)
 
         # target图片
-        target_img = cv2.imread(self.driven_images[video_index][current_clip])[:, :, ::-1]
+        target_img = self.load_image(video_index, current_clip)
+        frame_shape = target_img.shape
+        # 颜色增强（对比度、色相）在 collate 之后按 batch 进行，见 talkingface/data/batch_augment.py
 
-        if self.is_train:
-            # 统一生成随机参数
-            alpha = np.random.uniform(0.8, 1.2)  # 对比度
-            beta = 0  # 亮度
-            h_shift = np.random.randint(-15, 15)  # 色相偏移
-
-            target_img = cv2.convertScaleAbs(target_img, alpha=alpha, beta=beta)
-            target_img = cv2.cvtColor(target_img, cv2.COLOR_RGB2HSV)
-            target_img[..., 0] = (target_img[..., 0] + h_shift) % 180
-            target_img = cv2.cvtColor(target_img, cv2.COLOR_HSV2RGB)
-
-            for ii in range(len(self.ref_img_list)):
-                ref_img = self.ref_img_list[ii][:,:,:3]
-                ref_img = cv2.convertScaleAbs(ref_img, alpha=alpha, beta=beta)
-                ref_img = cv2.cvtColor(ref_img, cv2.COLOR_RGB2HSV)
-                ref_img[..., 0] = (ref_img[..., 0] + h_shift) % 180
-                ref_img = cv2.cvtColor(ref_img, cv2.COLOR_HSV2RGB)
-                self.ref_img_list[ii] = np.concatenate([ref_img, self.ref_img_list[ii][:,:,3:]], axis = 2)
-
-        self.ref_img = np.concatenate(self.ref_img_list, axis=2)
+        ref_img = np.concatenate(ref_img_list, axis=2)
 
         # target_img = cv2.convertScaleAbs(target_img, alpha=self.alpha, beta=self.beta)
-        ref_face_edge = np.zeros_like(target_img)
-        target_keypoints = self.driving_keypoints[video_index][current_clip]
+        target_keypoints = self.image_keypoints(video_index, current_clip,
+                                                self.driving_keypoints[video_index][current_clip])
         source_img, target_img,crop_coords = generate_input(target_img, target_keypoints, self.is_train, mode="mouth")
 
-
-        [x_min, y_min, x_max, y_max] = self.driven_teeth_rect[video_index][current_clip]
-        teeth_img = cv2.imread(self.driven_teeth_images[video_index][current_clip])
-        # print(ref_face_edge.shape, crop_coords, [x_min, y_min, x_max, y_max])
-        ref_face_edge[int(y_min):int(y_max), int(x_min):int(x_max), 1][
-            np.where(teeth_img[:, teeth_img.shape[1] // 2:, 0] == 0)] = 255
-        ref_face_edge[int(y_min):int(y_max), int(x_min):int(x_max), 2][
-            np.where(teeth_img[:, teeth_img.shape[1] // 2:, 0] == 255)] = 255
+        ref_face_edge = self.load_teeth_edge(video_index, current_clip, frame_shape)
 
 
         # cv2.imshow("s", ref_face_edge)
@@ -181,7 +194,7 @@ class Few_Shot_Dataset(data.Dataset):
 
         target_img = cv2.resize(target_img, (128, 128))
         source_img = cv2.resize(source_img, (128, 128))
-        self.ref_img = cv2.resize(self.ref_img, (128, 128))
+        ref_img = cv2.resize(ref_img, (128, 128))
 
 
         w_pad = int((128 - input_width) / 2)
@@ -189,7 +202,7 @@ class Few_Shot_Dataset(data.Dataset):
 
         target_img = target_img[h_pad:-h_pad, w_pad:-w_pad]/255.
         source_img = source_img[h_pad:-h_pad, w_pad:-w_pad]/255.
-        ref_img = self.ref_img[h_pad:-h_pad, w_pad:-w_pad]/255.
+        ref_img = ref_img[h_pad:-h_pad, w_pad:-w_pad]/255.
 
         # tensor
         source_tensor = torch.from_numpy(source_img).float().permute(2, 0, 1)
@@ -220,15 +233,15 @@ def data_preparation(train_video_list):
 
         teeth_rect_array = np.loadtxt("{}/teeth_seg/all.txt".format(model_name))
         Path_output_pkl = "{}/keypoint_rotate.pkl".format(model_name)
-        with open(Path_output_pkl, "rb") as f:
-            images_info = pickle.load(f)
+        # 只读取需要的关键点子集（有 .kps 时按需 memmap 读取）
+        images_info = load_keypoints(Path_output_pkl, index=main_keypoints_index)
 
         # print(len(img_filelist), len(images_info), len(img_teeth_filelist), len(teeth_rect_array))
         # exit(1)
         valid_frame_num = min(len(img_filelist), len(images_info), len(img_teeth_filelist), len(teeth_rect_array))
 
         img_all.append(img_filelist[:valid_frame_num])
-        keypoints_all.append(images_info[:valid_frame_num, main_keypoints_index, :2])
+        keypoints_all.append(images_info[:valid_frame_num, :, :2])
         teeth_img_all.append(img_teeth_filelist[:valid_frame_num])
         teeth_rect_all.append(teeth_rect_array[:valid_frame_num])
 
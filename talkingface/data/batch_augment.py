@@ -0,0 +1,137 @@
+"""
+DINet_mini 训练的批量颜色增强，替代 Few_Shot_Dataset.__getitem__ 里逐样本的 convertScaleAbs + HSV 往返。
+
+在 collate 之后对整个 batch 的 (B, C, H, W) 张量做（可以放在训练设备上）：
+    对比度   x * alpha，alpha ~ U(0.8, 1.2)
+    色相     按 OpenCV 8 位 HSV 的单位（1 = 2°）偏移 h_shift ~ randint(-15, 15)
+每个样本的参数一次抽取，target、source 和所有参考图共用同一组参数（与原来逐样本的做法相同）。
+色相旋转直接在 RGB 上按 HSV 公式向量化计算，不经过 uint8 量化。
+
+python -m talkingface.data.batch_augment [视频]    # 与原 OpenCV 增强做统计对比
+"""
+import numpy as np
+import torch
+
+
+def rgb_to_hcv(x):
+    '''
+    x: (N, 3, H, W)，返回色相（以 60° 为单位，[0, 6)）、色度 max-min、明度 max
+    '''
+    r, g, b = x[:, 0], x[:, 1], x[:, 2]
+    v, _ = x.max(dim=1)
+    c = v - x.min(dim=1)[0]
+    safe_c = torch.where(c > 0, c, torch.ones_like(c))
+    h = torch.where(v == r, torch.remainder((g - b) / safe_c, 6.),
+                    torch.where(v == g, (b - r) / safe_c + 2., (r - g) / safe_c + 4.))
+    h = torch.where(c > 0, h, torch.zeros_like(h))
+    return h, c, v
+
+
+def hcv_to_rgb(h, c, v):
+    # f(n) = v - c * clamp(min(k, 4 - k), 0, 1)，k = (n + h) mod 6，R/G/B 分别取 n = 5/3/1
+    n = torch.tensor([5., 3., 1.], dtype=h.dtype, device=h.device).view(1, 3, 1, 1)
+    k = torch.remainder(n + h.unsqueeze(1), 6.)
+    return v.unsqueeze(1) - c.unsqueeze(1) * torch.clamp(torch.min(k, 4. - k), 0., 1.)
+
+
+def color_augment(x, alpha, h_shift):
+    '''
+    x: (N, 3, H, W)，取值 [0, 1]；alpha、h_shift: (N,)
+    '''
+    x = torch.clamp(x * alpha.view(-1, 1, 1, 1), 0., 1.)
+    h, c, v = rgb_to_hcv(x)
+    # OpenCV 8 位 HSV 中 H 的 1 个单位为 2°，即 1/30 个 60° 扇区
+    h = torch.remainder(h + h_shift.view(-1, 1, 1) / 30., 6.)
+    return hcv_to_rgb(h, c, v)
+
+
+class BatchColorAugment:
+    '''
+    augment = BatchColorAugment(generator=torch.Generator().manual_seed(seed))
+    source, ref, target = augment(source, ref, target)
+    ref 为 n_ref 组 (RGB + 嘴部轮廓) 4 通道拼接，只增强 RGB；source 中嘴部区域（R 通道为 0，
+    G/B 为牙齿分割）保持不变。
+    '''
+
+    def __init__(self, alpha_range=(0.8, 1.2), hue_range=(-15, 15), generator=None):
+        self.alpha_range = alpha_range
+        self.hue_range = hue_range
+        self.generator = generator
+
+    def sample(self, batch_size):
+        alpha = torch.empty(batch_size).uniform_(self.alpha_range[0], self.alpha_range[1], generator=self.generator)
+        h_shift = torch.randint(self.hue_range[0], self.hue_range[1], (batch_size,), generator=self.generator)
+        return alpha, h_shift.float()
+
+    def __call__(self, source, ref, target, alpha=None, h_shift=None):
+        B = target.size(0)
+        if alpha is None:
+            alpha, h_shift = self.sample(B)
+        alpha = alpha.to(target.device, target.dtype)
+        h_shift = h_shift.to(target.device, target.dtype)
+
+        target = color_augment(target, alpha, h_shift)
+
+        mouth = source[:, :1] == 0
+        source = torch.where(mouth, source, color_augment(source, alpha, h_shift))
+
+        n_ref, H, W = ref.size(1) // 4, ref.size(2), ref.size(3)
+        ref = ref.view(B, n_ref, 4, H, W)
+        ref_rgb = color_augment(ref[:, :, :3].reshape(B * n_ref, 3, H, W),
+                                alpha.repeat_interleave(n_ref), h_shift.repeat_interleave(n_ref))
+        ref = torch.cat([ref_rgb.view(B, n_ref, 3, H, W), ref[:, :, 3:]], dim=2)
+        return source, ref.view(B, n_ref * 4, H, W), target
+
+
+def cv2_color_augment(img, alpha, h_shift):
+    '''
+    原 Few_Shot_Dataset 的逐样本增强（uint8 RGB），用于对比
+    '''
+    import cv2
+    img = cv2.convertScaleAbs(img, alpha=alpha, beta=0)
+    img = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+    img[..., 0] = (img[..., 0] + h_shift) % 180
+    return cv2.cvtColor(img, cv2.COLOR_HSV2RGB)
+
+
+def compare_with_cv2(images, num_params=64, seed=0):
+    '''
+    images: uint8 RGB 列表。原做法在整帧上增强后再缩放到 128，新做法在缩放后的张量上批量增强；
+    对同一组参数比较两者输出的逐像素误差和各通道均值/标准差。
+    '''
+    import cv2
+    rng = np.random.RandomState(seed)
+    old, new = [], []
+    for img in images:
+        alpha = rng.uniform(0.8, 1.2, num_params)
+        h_shift = rng.randint(-15, 15, num_params)
+        small = cv2.resize(img, (128, 128))
+        x = torch.from_numpy(small / 255.).float().permute(2, 0, 1).unsqueeze(0).repeat(num_params, 1, 1, 1)
+        new.append(color_augment(x, torch.from_numpy(alpha).float(), torch.from_numpy(h_shift).float()))
+        old.append(torch.stack([torch.from_numpy(cv2.resize(cv2_color_augment(img, a, h), (128, 128)) / 255.)
+                                .float().permute(2, 0, 1) for a, h in zip(alpha, h_shift)]))
+    old = torch.cat(old) * 255
+    new = torch.cat(new) * 255
+    diff = (old - new).abs()
+    result = {"samples": len(old),
+              "mean_abs_diff": round(float(diff.mean()), 3),
+              "p99_abs_diff": round(float(diff.flatten().kthvalue(int(diff.numel() * 0.99))[0]), 3),
+              "channel_mean_old": [round(float(i), 2) for i in old.mean(dim=(0, 2, 3))],
+              "channel_mean_new": [round(float(i), 2) for i in new.mean(dim=(0, 2, 3))],
+              "channel_std_old": [round(float(i), 2) for i in old.std(dim=(0, 2, 3))],
+              "channel_std_new": [round(float(i), 2) for i in new.std(dim=(0, 2, 3))]}
+    print(result)
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    import cv2
+    cap = cv2.VideoCapture(sys.argv[1] if len(sys.argv) > 1 else "web_demo/static/assets/01.mp4")
+    frames = []
+    while len(frames) < 16:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame[:, :, ::-1].copy())
+    compare_with_cv2(frames[::4])
@@ -7,6 +7,7 @@ import os
 import glob
 from talkingface.util.smooth import smooth_array
 from talkingface.run_utils import calc_face_mat
+from talkingface.keypoint_store import load_keypoints
 import tqdm
 from talkingface.utils import *
 
@@ -34,8 +35,7 @@ for path_ in tqdm.tqdm(video_list):
 
     Path_output_pkl = "{}/keypoint_rotate.pkl".format(path_)
 
-    with open(Path_output_pkl, "rb") as f:
-        images_info = pickle.load(f)[:, main_keypoints_index, :]
+    images_info = load_keypoints(Path_output_pkl, index=main_keypoints_index)
     pts_driven = images_info.reshape(len(images_info), -1)
     pts_driven = smooth_array(pts_driven).reshape(len(pts_driven), -1, 3)
 
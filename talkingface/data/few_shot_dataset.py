@@ -6,6 +6,7 @@ from talkingface.utils import *
 import glob
 import pickle
 import torch
+from talkingface.keypoint_store import load_keypoints
 import torch.utils.data as data
 def get_image(A_path, crop_coords, input_type, resize= 256):
     (x_min, y_min, x_max, y_max) = crop_coords
@@ -198,9 +199,8 @@ def data_preparation(train_video_list):
         img_all.append(img_filelist)
 
         Path_output_pkl = "{}/keypoint_rotate.pkl".format(model_name)
-        with open(Path_output_pkl, "rb") as f:
-            images_info = pickle.load(f)
-        keypoints_all.append(images_info[:, main_keypoints_index, :2])
+        images_info = load_keypoints(Path_output_pkl, index=main_keypoints_index)
+        keypoints_all.append(images_info[:, :, :2])
 
         Path_output_pkl = "{}/face_mat_mask.pkl".format(model_name)
         with open(Path_output_pkl, "rb") as f:
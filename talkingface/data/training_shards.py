@@ -0,0 +1,225 @@
+"""
+DINet_mini 训练数据的预裁剪分片，替代训练时逐样本读取整帧 PNG + 牙齿分割图。
+
+离线打包（每个视频一次）：按 crop_mouth 的嘴部区域（不含随机偏移）把每帧缩放到 model_size，四周再留 pad 像素，
+使训练时 ±4% 的随机上下偏移仍落在图内；牙齿分割图按同样的变换投影到同一坐标系。
+目录结构：
+    index.json                 version、model_size、pad、各视频的目录名/源路径/帧数
+    <视频序号>/images.npy      uint8 (N, S, S, 3)  RGB，S = model_size + 2*pad
+    <视频序号>/teeth.npy       uint8 (N, S, S, 2)  通道0为非牙齿区域，通道1为牙齿区域
+    <视频序号>/keypoints.npy   float32 (N, K, 2)   原图坐标的 main_keypoints_index 关键点
+    <视频序号>/transform.npy   float32 (N, 3)      (ox, oy, s)：分片坐标 = (原图坐标 - (ox, oy)) * s
+    <视频序号>/names.json      每帧对应的源图片路径
+.npy 用 np.load(mmap_mode="r") 按需读取，训练时不再解码图片。
+
+python -m talkingface.data.training_shards pack --out shards <视频目录> [...]
+python -m talkingface.data.training_shards bench --shards shards [<视频目录> ...]   # 给出视频目录时同时测原始读取方式做对比
+"""
+import os
+import json
+import time
+
+import numpy as np
+import cv2
+import tqdm
+import torch
+from torch.utils.data import DataLoader
+from numpy.lib.format import open_memmap
+
+from talkingface.utils import INDEX_LIPS_OUTER, INDEX_FACE_OVAL
+from talkingface.data.DHLive_mini_dataset import Few_Shot_Dataset, data_preparation, model_size, worker_init_fn
+
+SHARD_VERSION = 1
+# 256 尺度下脸颊轮廓比嘴部裁剪框每侧宽约 11 像素（crop_mouth 用轮廓宽度定边长），随机偏移最多约 5 像素
+SHARD_PAD = 24
+INDEX_NAME = "index.json"
+
+
+def mouth_region(keypoints, img_w, img_h):
+    '''
+    crop_mouth 不加随机偏移时的区域（同样取整，但不按图像边界裁剪最终区域），返回 (x_min, y_min, 宽)。
+    分片坐标系以取整后的区域为准，训练时在分片上重新 crop_mouth 得到的正好是 [pad, pad + model_size]。
+    '''
+    center_x = np.mean(keypoints[INDEX_LIPS_OUTER, 0])
+    center_y = np.mean(keypoints[INDEX_LIPS_OUTER, 1])
+    oval = keypoints[INDEX_FACE_OVAL[2:-2], :2]
+    x_min, y_min = max(0, np.min(oval[:, 0])), max(0, np.min(oval[:, 1]))
+    x_max, y_max = min(np.max(oval[:, 0]), img_w), min(np.max(oval[:, 1]), img_h)
+    new_size = max((x_max - x_min), (y_max - y_min)) * 0.46
+    x_min, y_min, x_max = int(center_x - new_size), int(center_y - new_size * 0.89), int(center_x + new_size)
+    return x_min, y_min, x_max - x_min
+
+
+def warp_to_shard(img, transform, shard_size, offset=(0, 0)):
+    '''
+    按 transform 把 img 采样到 shard_size 的分片坐标系，像素中心约定与 cv2.resize 一致。
+    offset 为 img 左上角在原图中的位置（用于牙齿分割图这类局部小图）。
+    '''
+    ox, oy, s = transform
+    M = np.array([[1 / s, 0, ox - offset[0] + 0.5 / s - 0.5],
+                  [0, 1 / s, oy - offset[1] + 0.5 / s - 0.5]], dtype=np.float64)
+    return cv2.warpAffine(img, M, (shard_size, shard_size), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def pack_video(img_filelist, keypoints, teeth_filelist, teeth_rect, out_dir, pad=SHARD_PAD):
+    os.makedirs(out_dir, exist_ok=True)
+    num = len(img_filelist)
+    shard_size = model_size[0] + 2 * pad
+    images = open_memmap(os.path.join(out_dir, "images.npy"), mode="w+", dtype=np.uint8,
+                         shape=(num, shard_size, shard_size, 3))
+    teeth = open_memmap(os.path.join(out_dir, "teeth.npy"), mode="w+", dtype=np.uint8,
+                        shape=(num, shard_size, shard_size, 2))
+    transform = np.zeros([num, 3], dtype=np.float32)
+    for i in range(num):
+        img = cv2.imread(img_filelist[i])[:, :, ::-1]
+        x0, y0, size = mouth_region(keypoints[i], img.shape[1], img.shape[0])
+        s = model_size[0] / size
+        transform[i] = [x0 - pad / s, y0 - pad / s, s]
+        images[i] = warp_to_shard(img, transform[i], shard_size)
+
+        [x_min, y_min, x_max, y_max] = teeth_rect[i]
+        teeth_img = cv2.imread(teeth_filelist[i])
+        teeth_img = teeth_img[:, teeth_img.shape[1] // 2:, 0]
+        patch = np.zeros([int(y_max) - int(y_min), int(x_max) - int(x_min), 2], dtype=np.uint8)
+        patch[:, :, 0][teeth_img == 0] = 255
+        patch[:, :, 1][teeth_img == 255] = 255
+        teeth[i] = warp_to_shard(patch, transform[i], shard_size, offset=(int(x_min), int(y_min)))
+    images.flush()
+    teeth.flush()
+    np.save(os.path.join(out_dir, "keypoints.npy"), np.asarray(keypoints, dtype=np.float32))
+    np.save(os.path.join(out_dir, "transform.npy"), transform)
+    with open(os.path.join(out_dir, "names.json"), "w", encoding="utf-8") as f:
+        json.dump(list(img_filelist), f, ensure_ascii=False)
+
+
+def pack_shards(video_list, out_path, pad=SHARD_PAD):
+    '''
+    video_list 与 data_preparation 的参数相同（每个视频目录下有 image/、teeth_seg/、keypoint_rotate.pkl）
+    '''
+    dict_info = data_preparation(video_list)
+    os.makedirs(out_path, exist_ok=True)
+    videos = []
+    for i in tqdm.tqdm(range(len(dict_info["driven_images"]))):
+        img_filelist = dict_info["driven_images"][i]
+        name = "{:05d}".format(i)
+        pack_video(img_filelist, dict_info["driven_keypoints"][i], dict_info["driven_teeth_image"][i],
+                   dict_info["driven_teeth_rect"][i], os.path.join(out_path, name), pad)
+        videos.append({"dir": name, "source": os.path.dirname(os.path.dirname(img_filelist[0])),
+                       "frames": len(img_filelist)})
+    index = {"version": SHARD_VERSION, "model_size": list(model_size), "pad": pad, "videos": videos}
+    with open(os.path.join(out_path, INDEX_NAME), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    print("shards: {} 个视频，{} 帧 -> {}".format(len(videos), sum(v["frames"] for v in videos), out_path))
+
+
+def load_shard_info(shard_path):
+    with open(os.path.join(shard_path, INDEX_NAME), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index["version"] > SHARD_VERSION:
+        raise ValueError(f"{shard_path} 的分片格式版本 {index['version']} 过新")
+    if tuple(index["model_size"]) != tuple(model_size):
+        raise ValueError(f"{shard_path} 的 model_size {index['model_size']} 与训练设置 {model_size} 不一致")
+    img_all, keypoints_all, transform_all = [], [], []
+    for video in index["videos"]:
+        video_dir = os.path.join(shard_path, video["dir"])
+        with open(os.path.join(video_dir, "names.json"), "r", encoding="utf-8") as f:
+            img_all.append(json.load(f))
+        keypoints_all.append(np.load(os.path.join(video_dir, "keypoints.npy")))
+        transform_all.append(np.load(os.path.join(video_dir, "transform.npy")))
+    dict_info = {}
+    dict_info["driven_images"] = img_all
+    dict_info["driven_keypoints"] = keypoints_all
+    dict_info["driving_keypoints"] = keypoints_all
+    dict_info["driven_teeth_rect"] = None
+    dict_info["driven_teeth_image"] = None
+    dict_info["shard_dirs"] = [os.path.join(shard_path, v["dir"]) for v in index["videos"]]
+    dict_info["shard_transform"] = transform_all
+    return dict_info
+
+
+class Shard_Few_Shot_Dataset(Few_Shot_Dataset):
+    '''
+    从 pack_shards 的输出读取，输出与 Few_Shot_Dataset 相同。
+    '''
+
+    def __init__(self, shard_path, n_ref=2, is_train=False):
+        dict_info = load_shard_info(shard_path)
+        super(Shard_Few_Shot_Dataset, self).__init__(dict_info, n_ref=n_ref, is_train=is_train)
+        self.shard_dirs = dict_info["shard_dirs"]
+        self.shard_transform = dict_info["shard_transform"]
+        self._arrays = {}
+
+    def __getstate__(self):
+        # DataLoader 的 worker 各自打开 memmap，不把已映射的数组序列化过去
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+    def _shard(self, video_index):
+        arrays = self._arrays.get(video_index)
+        if arrays is None:
+            video_dir = self.shard_dirs[video_index]
+            arrays = (np.load(os.path.join(video_dir, "images.npy"), mmap_mode="r"),
+                      np.load(os.path.join(video_dir, "teeth.npy"), mmap_mode="r"))
+            self._arrays[video_index] = arrays
+        return arrays
+
+    def load_image(self, video_index, frame_index):
+        return np.array(self._shard(video_index)[0][frame_index])
+
+    def image_keypoints(self, video_index, frame_index, keypoints):
+        ox, oy, s = self.shard_transform[video_index][frame_index]
+        return (keypoints - np.array([ox, oy])) * s
+
+    def load_teeth_edge(self, video_index, frame_index, shape):
+        ref_face_edge = np.zeros(shape, np.uint8)
+        ref_face_edge[:, :, 1:] = self._shard(video_index)[1][frame_index]
+        return ref_face_edge
+
+
+def benchmark(dataset, num_samples=300, batch_size=6, num_workers=0):
+    '''
+    测量 DataLoader 的吞吐（samples/s），跳过第一个 batch（worker 启动、文件缓存）
+    '''
+    loader = DataLoader(dataset=dataset, num_workers=num_workers, batch_size=batch_size, shuffle=True,
+                        worker_init_fn=worker_init_fn)
+    count = 0
+    st = None
+    while count < num_samples:
+        for batch in loader:
+            if st is None:
+                st = time.perf_counter()
+                continue
+            count += len(batch[0])
+            if count >= num_samples:
+                break
+    elapsed = time.perf_counter() - st
+    print("{}: {} samples, {:.2f}s, {:.1f} samples/s".format(type(dataset).__name__, count, elapsed,
+                                                               count / elapsed))
+    return count / elapsed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="DINet_mini 训练数据分片")
+    parser.add_argument("mode", choices=["pack", "bench"])
+    parser.add_argument("videos", nargs="*", help="视频预处理目录（含 image/、teeth_seg/、keypoint_rotate.pkl）")
+    parser.add_argument("--out", "--shards", dest="shards", default="shards", help="分片目录")
+    parser.add_argument("--pad", type=int, default=SHARD_PAD)
+    parser.add_argument("--n_ref", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_intermixed_args()
+
+    if args.mode == "pack":
+        pack_shards(sorted(args.videos), args.shards, args.pad)
+    else:
+        torch.set_num_threads(1)
+        if args.videos:
+            raw = Few_Shot_Dataset(data_preparation(sorted(args.videos)), n_ref=args.n_ref, is_train=True)
+            before = benchmark(raw, args.samples, num_workers=args.workers)
+        shard = Shard_Few_Shot_Dataset(args.shards, n_ref=args.n_ref, is_train=True)
+        after = benchmark(shard, args.samples, num_workers=args.workers)
+        if args.videos:
+            print("加速 {:.2f}x".format(after / before))
@@ -0,0 +1,64 @@
+"""
+批量人脸位姿求解（calc_face_mat 的向量化实现）。
+
+逐帧做法是构造 (3N, 12) 的 mat_A 再求伪逆。该矩阵按 x/y/z 三行分块、每块都是 [pts, 1]，
+最小二乘解等价于每帧一个 4x4 正规方程：G = P^T P，M^T = G^{-1} P^T Y，P = [pts, 1]。
+所有帧的正规方程、SVD 修正和逆变换都按 batch 计算。
+"""
+import numpy as np
+
+
+def fit_affine(src_pts, tgt_pts):
+    '''
+    最小二乘拟合 tgt ≈ M[:, :3] @ src + M[:, 3]
+    Args:
+        src_pts: [N, 3] 或 [F, N, 3]
+        tgt_pts: [F, N, 3]
+    Returns:
+        [F, 3, 4] 仿射矩阵
+    '''
+    src_pts = np.asarray(src_pts, dtype=np.float64)
+    tgt_pts = np.asarray(tgt_pts, dtype=np.float64)
+    ones = np.ones(src_pts.shape[:-1] + (1,))
+    P = np.concatenate([src_pts, ones], axis=-1)                          # [(F,) N, 4]
+    G = np.swapaxes(P, -1, -2) @ P                                        # [(F,) 4, 4]
+    rhs = np.swapaxes(P, -1, -2) @ tgt_pts                                # [F, 4, 3]
+    G = np.broadcast_to(G, (len(tgt_pts), 4, 4))
+    return np.swapaxes(np.linalg.solve(G, rhs), -1, -2)
+
+
+def correct_rotation(R):
+    '''
+    批量 SVD 修正 [F, 3, 3]：去掉镜像（det(U @ VT) < 0 时翻转 VT 最后一行），保留缩放。
+    '''
+    U, S, VT = np.linalg.svd(R, full_matrices=True)
+    det = np.linalg.det(U @ VT)
+    VT[det < 0, -1, :] *= -1
+    return (U * S[:, np.newaxis, :]) @ VT
+
+
+def rigid_mats(src_pts, tgt_pts):
+    '''
+    与逐帧 mat_A 伪逆 + correct_rotation_matrix + 质心平移相同的 [F, 4, 4] 矩阵。
+    src_pts: [N, 3] 或 [F, N, 3]；tgt_pts: [F, N, 3]
+    '''
+    tgt_pts = np.asarray(tgt_pts, dtype=np.float64)
+    affine = fit_affine(src_pts, tgt_pts)
+    corrected_R = correct_rotation(affine[:, :, :3])
+    centroid_src = np.broadcast_to(np.mean(src_pts, axis=-2), (len(tgt_pts), 3))
+    centroid_tgt = np.mean(tgt_pts, axis=1)
+    T = centroid_tgt - np.einsum("fij,fj->fi", corrected_R, centroid_src)
+
+    mats = np.zeros([len(tgt_pts), 4, 4])
+    mats[:, :3, :3] = corrected_R
+    mats[:, :3, 3] = T
+    mats[:, 3, 3] = 1
+    return mats
+
+
+def normalize_points(mats, pts):
+    '''
+    用各帧矩阵的逆把关键点变换回标准空间。mats: [F, 4, 4]；pts: [F, N, 3]，返回 [F, N, 3]
+    '''
+    inv = np.linalg.inv(mats)
+    return np.einsum("fij,fnj->fni", inv[:, :3, :3], pts) + inv[:, np.newaxis, :3, 3]
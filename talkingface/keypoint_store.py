@@ -0,0 +1,164 @@
+"""
+关键点存储格式（.kps），替代 float64 的 processed.pkl / keypoint_rotate.pkl。
+
+文件 = 64 字节头 + (帧数, 点数, 3) 的数据块，数据块用 np.memmap 按需读取：
+    magic      4s   b"DHKP"
+    version    H    格式版本
+    dtype      H    0: float32  1: int16（值 = 存储值 * scale）
+    frames     I    帧数
+    points     H    每帧点数
+    dims       H    每个点的维度（3）
+    fps        f
+    width      I    视频宽
+    height     I    视频高
+    scale      f    int16 量化步长（float32 时为 1）
+    landmarks  16s  点集名称，如 b"mediapipe478"
+读取时可以只取部分帧、部分点（如 main_keypoints_index），不必把整段数据载入内存。
+旧的 .pkl 仍可通过 load_keypoints 读取。
+"""
+import os
+import math
+import pickle
+import struct
+
+import numpy as np
+
+MAGIC = b"DHKP"
+VERSION = 1
+HEADER_FORMAT = "<4sHHIHHfIIf16s"
+HEADER_SIZE = 64
+DTYPES = {0: np.float32, 1: np.int16}
+DTYPE_CODES = {"float32": 0, "int16": 1}
+
+
+def quant_scale(max_abs):
+    """
+    int16 量化步长：取不小于 max_abs/32767 的 2 的幂，最小 1/16 像素。
+    步长为 2 的幂时整数像素坐标可以无损保存。
+    """
+    scale = 1 / 16.
+    if max_abs > 0:
+        scale = max(scale, 2. ** math.ceil(math.log2(max_abs / 32767.)))
+    return scale
+
+
+class KeypointStore:
+    """
+    .kps 文件的读写视图。store[a:b] / store.read(frames, index) 返回反量化后的 float32 数组。
+    """
+
+    def __init__(self, path, mode="r"):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        (magic, version, dtype_code, frames, points, dims, fps, width, height, scale,
+         landmarks) = struct.unpack(HEADER_FORMAT, header[:struct.calcsize(HEADER_FORMAT)])
+        if magic != MAGIC:
+            raise ValueError(f"{path} 不是关键点文件")
+        if version > VERSION:
+            raise ValueError(f"{path} 的格式版本 {version} 过新")
+        self.version = version
+        self.dtype = DTYPES[dtype_code]
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.landmarks = landmarks.rstrip(b"\0").decode()
+        self.data = np.memmap(path, dtype=self.dtype, mode=mode, offset=HEADER_SIZE, shape=(frames, points, dims))
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def read(self, frames=slice(None), index=None):
+        """
+        frames: 帧的切片或下标列表；index: 点的下标列表（如 main_keypoints_index）。
+        """
+        data = self.data[frames]
+        if index is not None:
+            data = data[:, index] if data.ndim == 3 else data[index]
+        data = np.asarray(data, dtype=np.float32)
+        if self.dtype == np.int16:
+            data *= self.scale
+        return data
+
+    def __getitem__(self, frames):
+        return self.read(frames)
+
+    def write(self, frames, pts):
+        pts = np.asarray(pts)
+        if self.dtype == np.int16:
+            pts = np.clip(np.round(pts / self.scale), -32768, 32767)
+        self.data[frames] = pts.astype(self.dtype)
+
+    def flush(self):
+        self.data.flush()
+
+    def close(self):
+        self.data.flush()
+        del self.data
+
+
+def create_keypoints(path, frames, points=478, dims=3, fps=25., width=0, height=0, dtype="int16",
+                     scale=None, landmarks="mediapipe478"):
+    """
+    新建 .kps 文件并返回可写的 KeypointStore。int16 且未给 scale 时按视频宽高选择量化步长。
+    """
+    dtype_code = DTYPE_CODES[dtype]
+    if dtype == "float32":
+        scale = 1.
+    elif scale is None:
+        scale = quant_scale(max(width, height))
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, dtype_code, frames, points, dims, fps, width, height,
+                         scale, landmarks.encode()[:16])
+    with open(path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.truncate(HEADER_SIZE + frames * points * dims * np.dtype(DTYPES[dtype_code]).itemsize)
+    return KeypointStore(path, mode="r+")
+
+
+def save_keypoints(path, pts, fps=25., width=0, height=0, dtype="int16", landmarks="mediapipe478"):
+    pts = np.asarray(pts)
+    scale = quant_scale(float(np.abs(pts).max()) if pts.size else 0.) if dtype == "int16" else None
+    store = create_keypoints(path, len(pts), pts.shape[1], pts.shape[2], fps, width, height, dtype, scale, landmarks)
+    store.write(slice(None), pts)
+    store.close()
+
+
+def keypoint_path(path):
+    """
+    xxx.pkl 旁边有同名 .kps 时优先使用 .kps。
+    """
+    if path.endswith(".pkl"):
+        kps_path = path[:-4] + ".kps"
+        if os.path.exists(kps_path):
+            return kps_path
+    return path
+
+
+def load_keypoints(path, frames=slice(None), index=None):
+    """
+    读取关键点，兼容旧的 pickle 文件。返回 (帧数, 点数, 3) 数组；index 为点的子集。
+    """
+    path = keypoint_path(path)
+    if not path.endswith(".pkl"):
+        return KeypointStore(path).read(frames, index)
+    with open(path, "rb") as f:
+        pts = pickle.load(f)[frames]
+    if index is not None:
+        pts = pts[:, index] if pts.ndim == 3 else pts[index]
+    return pts
+
+
+if __name__ == "__main__":
+    # 旧数据迁移：python -m talkingface.keypoint_store a.pkl [b.pkl ...]
+    import sys
+    for pkl_path in sys.argv[1:]:
+        with open(pkl_path, "rb") as f:
+            pts = pickle.load(f)
+        kps_path = pkl_path[:-4] + ".kps"
+        save_keypoints(kps_path, pts)
+        print(f"{pkl_path} -> {kps_path} ({os.path.getsize(pkl_path)} -> {os.path.getsize(kps_path)} bytes)")
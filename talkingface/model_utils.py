@@ -80,6 +80,10 @@ def Audio2mouth(wavpath, Audio2FeatureModel,  method = "lstm"):
 from scipy.signal import resample
 def Audio2bs(wavpath, Audio2FeatureModel):
     rate, wav = wavfile.read(wavpath, mmap=False)
+    return Audio2bs_pcm(wav, Audio2FeatureModel)
+
+def Audio2bs_pcm(wav, Audio2FeatureModel):
+    # wav: 16k int16 PCM 数组（如 TTS 实时输出），重采样到 8k 后提取特征
     wav = resample(wav, len(wav) //2)
     augmented_samples = wav
     augmented_samples2 = augmented_samples.astype(np.float32, order='C') / 32768.0
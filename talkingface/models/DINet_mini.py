@@ -189,15 +189,17 @@ class AdaAT(nn.Module):
             )
         self.tanh = nn.Tanh()
         self.sigmoid = nn.Sigmoid()
+        # cuda=True 为按 batch 计算的训练路径（CPU 上同样可用），False 为 batch=1 的推理路径
         self.cuda = cuda
         self.f_dim = (20, input_height//4, input_width//4)
-        if cuda:
-            self.grid_xy, self.grid_z = make_coordinate_grid_3d(self.f_dim, torch.cuda.FloatTensor)
-        else:
-            self.grid_xy, self.grid_z = make_coordinate_grid_3d(self.f_dim, torch.FloatTensor)
+        grid_xy, grid_z = make_coordinate_grid_3d(self.f_dim, torch.FloatTensor)
+        if not cuda:
             batch = 1
-            self.grid_xy = self.grid_xy.unsqueeze(0).repeat(batch, 1, 1, 1, 1)
-            self.grid_z = self.grid_z.unsqueeze(0).repeat(batch, 1, 1, 1)
+            grid_xy = grid_xy.unsqueeze(0).repeat(batch, 1, 1, 1, 1)
+            grid_z = grid_z.unsqueeze(0).repeat(batch, 1, 1, 1)
+        # 非持久 buffer：随 .to(device) 移动，不写入 state_dict，与已有 checkpoint 兼容
+        self.register_buffer("grid_xy", grid_xy, persistent=False)
+        self.register_buffer("grid_z", grid_z, persistent=False)
 
 
     def forward(self, feature_map,para_code):
@@ -316,7 +318,7 @@ class DINet_mini_pipeline(nn.Module):
         super(DINet_mini_pipeline, self).__init__()
         self.infer_model = DINet_mini(source_channel,ref_channel, cuda = cuda)
 
-        self.grid_tensor = F.affine_grid(torch.eye(2, 3).unsqueeze(0).float(), (1, 1, model_size, model_size), align_corners=False).to("cuda" if cuda else "cpu")
+        grid_tensor = F.affine_grid(torch.eye(2, 3).unsqueeze(0).float(), (1, 1, model_size, model_size), align_corners=False)
 
         face_fusion_tensor = cv2.imread(os.path.join(current_dir, "../../mini_live/face_fusion_mask.png"))
         face_fusion_tensor = cv2.resize(face_fusion_tensor, (model_size, model_size))
@@ -325,8 +327,10 @@ class DINet_mini_pipeline(nn.Module):
         mouth_fusion_tensor = cv2.resize(mouth_fusion_tensor, (input_width, input_height))
         mouth_fusion_tensor = torch.from_numpy(mouth_fusion_tensor[:,:,:1] / 255.).float().permute(2, 0, 1).unsqueeze(0)
 
-        self.face_fusion_tensor = face_fusion_tensor.to("cuda" if cuda else "cpu")
-        self.mouth_fusion_tensor = mouth_fusion_tensor.to("cuda" if cuda else "cpu")
+        # 非持久 buffer，随 .to(device) 移动；cuda 只决定 AdaAT 是否走按 batch 计算的路径
+        self.register_buffer("grid_tensor", grid_tensor, persistent=False)
+        self.register_buffer("face_fusion_tensor", face_fusion_tensor, persistent=False)
+        self.register_buffer("mouth_fusion_tensor", mouth_fusion_tensor, persistent=False)
 
     def ref_input(self, ref_tensor):
         self.infer_model.ref_input(ref_tensor)
@@ -13,12 +13,13 @@ class RenderModel_Mini:
     def __init__(self):
         self.__net = None
 
-    def loadModel(self, ckpt_path):
+    def loadModel(self, ckpt_path, batch_infer=False):
+        # batch_infer: 一次前向推理多帧（服务端渲染），CPU 上也使用按 batch 计算的 AdaAT
         from talkingface.models.DINet_mini import DINet_mini_pipeline as DINet
         n_ref = 3
         source_channel = 3
         ref_channel = n_ref * 4
-        self.net = DINet(source_channel, ref_channel, device == "cuda").to(device)
+        self.net = DINet(source_channel, ref_channel, device == "cuda" or batch_infer).to(device)
         checkpoint = torch.load(ckpt_path, map_location=device)
         net_g_static = checkpoint['state_dict']['net_g']
         self.net.infer_model.load_state_dict(net_g_static)
@@ -2,6 +2,8 @@ from talkingface.utils import *
 import os
 import pickle
 import copy
+from talkingface.keypoint_store import load_keypoints
+from talkingface.face_pose import rigid_mats, normalize_points
 def Tensor2img(tensor_, channel_index):
     frame = tensor_[channel_index:channel_index + 3, :, :].detach().squeeze(0).cpu().float().numpy()
     frame = np.transpose(frame, (1, 2, 0)) * 255.0
@@ -39,39 +41,12 @@ def calc_face_mat(pts_array_origin, face_pts_mean):
     :param pts_array_origin: mediapipe检测出的人脸关键点
     :return:
     '''
+    # 所有帧一起求解（talkingface.face_pose），结果与逐帧 mat_A 伪逆一致
+    pts_array_origin = np.asarray(pts_array_origin, dtype=np.float64)
+    mat_list = rigid_mats(face_pts_mean, pts_array_origin)
+    pts_normalized = normalize_points(mat_list, pts_array_origin)
 
-    A = mat_A(face_pts_mean)
-    A_inverse = np.linalg.pinv(A)
-    pts_normalized_list = []
-    mat_list = []
-    for i in pts_array_origin:
-        B = i.flatten()
-        x = A_inverse.dot(B)
-        rotationMatrix = np.zeros([4, 4])
-        rotationMatrix[:3, :] = x.reshape(3, 4)
-        rotationMatrix[3, 3] = 1
-
-        R = rotationMatrix[:3, :3]
-        # Correct the rotation part
-        corrected_R = correct_rotation_matrix(R)
-
-        centroid_src = np.mean(face_pts_mean, axis=0)
-        centroid_tgt = np.mean(i, axis=0)
-
-        # Step 4: Compute translation vector
-        T = centroid_tgt - corrected_R @ centroid_src
-        rotationMatrix[:3, :3] = corrected_R
-        rotationMatrix[:3, 3] = T
-        mat_list.append(rotationMatrix)
-
-    for index_, i in enumerate(pts_array_origin):
-        rotationMatrix = mat_list[index_]
-        keypoints = np.ones([4, len(i)])
-        keypoints[:3, :] = i.T
-        keypoints_normalized = np.linalg.inv(rotationMatrix).dot(keypoints).T
-        pts_normalized_list.append(keypoints_normalized[:, :3])
-
-    x = np.array(pts_normalized_list).reshape(len(pts_normalized_list), -1)
+    x = pts_normalized.reshape(len(pts_normalized), -1)
     # print(x.shape)
     n_components = min(25, len(pts_array_origin)//20)
     pca = decomposition.PCA(n_components=n_components)
@@ -80,51 +55,15 @@ def calc_face_mat(pts_array_origin, face_pts_mean):
     x_new = pca.inverse_transform(y)
     x_new = x_new.reshape(len(x_new), -1, 3)
 
-    pts_normalized_list = []
-    mat_list = []
-    for index, x in enumerate(x_new):
-        A = mat_A(x)
-        A_inverse = np.linalg.pinv(A)
+    mat_list = rigid_mats(x_new, pts_array_origin)
 
-        B = pts_array_origin[index].flatten()
-        x = A_inverse.dot(B)
-        rotationMatrix = np.zeros([4, 4])
-        rotationMatrix[:3, :] = x.reshape(3, 4)
-        rotationMatrix[3, 3] = 1
-        R = rotationMatrix[:3, :3]
-        # Correct the rotation part
-        corrected_R = correct_rotation_matrix(R)
-
-        centroid_src = np.mean(x_new[index], axis=0)
-        centroid_tgt = np.mean(pts_array_origin[index], axis=0)
-
-        # Step 4: Compute translation vector
-        T = centroid_tgt - corrected_R @ centroid_src
-        rotationMatrix[:3, :3] = corrected_R
-        rotationMatrix[:3, 3] = T
-
-        mat_list.append(rotationMatrix)
-
-    mat_list = np.array(mat_list)
     # mat_list必须要平滑，注意是针对每个视频分别平滑
-    sub_mat_list = mat_list
-    smooth_array_ = sub_mat_list.reshape(-1, 16)
-    import pandas as pd
-
+    smooth_array_ = mat_list.reshape(-1, 16)
     smooth_array_ = smooth_array(smooth_array_, weight = [0.03, 0.1, 0.74, 0.1, 0.03])
-    # pd.DataFrame(smooth_array_[200:400]).to_csv("sad.csv")
-    # exit(-1)
-    # print(smooth_array_, smooth_array_.shape)
     smooth_array_ = smooth_array_.reshape(-1, 4, 4)
-    mat_list = smooth_array_
-    mat_list = [hh for hh in mat_list]
+    mat_list = [hh for hh in smooth_array_]
 
-    for index_,i in enumerate(pts_array_origin):
-        rotationMatrix = mat_list[index_]
-        keypoints = np.ones([4, len(i)])
-        keypoints[:3, :] = i.T
-        keypoints_normalized = np.linalg.inv(rotationMatrix).dot(keypoints).T
-        pts_normalized_list.append(keypoints_normalized[:,:3])
+    pts_normalized_list = list(normalize_points(smooth_array_, pts_array_origin))
 
     face_pts_mean_personal = pca.mean_.reshape(-1, 3)
     return mat_list,pts_normalized_list,face_pts_mean_personal
@@ -251,8 +190,7 @@ def concat_output_2binfile(mat_list, pts_3d, face_pts_mean_personal, face_mask_p
     return output
 from talkingface.data.few_shot_dataset import select_ref_index,get_ref_images_fromVideo
 def prepare_video_data(video_path, Path_pkl, ref_img_index_list, ref_img = None,save_ref = None):
-    with open(Path_pkl, "rb") as f:
-        images_info = pickle.load(f)[:, main_keypoints_index, :]
+    images_info = load_keypoints(Path_pkl, index=main_keypoints_index)
 
     pts_driven = images_info.reshape(len(images_info), -1)
     pts_driven = smooth_array(pts_driven).reshape(len(pts_driven), -1, 3)
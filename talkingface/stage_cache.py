@@ -0,0 +1,122 @@
+"""
+人物生成流程的阶段缓存。
+
+每个阶段执行完后，在第一个输出文件旁写 .<阶段名>.stage.json，记录：
+    inputs   输入文件的内容哈希（sha256，按顺序）
+    params   阶段参数
+    outputs  输出文件（相对路径）的大小、mtime 和哈希
+    elapsed  执行耗时
+再次运行时输入哈希、参数一致且输出完好就跳过该阶段；前面的阶段重跑且产物变化时，后面阶段的输入哈希随之变化，
+因此流程总是从第一个失效的阶段开始继续。文件大小和 mtime 未变时复用记录的哈希，不重复读大文件。
+"""
+import os
+import json
+import time
+import hashlib
+
+MANIFEST_VERSION = 1
+
+
+class StageCache:
+    """
+    cache = StageCache()
+    cache.run("transcode", fn, inputs=[src], outputs=[dst], params={...})
+    cache.print_summary()
+    enabled=False 时所有阶段都重新执行（仍会写记录，供下次使用）。
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.results = []       # [(阶段名, 是否命中缓存, 本次耗时, 节省时间)]
+        self._hashes = {}       # (dev, inode, size, mtime_ns) -> sha256
+
+    def file_hash(self, path, block_size=1 << 20):
+        st = os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        digest = self._hashes.get(key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    h.update(block)
+            digest = h.hexdigest()
+            self._hashes[key] = digest
+        return digest
+
+    @staticmethod
+    def _manifest_path(name, outputs):
+        return os.path.join(os.path.dirname(os.path.abspath(outputs[0])), f".{name}.stage.json")
+
+    def _outputs_valid(self, manifest_dir, outputs, recorded):
+        if sorted(os.path.relpath(os.path.abspath(p), manifest_dir) for p in outputs) != sorted(recorded):
+            return False
+        for rel, info in recorded.items():
+            path = os.path.join(manifest_dir, rel)
+            if not os.path.exists(path):
+                return False
+            st = os.stat(path)
+            if st.st_size == info["size"] and st.st_mtime_ns == info["mtime_ns"]:
+                # 未改动的文件直接记下哈希，后续阶段用它作输入时不必重算
+                self._hashes[(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)] = info["sha256"]
+            elif self.file_hash(path) != info["sha256"]:
+                return False
+        return True
+
+    def run(self, name, fn, inputs=(), outputs=(), params=None):
+        """
+        inputs/outputs 为文件路径列表，fn() 执行该阶段并写出全部 outputs。
+        命中缓存返回 True，否则执行 fn 并返回 False。
+        """
+        assert outputs, "阶段必须有输出文件"
+        manifest_path = self._manifest_path(name, outputs)
+        manifest_dir = os.path.dirname(manifest_path)
+        inputs_hash = [self.file_hash(p) for p in inputs]
+        params = json.loads(json.dumps(params or {}))
+
+        if self.enabled and os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                hit = (record.get("version") == MANIFEST_VERSION and record["inputs"] == inputs_hash
+                       and record["params"] == params
+                       and self._outputs_valid(manifest_dir, outputs, record["outputs"]))
+            except (ValueError, KeyError, OSError):
+                hit = False
+            if hit:
+                self.results.append((name, True, 0., record["elapsed"]))
+                print(f"[缓存] {name}: 输入未变化，跳过（节省 {record['elapsed']:.1f}s）")
+                return True
+
+        # 先删除旧记录，阶段中途失败时不会把残缺的输出当作有效缓存
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        st = time.time()
+        fn()
+        elapsed = time.time() - st
+
+        recorded = {}
+        for p in outputs:
+            stat = os.stat(p)
+            recorded[os.path.relpath(os.path.abspath(p), manifest_dir)] = {
+                "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": self.file_hash(p)}
+        record = {"version": MANIFEST_VERSION, "inputs": inputs_hash, "params": params,
+                  "outputs": recorded, "elapsed": elapsed}
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=1)
+        self.results.append((name, False, elapsed, 0.))
+        return False
+
+    def summary(self):
+        lines = [f"{'阶段':<16}{'状态':<6}{'耗时(s)':>10}{'节省(s)':>10}"]
+        for name, cached, elapsed, saved in self.results:
+            lines.append(f"{name:<16}{'缓存' if cached else '执行':<6}{elapsed:>10.1f}{saved:>10.1f}")
+        cached_count = sum(1 for r in self.results if r[1])
+        lines.append(f"共 {len(self.results)} 个阶段，{cached_count} 个命中缓存，"
+                     f"耗时 {sum(r[2] for r in self.results):.1f}s，节省 {sum(r[3] for r in self.results):.1f}s")
+        return "\n".join(lines)
+
+    def print_summary(self):
+        print(self.summary())
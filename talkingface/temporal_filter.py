@@ -0,0 +1,135 @@
+"""
+关键点/矩阵序列的时间滤波。
+
+- fir_filter：离线 FIR，所有帧、所有通道一次计算，与 smooth_array 的边界处理一致。
+- StreamingFIR：同一组系数的因果流式版本，逐帧输入，延迟 len(weight)//2 帧输出，结果与离线完全相同。
+- OneEuroFilter：实时场景的自适应低通（One Euro Filter），运动慢时平滑、运动快时跟手。
+"""
+import math
+
+import numpy as np
+
+
+def fir_filter(array, weight=(0.1, 0.8, 0.1), edge="copy"):
+    '''
+
+    Args:
+        array: [n_frames, n_values]
+        weight: 奇数个系数，out[i] = sum(weight[k] * array[i - pad + k])
+        edge: "copy" 首尾 pad 帧保持原值（smooth_array 的 numpy 模式）；
+              "replicate" 首尾复制补齐后滤波（smooth_array 的 torch 模式）
+    Returns:
+        array: [n_frames, n_values]，"copy" 时 dtype 与输入相同
+    '''
+    smooth_length = len(weight)
+    assert smooth_length % 2 == 1, "卷积核权重个数必须使用奇数"
+    pad = smooth_length // 2
+    weight = np.asarray(weight, dtype=np.float64)
+    x = np.asarray(array)
+    n = len(x)
+
+    if edge == "replicate":
+        xf = np.concatenate([np.repeat(x[:1], pad, axis=0), x, np.repeat(x[-1:], pad, axis=0)]).astype(np.float64)
+        out = weight[0] * xf[0:n]
+        for k in range(1, smooth_length):
+            out += weight[k] * xf[k:k + n]
+        return out
+
+    out = x.copy()
+    if n <= 2 * pad:
+        return out
+    # 逐个抽头累加，求和顺序与逐帧 np.sum 相同
+    xf = x.astype(np.float64, copy=False)
+    m = n - 2 * pad
+    acc = xf[0:m] * weight[0]
+    for k in range(1, smooth_length):
+        acc += xf[k:k + m] * weight[k]
+    out[pad:n - pad] = acc
+    return out
+
+
+class StreamingFIR:
+    """
+    因果流式 FIR：push 一帧，返回已可确定的一帧（前 pad 帧和末尾 flush 的帧保持原值），
+    输出序列与 fir_filter(edge="copy") 相同，代价是 pad 帧的延迟。
+    """
+
+    def __init__(self, weight=(0.1, 0.8, 0.1)):
+        assert len(weight) % 2 == 1, "卷积核权重个数必须使用奇数"
+        self.weight = np.asarray(weight, dtype=np.float64)
+        self.pad = len(weight) // 2
+        self.history = []
+        self.count = 0
+
+    def push(self, frame):
+        """
+        返回滤波后的一帧；缓冲不足时返回 None。
+        """
+        frame = np.asarray(frame)
+        self.history.append(frame)
+        self.count += 1
+        if self.count <= self.pad:
+            # 开头 pad 帧原样输出，但要等后面的帧到齐后才轮到它
+            return None
+        if self.count <= 2 * self.pad:
+            return self.history[self.count - self.pad - 1].copy()
+        window = self.history[-len(self.weight):]
+        acc = window[0].astype(np.float64) * self.weight[0]
+        for k in range(1, len(self.weight)):
+            acc += window[k].astype(np.float64) * self.weight[k]
+        self.history = self.history[-(2 * self.pad):]
+        return acc.astype(frame.dtype)
+
+    def flush(self):
+        """
+        输入结束，返回还未输出的末尾帧（原值）并重置。
+        """
+        if self.count <= self.pad:
+            rest = self.history
+        else:
+            rest = self.history[-self.pad:] if self.pad else []
+        self.history = []
+        self.count = 0
+        return [np.asarray(r).copy() for r in rest]
+
+
+class OneEuroFilter:
+    """
+    One Euro Filter（Casiez 2012），按通道向量化。
+    min_cutoff 越小越平滑，beta 越大快速运动时延迟越小。
+    """
+
+    def __init__(self, freq=25., min_cutoff=1.0, beta=0.0, d_cutoff=1.0):
+        self.freq = freq
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.x_prev = None
+        self.dx_prev = None
+
+    @staticmethod
+    def _alpha(cutoff, freq):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau * freq)
+
+    def reset(self):
+        self.x_prev = None
+        self.dx_prev = None
+
+    def __call__(self, x, dt=None):
+        x = np.asarray(x, dtype=np.float64)
+        freq = self.freq if dt is None else 1.0 / dt
+        if self.x_prev is None:
+            self.x_prev = x
+            self.dx_prev = np.zeros_like(x)
+            return x.copy()
+        dx = (x - self.x_prev) * freq
+        a_d = self._alpha(self.d_cutoff, freq)
+        dx_hat = a_d * dx + (1 - a_d) * self.dx_prev
+        cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+        tau = 1.0 / (2 * math.pi * cutoff)
+        a = 1.0 / (1.0 + tau * freq)
+        x_hat = a * x + (1 - a) * self.x_prev
+        self.x_prev = x_hat
+        self.dx_prev = dx_hat
+        return x_hat
@@ -1,6 +1,7 @@
 import numpy as np
 import random
 import cv2
+from talkingface.temporal_filter import fir_filter
 
 INDEX_LEFT_EYEBROW = [276, 283, 282, 295, 285, 336, 296, 334, 293, 300]
 INDEX_RIGHT_EYEBROW = [46, 53, 52, 65, 55, 107, 66, 105, 63, 70]
@@ -101,6 +102,28 @@ def crop_mouth(pts_array_origin, img_w, img_h, is_train = False):
     y_max = min(img_h, y_max)
     return np.array([x_min, y_min, x_max, y_max])
 
+def crop_mouth_batch(pts_array_origin, img_w, img_h):
+    """
+    crop_mouth 的批量版本（不含 is_train 随机偏移）。pts_array_origin: [N, n_points, 2/3]，返回 [N, 4] 整数数组
+    """
+    center_x = np.mean(pts_array_origin[:, INDEX_LIPS_OUTER, 0], axis=1)
+    center_y = np.mean(pts_array_origin[:, INDEX_LIPS_OUTER, 1], axis=1)
+    oval = pts_array_origin[:, INDEX_FACE_OVAL[2:-2], :2]
+    x_min = np.maximum(0, oval[:, :, 0].min(axis=1))
+    y_min = np.maximum(0, oval[:, :, 1].min(axis=1))
+    x_max = np.minimum(oval[:, :, 0].max(axis=1), img_w)
+    y_max = np.minimum(oval[:, :, 1].max(axis=1), img_h)
+    new_size = np.maximum((x_max - x_min), (y_max - y_min))*0.46
+
+    # int() 向零取整
+    rect = np.stack([center_x - new_size, center_y - new_size*0.89,
+                     center_x + new_size, center_y + new_size*1.11], axis=1)
+    rect = np.trunc(rect).astype(int)
+    rect[:, :2] = np.maximum(0, rect[:, :2])
+    rect[:, 2] = np.minimum(int(img_w), rect[:, 2])
+    rect[:, 3] = np.minimum(int(img_h), rect[:, 3])
+    return rect
+
 def draw_mouth_maps(keypoints, size=(256, 256), im_edges = None):
     w, h = size
     # edge map for face region from keypoints
@@ -277,28 +300,8 @@ def smooth_array(array, weight = [0.1,0.8,0.1], mode = "numpy"):
             out = conv1(input)
         return out.permute(2, 1, 0).squeeze().numpy()
     else:
-        # out = np.zeros([array.shape[0] + 2, array.shape[1]])
-        # input = np.zeros([array.shape[0] + 2, array.shape[1]])
-        # input[0] = array[0]
-        # input[-1] = array[-1]
-        # input[1:-1] = array
-        # for i in range(out.shape[1]):
-        #     out[:, i] = np.convolve(input[:, i], weight, mode="same")
-        # out0 = out[1:-1]
-        smooth_length = len(weight)
-        assert smooth_length % 2 == 1, "卷积核权重个数必须使用奇数"
-        pad = smooth_length // 2
-        fliter = np.array([weight]).T
-        x0 = array
-        fliter = np.repeat(fliter, x0.shape[1], axis=1)
-        out0 = np.zeros_like(x0)
-        for i in range(len(x0)):
-            if i < pad or i >= len(x0) - pad:
-                out0[i] = x0[i]
-            else:
-                tmp = x0[i - pad:i + pad + 1] * fliter
-                out0[i] = np.sum(tmp, axis=0)
-        return out0
+        # 向量化 FIR，首尾 pad 帧保持原值
+        return fir_filter(array, weight, edge="copy")
 
 def generate_face_mask():
     face_mask = np.zeros([256, 256], dtype=np.uint8)
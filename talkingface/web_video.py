@@ -0,0 +1,21 @@
+"""
+Web 播放用的 H.264 编码参数。
+
+processed.mp4 在预处理时就按这些参数编码，01.mp4 直接硬链接 processed.mp4：
+关键点、ref_data 和浏览器播放的是同一份码流，不再二次解码/编码（也不多一代有损压缩）。
+低分辨率版本（01_720p.mp4 等）由 processed.mp4 缩放后按同样参数编码。
+"""
+
+# moov 前置（faststart），固定 1 秒 GOP 且不按场景切换插入关键帧，
+# 无 B 帧（解码顺序即显示顺序，首帧更快出图），正放/倒放循环时每段解码代价一致
+WEB_GOP = 25
+WEB_CRF = 23
+
+
+def web_encode_args(gop=WEB_GOP, crf=WEB_CRF):
+    """
+    ffmpeg 输出参数，放在输出文件名之前
+    """
+    return ["-c:v", "libx264", "-preset", "medium", "-crf", str(crf), "-pix_fmt", "yuv420p",
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0", "-bf", "0",
+            "-movflags", "+faststart"]
@@ -0,0 +1,194 @@
+"""
+server_realtime.py 压测工具
+
+模拟 N 个并发客户端，每个客户端：
+1. 按实时速度把 video_data/audio*.wav 的 PCM 推送到 /asr，记录 ASR 定稿延迟；
+2. 向 /eb_stream 发起文本请求，记录首包音频时间和整段流完成时间。
+并发数逐级递增，输出各级的 p50/p90/p99 表格以及饱和曲线（吞吐与 p99 随并发变化）。
+
+服务端建议使用脚本化 LLM 启动，避免压测依赖云端大模型：
+    python web_demo/server_realtime.py --llm scripted
+    python web_demo/load_test.py --concurrency 1,2,4,8,16
+"""
+import os
+import sys
+import json
+import time
+import glob
+import asyncio
+import argparse
+
+import numpy as np
+import soundfile
+from scipy.signal import resample
+
+try:
+    import httpx
+    import websockets
+except ImportError as e:
+    raise SystemExit(f"load_test 需要 httpx 和 websockets: {e}")
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 0.1
+
+
+def load_pcm(path):
+    samples, sr = soundfile.read(path, dtype="float32")
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    if sr != SAMPLE_RATE:
+        samples = resample(samples, int(len(samples) * SAMPLE_RATE / sr)).astype(np.float32)
+    return (np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+async def run_asr(url, pcm, trailing_silence):
+    """
+    实时速度推送 PCM，返回 (识别文本, 定稿延迟)：从最后一块语音（不含尾部静音）发出，
+    到该句最后一个非空 finished 结果到达。流式模型可能在尾部静音期间就已断句定稿，
+    vad 之后服务端回显的空结果不计入。
+    """
+    chunk_bytes = int(SAMPLE_RATE * CHUNK_SECONDS) * 2
+    speech_bytes = len(pcm)
+    pcm = pcm + bytes(int(SAMPLE_RATE * trailing_silence) * 2)
+    text = ""
+    speech_end = None
+    last_final = None
+
+    async with websockets.connect(url, max_size=None) as ws:
+        async def receive():
+            nonlocal text, last_final
+            async for message in ws:
+                result = json.loads(message)
+                if result["idx"] == -1:
+                    return
+                if result["text"]:
+                    text = result["text"]
+                    if result["finished"]:
+                        last_final = time.perf_counter()
+
+        receiver = asyncio.create_task(receive())
+        start = time.perf_counter()
+        for i in range(0, len(pcm), chunk_bytes):
+            await ws.send(pcm[i:i + chunk_bytes])
+            if speech_end is None and i + chunk_bytes >= speech_bytes:
+                speech_end = time.perf_counter()
+            # 保持实时节奏
+            delay = start + (i // chunk_bytes + 1) * CHUNK_SECONDS - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await ws.send("vad")
+        try:
+            await asyncio.wait_for(receiver, timeout=30)
+        except asyncio.TimeoutError:
+            receiver.cancel()
+    final_latency = last_final - speech_end if last_final is not None and speech_end is not None else None
+    return text, final_latency
+
+
+async def run_dialogue(client, url, prompt):
+    """
+    返回 (首包音频时间, 流完成时间)。
+    """
+    body = {"input_mode": "text", "prompt": prompt, "voice_id": "", "voice_speed": ""}
+    start = time.perf_counter()
+    first_audio = None
+    buffer = ""
+    async with client.stream("POST", url, json=body, timeout=120) as response:
+        response.raise_for_status()
+        async for data in response.aiter_text():
+            buffer += data
+            lines = buffer.split("\n")
+            buffer = lines[-1]
+            for line in lines[:-1]:
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("audio") and first_audio is None:
+                    first_audio = time.perf_counter() - start
+    return first_audio, time.perf_counter() - start
+
+
+async def simulated_client(args, client, pcm_list, client_id, stats):
+    for r in range(args.rounds):
+        pcm = pcm_list[(client_id + r) % len(pcm_list)]
+        try:
+            text, asr_latency = await run_asr(args.asr_url, pcm, args.trailing_silence)
+            first_audio, total = await run_dialogue(client, args.eb_url, text or args.prompt)
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"client {client_id}: {e!r}")
+            continue
+        if asr_latency is not None:
+            stats["asr_final"].append(asr_latency)
+        if first_audio is not None:
+            stats["first_audio"].append(first_audio)
+        stats["stream_total"].append(total)
+        stats["completed"] += 1
+
+
+async def run_level(args, pcm_list, concurrency):
+    stats = {"asr_final": [], "first_audio": [], "stream_total": [], "completed": 0, "errors": 0}
+    start = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        await asyncio.gather(*[simulated_client(args, client, pcm_list, i, stats) for i in range(concurrency)])
+    stats["wall"] = time.perf_counter() - start
+    return stats
+
+
+def print_level(concurrency, stats):
+    print(f"\n== concurrency {concurrency}: {stats['completed']} conversations, "
+          f"{stats['errors']} errors, {stats['wall']:.1f}s ==")
+    print(f"{'metric':<18}{'n':>6}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name in ["asr_final", "first_audio", "stream_total"]:
+        values = stats[name]
+        row = [percentile(values, q) * 1000 for q in (50, 90, 99, 100)]
+        print(f"{name:<18}{len(values):>6}" + "".join(f"{v:>10.0f}" for v in row))
+
+
+def print_saturation(results):
+    print("\n== saturation curve ==")
+    print(f"{'clients':>8}{'conv/min':>10}{'first_audio p99(ms)':>22}{'asr_final p99(ms)':>20}  p99 first audio")
+    worst = max([percentile(s["first_audio"], 99) for _, s in results if s["first_audio"]] or [1.0])
+    for concurrency, stats in results:
+        throughput = stats["completed"] / stats["wall"] * 60 if stats["wall"] else 0
+        fa = percentile(stats["first_audio"], 99)
+        asr = percentile(stats["asr_final"], 99)
+        bar = "#" * int(40 * fa / worst) if fa == fa else ""
+        print(f"{concurrency:>8}{throughput:>10.1f}{fa * 1000:>22.0f}{asr * 1000:>20.0f}  {bar}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="localhost:8888", help="server address")
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8", help="comma separated concurrency levels")
+    parser.add_argument("--rounds", type=int, default=2, help="conversations per client per level")
+    parser.add_argument("--wav", type=str, nargs="*", default=None, help="input wav files, default video_data/audio*.wav")
+    parser.add_argument("--prompt", type=str, default="介绍一下你自己", help="fallback prompt when ASR returns nothing")
+    parser.add_argument("--trailing-silence", type=float, default=1.5, help="seconds of silence appended after speech")
+    parser.add_argument("--json", type=str, default=None, help="write raw results to this file")
+    args = parser.parse_args()
+
+    args.asr_url = f"ws://{args.host}/asr?samplerate={SAMPLE_RATE}"
+    args.eb_url = f"http://{args.host}/eb_stream"
+    wav_files = args.wav or sorted(glob.glob(os.path.join(project_root, "video_data", "audio*.wav")))
+    if not wav_files:
+        sys.exit("no input wav found")
+    pcm_list = [load_pcm(path) for path in wav_files]
+
+    results = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        stats = asyncio.run(run_level(args, pcm_list, concurrency))
+        print_level(concurrency, stats)
+        results.append((concurrency, stats))
+    print_saturation(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"concurrency": c, **s} for c, s in results], f, indent=2)
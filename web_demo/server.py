@@ -5,8 +5,7 @@ import re
 import base64
 import os
 import sys
-from fastapi.responses import StreamingResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi import FastAPI, Request, UploadFile, File,HTTPException
 
 # 获取脚本所在目录
@@ -25,10 +24,21 @@ if not os.path.exists(static_dir):
     # 如果在项目根目录运行，尝试 web_demo/static
     static_dir = os.path.join(project_root, "web_demo", "static")
 
+from static_assets import CachedStaticFiles
+
 app = FastAPI()
 
-# 挂载静态文件
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# 挂载静态文件（内容哈希 ETag、长期缓存、预压缩 JS）
+static_files = CachedStaticFiles(directory=static_dir)
+app.mount("/static", static_files, name="static")
+
+
+@app.get("/static_manifest.json")
+async def static_manifest():
+    # 静态资源路径 -> 带版本号的地址
+    return JSONResponse(static_files.index.manifest(), headers={"cache-control": "no-cache"})
+
+from voiceapi.segmenter import split_sentence, SentenceSegmenter
 
 # 导入 LLM 模块
 try:
@@ -158,34 +168,6 @@ def llm_answer(prompt):
         answer = "我会重复三遍来模仿大模型的回答，我会重复三遍来模仿大模型的回答，我会重复三遍来模仿大模型的回答。"
         return answer
 
-def split_sentence(sentence, min_length=10):
-    # 定义包括小括号在内的主要标点符号
-    punctuations = r'[。？！；…，、()（）]'
-    # 使用正则表达式切分句子，保留标点符号
-    parts = re.split(f'({punctuations})', sentence)
-    parts = [p for p in parts if p]  # 移除空字符串
-    sentences = []
-    current = ''
-    for part in parts:
-        if current:
-            # 如果当前片段加上新片段长度超过最小长度，则将当前片段添加到结果中
-            if len(current) + len(part) >= min_length:
-                sentences.append(current + part)
-                current = ''
-            else:
-                current += part
-        else:
-            current = part
-    # 将剩余的片段添加到结果中
-    if len(current) >= 2:
-        sentences.append(current)
-    return sentences
-
-PUNCTUATION_SET = {
-    '，', " ", '。', '！', '？', '；', '：', '、', '（', '）', '【', '】', '“', '”',
-    ',', '.', '!', '?', ';', ':', '(', ')', '[', ']', '"', "'"
-}
-
 async def gen_stream(prompt, asr = False, voice_speed=None, voice_id=None):
     print("gen_stream", voice_speed, voice_id)
     if asr:
@@ -199,60 +181,29 @@ async def gen_stream(prompt, asr = False, voice_speed=None, voice_id=None):
         try:
             print("----- streaming request -----")
             stream = llm_stream(prompt)
-            llm_answer_cache = ""
-            
+            # 增量断句：只扫描新到的文字，首句尽快送 TTS，后续句子逐渐变长
+            segmenter = SentenceSegmenter()
+
             for chunk in stream:
                 if not chunk.choices:
                     continue
                 content = chunk.choices[0].delta.content or ""
                 if not content:
                     continue
-                    
-                llm_answer_cache += content
 
-                # 查找最近的标点符号位置（从后往前查找最近50个字符）
-                search_end = len(llm_answer_cache)
-                search_start = max(0, search_end - 50)
-                punctuation_pos = -1
-                for i in range(search_end - 1, search_start - 1, -1):
-                    if llm_answer_cache[i] in PUNCTUATION_SET:
-                        punctuation_pos = i
-                        break
-                
-                # 如果找到标点符号且累积的文本足够长（至少15个字符）
-                if punctuation_pos != -1 and punctuation_pos + 1 >= 15:
-                    # 获取到标点符号为止的句子
-                    first_sentence = llm_answer_cache[:punctuation_pos + 1]
-                    # 剩余的文字
-                    remaining_text = llm_answer_cache[punctuation_pos + 1:]
-                    print("get_audio: ", first_sentence)
-                    base64_string = await get_audio(first_sentence, voice_speed, voice_id)
+                for sentence in segmenter.feed(content):
+                    print("get_audio: ", sentence)
+                    base64_string = await get_audio(sentence, voice_speed, voice_id)
                     chunk_data = {
-                        "text": first_sentence,
+                        "text": sentence,
                         "audio": base64_string,
                         "endpoint": False
                     }
-                    # 更新缓存为剩余的文字
-                    llm_answer_cache = remaining_text
                     yield f"{json.dumps(chunk_data)}\n"
                     await asyncio.sleep(0.2)
-                # 如果累积的文本太长（超过60个字符）还没找到标点，强制输出一部分
-                elif len(llm_answer_cache) >= 60:
-                    # 输出前50个字符
-                    first_sentence = llm_answer_cache[:50]
-                    remaining_text = llm_answer_cache[50:]
-                    print("get_audio (forced): ", first_sentence)
-                    base64_string = await get_audio(first_sentence, voice_speed, voice_id)
-                    chunk_data = {
-                        "text": first_sentence,
-                        "audio": base64_string,
-                        "endpoint": False
-                    }
-                    llm_answer_cache = remaining_text
-                    yield f"{json.dumps(chunk_data)}\n"
-                    await asyncio.sleep(0.2)
-            
+
             # 处理剩余的文字
+            llm_answer_cache = segmenter.flush()
             if llm_answer_cache and len(llm_answer_cache.strip()) > 0:
                 print("get_audio (final): ", llm_answer_cache)
                 base64_string = await get_audio(llm_answer_cache, voice_speed, voice_id)
@@ -262,6 +213,8 @@ async def gen_stream(prompt, asr = False, voice_speed=None, voice_id=None):
                     "endpoint": True
                 }
                 yield f"{json.dumps(chunk_data)}\n"
+            else:
+                yield f"{json.dumps({'text': '', 'audio': '', 'endpoint': True})}\n"
         except Exception as e:
             import traceback
             print(f"❌ 大模型流式调用失败: {e}")
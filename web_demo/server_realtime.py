@@ -5,8 +5,8 @@ from contextlib import asynccontextmanager
 import re
 import asyncio
 import base64
-from fastapi.responses import StreamingResponse
-from fastapi.staticfiles import StaticFiles
+import time
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi import FastAPI, Request, UploadFile, File,HTTPException,WebSocketDisconnect,WebSocket
 
 # 获取脚本所在目录
@@ -18,13 +18,21 @@ project_root = os.path.dirname(script_dir) if os.path.basename(script_dir) == "w
 web_demo_dir = script_dir if os.path.basename(script_dir) == "web_demo" else os.path.join(project_root, "web_demo")
 if web_demo_dir not in sys.path:
     sys.path.insert(0, web_demo_dir)
+# 服务端渲染（--server-render）需要导入 mini_live、talkingface
+if project_root not in sys.path:
+    sys.path.append(project_root)
 
 # 在路径设置之后导入 voiceapi 模块
 from voiceapi.asr import start_asr_stream, ASRResult,ASREngineManager
 import uvicorn
 import argparse
 from voiceapi.llm import llm_stream
-from voiceapi.tts import get_audio,TTSEngineManager
+from voiceapi.tts import get_audio,get_audio_stream,TTSEngineManager
+from voiceapi import metrics
+from voiceapi.metrics import SessionTrace
+from voiceapi.conversation import conversations
+from voiceapi.segmenter import SentenceSegmenter
+from static_assets import CachedStaticFiles
 
 # 静态文件目录
 static_dir = os.path.join(script_dir, "static")
@@ -40,6 +48,14 @@ async def lifespan(app: FastAPI):
     ASREngineManager.initialize(samplerate=16000, args = args)
     print("TTS模型正在初始化，请稍等")
     TTSEngineManager.initialize(args = args)
+    if args.server_render:
+        global renderer
+        print("服务端渲染模型正在初始化，请稍等")
+        from mini_live.server_render import ServerRenderer
+        renderer = ServerRenderer(os.path.join(project_root, args.render_ckpt),
+                                  os.path.join(project_root, args.audio_ckpt),
+                                  jpeg_quality=args.render_quality)
+        register_render_metrics(renderer)
     yield
     # 服务关闭时清理资源
     if ASREngineManager.get_engine():
@@ -48,93 +64,140 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan)
 
-# 挂载静态文件
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
-
-def split_sentence(sentence, min_length=10):
-    # 定义包括小括号在内的主要标点符号
-    punctuations = r'[。？！；…，、()（）]'
-    # 使用正则表达式切分句子，保留标点符号
-    parts = re.split(f'({punctuations})', sentence)
-    parts = [p for p in parts if p]  # 移除空字符串
-    sentences = []
-    current = ''
-    for part in parts:
-        if current:
-            # 如果当前片段加上新片段长度超过最小长度，则将当前片段添加到结果中
-            if len(current) + len(part) >= min_length:
-                sentences.append(current + part)
-                current = ''
-            else:
-                current += part
-        else:
-            current = part
-    # 将剩余的片段添加到结果中
-    if len(current) >= 2:
-        sentences.append(current)
-    return sentences
-
-PUNCTUATION_SET = {
-    '，', " ", '。', '！', '？', '；', '：', '、', '（', '）', '【', '】', '“', '”',
-    ',', '.', '!', '?', ';', ':', '(', ')', '[', ']', '"', "'"
-}
-
-async def gen_stream(prompt, asr = False, voice_speed=None, voice_id=None):
-    print("gen_stream", voice_speed, voice_id)
-    if asr:
+# 服务端渲染：共享渲染器，以及 conversation_id -> RenderSession
+renderer = None
+render_sessions = {}
+
+# 挂载静态文件（内容哈希 ETag、长期缓存、预压缩 JS）
+static_files = CachedStaticFiles(directory=static_dir)
+app.mount("/static", static_files, name="static")
+
+
+@app.get("/static_manifest.json")
+async def static_manifest():
+    # 静态资源路径 -> 带版本号的地址
+    return JSONResponse(static_files.index.manifest(), headers={"cache-control": "no-cache"})
+
+
+async def tts_chunks(sentence, voice_speed, voice_id, trace, turn):
+    """
+    把一句话转成若干 (文本, base64 WAV)；开启 --tts-stream 时按小句流式返回。
+    """
+    if args.tts_stream:
+        # 流式 TTS：小句合成完即发送，不等整句
+        async for text, base64_string in get_audio_stream(sentence, voice_id=voice_id, voice_speed=voice_speed, trace=trace, turn=turn):
+            yield text, base64_string
+    else:
+        base64_string = await get_audio(sentence, voice_id=voice_id, voice_speed=voice_speed, trace=trace, turn=turn)
+        if not turn.cancelled.is_set():
+            yield sentence, base64_string
+
+
+async def llm_tokens(prompt, turn):
+    """
+    在线程池中逐块读取 LLM 流，避免阻塞事件循环；turn 取消后关闭上游流并停止。
+    """
+    loop = asyncio.get_event_loop()
+    stream = await loop.run_in_executor(None, llm_stream, prompt)
+    turn.llm_stream = stream
+    iterator = iter(stream)
+    try:
+        while not turn.cancelled.is_set():
+            try:
+                chunk = await loop.run_in_executor(None, next, iterator, None)
+            except Exception:
+                if turn.cancelled.is_set():
+                    return
+                raise
+            if chunk is None:
+                return
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content or ""
+            if content:
+                yield content
+    finally:
+        turn.llm_stream = None
+
+
+async def gen_stream(prompt, asr = False, voice_speed=None, voice_id=None, turn=None):
+    trace = SessionTrace("eb_stream", turn.conversation_id)
+    start = time.perf_counter()
+    first_audio_sent = False
+    finished = False
+
+    render_session = render_sessions.get(turn.conversation_id)
+
+    def audio_chunk(text, base64_string, endpoint):
+        nonlocal first_audio_sent
+        if base64_string and not first_audio_sent:
+            first_audio_sent = True
+            elapsed = time.perf_counter() - start
+            metrics.first_audio.observe(elapsed)
+            trace.mark("time_to_first_audio", elapsed)
+        if base64_string and render_session is not None:
+            # 服务端渲染：音频随视频帧从 /render 下发，这里只返回文字
+            renderer.push_audio(render_session, base64_string)
+            base64_string = ""
         chunk = {
-            "prompt": prompt
+            "text": text,
+            "audio": base64_string,
+            "endpoint": endpoint
         }
-        yield f"{json.dumps(chunk)}\n"  # 使用换行符分隔 JSON 块
-
-    # Streaming:
-    print("----- streaming request -----")
-    stream = llm_stream(prompt)
-    llm_answer_cache = ""
-    for chunk in stream:
-        if not chunk.choices:
-            continue
-        llm_answer_cache += chunk.choices[0].delta.content
-
-        # 查找第一个标点符号的位置
-        punctuation_pos = -1
-        for i, char in enumerate(llm_answer_cache[8:]):
-            if char in PUNCTUATION_SET:
-                punctuation_pos = i + 8
-                break
-        # 如果找到标点符号且第一小句字数大于8
-        if punctuation_pos != -1:
-            # 获取第一小句
-            first_sentence = llm_answer_cache[:punctuation_pos + 1]
-            # 剩余的文字
-            remaining_text = llm_answer_cache[punctuation_pos + 1:]
-            print("get_audio: ", first_sentence)
-            base64_string = await get_audio(first_sentence, voice_id=voice_id, voice_speed=voice_speed)
+        return f"{json.dumps(chunk)}\n"  # 使用换行符分隔 JSON 块
+
+    try:
+        if asr:
             chunk = {
-                "text": first_sentence,
-                "audio": base64_string,
-                "endpoint": False
+                "prompt": prompt
             }
-
-            # 更新缓存为剩余的文字
-            llm_answer_cache = remaining_text
             yield f"{json.dumps(chunk)}\n"  # 使用换行符分隔 JSON 块
-            await asyncio.sleep(0.2)  # 模拟异步延迟
-    print("get_audio: ", llm_answer_cache)
-    if len(llm_answer_cache) >= 2:
-        base64_string = await get_audio(llm_answer_cache, voice_id=voice_id, voice_speed=voice_speed)
-    else:
-        base64_string = ""
-    chunk = {
-            "text": llm_answer_cache,
-            "audio": base64_string,
-            "endpoint": True
-    }
-    yield f"{json.dumps(chunk)}\n"  # 使用换行符分隔 JSON 块
+
+        # Streaming:
+        segmenter = SentenceSegmenter()
+        sentence_start = None
+        first_token = True
+        async for content in llm_tokens(prompt, turn):
+            if first_token:
+                first_token = False
+                elapsed = time.perf_counter() - start
+                metrics.llm_first_token.observe(elapsed)
+                trace.mark("llm_first_token", elapsed)
+            if sentence_start is None:
+                sentence_start = time.perf_counter()
+
+            # 增量断句：只扫描新到的文字
+            for sentence in segmenter.feed(content):
+                elapsed = time.perf_counter() - sentence_start
+                metrics.sentence_split_delay.observe(elapsed)
+                trace.mark("sentence_split_delay", elapsed)
+                sentence_start = time.perf_counter() if segmenter.pending else None
+
+                async for text, base64_string in tts_chunks(sentence, voice_speed, voice_id, trace, turn):
+                    yield audio_chunk(text, base64_string, False)
+                if not args.tts_stream:
+                    await asyncio.sleep(0.2)  # 模拟异步延迟
+        if turn.cancelled.is_set():
+            return
+        rest = segmenter.flush()
+        if len(rest) >= 2:
+            async for text, base64_string in tts_chunks(rest, voice_speed, voice_id, trace, turn):
+                yield audio_chunk(text, base64_string, False)
+            yield audio_chunk("", "", True)
+        else:
+            yield audio_chunk(rest, "", True)
+        finished = True
+    finally:
+        # 客户端断开（生成器被关闭）或中途取消时，释放 LLM 流和排队中的 TTS 任务
+        if not finished:
+            turn.cancel("client disconnected")
+        if turn.cancelled.is_set() and render_session is not None:
+            renderer.interrupt(render_session)
+        conversations.finish_turn(turn)
+        trace.close()
 
 @app.websocket("/asr")
-async def websocket_asr(websocket: WebSocket, samplerate: int = 16000):
+async def websocket_asr(websocket: WebSocket, samplerate: int = 16000, conversation_id: str = None):
     await websocket.accept()
 
     asr_stream = await start_asr_stream(samplerate, args)
@@ -142,8 +205,12 @@ async def websocket_asr(websocket: WebSocket, samplerate: int = 16000):
         print("failed to start ASR stream")
         await websocket.close()
         return
+    # ASR 会话与后续 /eb_stream 回答共用同一个会话 id（服务端渲染时沿用 /render 分配的 id）
+    conversation_id = conversation_id or conversations.new_id()
+    speaking = False
 
     async def task_recv_pcm():
+        nonlocal speaking
         while True:
             try:
                 data = await asyncio.wait_for(websocket.receive(), timeout=1.0)
@@ -152,16 +219,19 @@ async def websocket_asr(websocket: WebSocket, samplerate: int = 16000):
                 continue  # 没有数据到达，继续循环
 
             if "text" in data.keys():
-                print(f"Received text message: {data}")
                 data = data["text"]
                 if data.strip() == "vad":
-                    print("VAD signal received")
+                    speaking = False
+                    conversations.cancel(conversation_id, "vad")
                     await asr_stream.vad_touched()
             elif "bytes" in data.keys():
                 pcm_bytes = data["bytes"]
-                print("XXXX pcm_bytes", len(pcm_bytes))
                 if not pcm_bytes:
                     return
+                if not speaking:
+                    # 用户重新开口：打断仍在进行的回答
+                    speaking = True
+                    conversations.cancel(conversation_id, "barge-in")
                 await asr_stream.write(pcm_bytes)
 
 
@@ -170,14 +240,82 @@ async def websocket_asr(websocket: WebSocket, samplerate: int = 16000):
             result: ASRResult = await asr_stream.read()
             if not result:
                 return
-            await websocket.send_json(result.to_dict())
+            await websocket.send_json({**result.to_dict(), "conversation_id": conversation_id})
     try:
         await asyncio.gather(task_recv_pcm(), task_send_result())
     except WebSocketDisconnect:
         print("asr: disconnected")
     finally:
+        conversations.cancel(conversation_id, "asr disconnected")
         await asr_stream.close()
 
+def register_render_metrics(renderer):
+    # 按会话导出截止时间统计和降级级别
+    def per_session(index):
+        return lambda: [({"session": sid}, stat[index]) for sid, *stat in renderer.session_stats()]
+    metrics.register(metrics.Collector("render_frames_total", "Frames sent per server-render session.",
+                                       per_session(0), type="counter"))
+    metrics.register(metrics.Collector("render_deadline_missed_total", "Frames sent after their playout deadline per session.",
+                                       per_session(1), type="counter"))
+    metrics.register(metrics.Collector("render_deadline_miss_ratio", "Fraction of frames that missed their playout deadline per session.",
+                                       per_session(2)))
+    metrics.register(metrics.Collector("render_degrade_level", "Current degradation level per server-render session (0-3).",
+                                       per_session(3)))
+
+@app.websocket("/render")
+async def websocket_render(websocket: WebSocket, character: str = "assets"):
+    """
+    服务端渲染：推送合成好的视频帧（二进制：4 字节 pts + JPEG）和控制消息（JSON：音频、清空）。
+    """
+    await websocket.accept()
+    character_dir = os.path.realpath(os.path.join(static_dir, character))
+    if renderer is None or not character_dir.startswith(os.path.realpath(static_dir) + os.sep) \
+            or not any(os.path.isfile(os.path.join(character_dir, name))
+                       for name in ("combined_data.bin.gz", "combined_data.json.gz")):
+        await websocket.close(code=1008)
+        return
+    from mini_live.server_render import load_character, FPS
+    loop = asyncio.get_event_loop()
+    assets = await loop.run_in_executor(None, load_character, character_dir)
+
+    conversation_id = conversations.new_id()
+    session = renderer.open_session(conversation_id, assets, loop)
+    render_sessions[conversation_id] = session
+    await websocket.send_json({"type": "session", "conversation_id": conversation_id, "fps": FPS,
+                               "width": assets.width, "height": assets.height})
+
+    async def task_send():
+        while True:
+            item = await session.out.get()
+            if isinstance(item, bytes):
+                await websocket.send_bytes(item)
+            else:
+                await websocket.send_json(item)
+
+    async def task_recv():
+        while True:
+            data = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                return
+            if data.get("text", "").strip() == "interrupt":
+                conversations.cancel(conversation_id, "interrupt")
+
+    sender = asyncio.create_task(task_send())
+    try:
+        await task_recv()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        render_sessions.pop(conversation_id, None)
+        renderer.close_session(session)
+        conversations.cancel(conversation_id, "render disconnected")
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus 文本格式的延迟直方图
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/eb_stream")    # 前端调用的path
 async def eb_stream(request: Request):
     try:
@@ -193,7 +331,8 @@ async def eb_stream(request: Request):
 
         if input_mode == "text":
             prompt = body.get("prompt")
-            return StreamingResponse(gen_stream(prompt, asr=False, voice_speed=voice_speed, voice_id=voice_id), media_type="application/json")
+            turn = conversations.start_turn(body.get("conversation_id"))
+            return StreamingResponse(gen_stream(prompt, asr=False, voice_speed=voice_speed, voice_id=voice_id, turn=turn), media_type="application/json")
         else:
             raise HTTPException(status_code=400, detail="Invalid input mode")
     except Exception as e:
@@ -233,6 +372,9 @@ if __name__ == "__main__":
     parser.add_argument("--threads", type=int, default=2,
                         help="number of threads")
 
+    parser.add_argument("--asr-workers", type=int, default=2,
+                        help="number of offline ASR decode workers (sensevoice, paraformer, whisper)")
+
     parser.add_argument("--models-root", type=str, default=models_root,
                         help="model root directory")
 
@@ -245,7 +387,31 @@ if __name__ == "__main__":
     parser.add_argument("--tts-model", type=str, default='sherpa-onnx-vits-zh-ll',
                         help="TTS model name: vits-zh-hf-theresa, vits-melo-tts-zh_en")
 
+    parser.add_argument("--tts-stream", action="store_true",
+                        help="stream TTS audio clause by clause to reduce time-to-first-audio")
+
+    parser.add_argument("--llm", type=str, default="openai", choices=["openai", "scripted"],
+                        help="LLM backend; 'scripted' replays a fixed local answer (for load testing)")
+
+    parser.add_argument("--server-render", action="store_true",
+                        help="render video frames on the server and stream them over /render (for thin clients)")
+
+    parser.add_argument("--render-ckpt", type=str, default="checkpoint/DINet_mini/epoch_40.pth",
+                        help="mouth render checkpoint for --server-render, relative to the project root")
+
+    parser.add_argument("--audio-ckpt", type=str, default="checkpoint/lstm/lstm_model_epoch_325.pkl",
+                        help="audio-to-blendshape checkpoint for --server-render, relative to the project root")
+
+    parser.add_argument("--render-quality", type=int, default=80,
+                        help="JPEG quality of server rendered frames")
+
+    parser.add_argument("--trace-log", type=str, default=None,
+                        help="append per-request latency traces (JSON lines) to this file")
+
     args = parser.parse_args()
+    metrics.set_trace_file(args.trace_log)
+    if args.llm == "scripted":
+        from voiceapi.llm_scripted import llm_stream
 
     if args.tts_model == 'vits-melo-tts-zh_en' and args.tts_provider == 'cuda':
         print(
@@ -42,7 +42,7 @@ class VideoProcessor {
         this.offscreenCtx = null;
     }
 
-    async init(videoUrl, gzipUrl) {
+    async init(videoUrl, gzipUrl, binUrl = null) {
         // 清空旧数据
         this.videoFrames = [];
         this.countSample = 0;
@@ -59,19 +59,46 @@ class VideoProcessor {
         // 重新绑定事件处理函数
         this.mp4box.onReady = this.handleReady.bind(this);
         this.mp4box.onSamples = this.handleSamples.bind(this);
+        // 先加载人物数据，按设备能力选择视频版本（rendition）后再加载视频
+        await this.fetchVideoUtilData(gzipUrl, binUrl);
+        const rendition = pickRendition(this.combinedData);
+        if (rendition) {
+            videoUrl = await versionedUrl(videoUrl.split('?')[0].replace(/[^/]*$/, rendition.file));
+            this.combinedData.json_data.forEach((item, i) => { item.rect = rendition.rects[i]; });
+            console.log(`使用视频版本 ${rendition.file} (${rendition.width}x${rendition.height})`);
+        }
+        this.loadStart = performance.now();
+        this.firstFrameLogged = false;
         await this.fetchVideo(videoUrl);
-        await this.fetchVideoUtilData(gzipUrl);
     }
 
     async fetchVideo(url) {
         const response = await fetch(url);
         const buffer = await response.arrayBuffer();
+        console.log(`视频下载: ${(buffer.byteLength / 1024 / 1024).toFixed(2)} MB, ` +
+                    `${(performance.now() - this.loadStart).toFixed(0)} ms`);
         buffer.fileStart = 0;
         this.mp4box.appendBuffer(buffer);
         this.mp4box.flush();
     }
 
-    async fetchVideoUtilData(gzipUrl) {
+    async fetchVideoUtilData(gzipUrl, binUrl = null) {
+        // 优先加载二进制格式 combined_data.bin.gz；不存在、解析失败或比 json.gz 旧（替换了 json 而没有重新生成 bin）时
+        // 使用 json，与 talkingface/character_data.py 的 load_character_data 规则相同
+        if (binUrl) {
+            try {
+                const response = await fetch(binUrl);
+                if (response.ok && !await binNotOlderThanJson(response, gzipUrl)) {
+                    console.warn('combined_data.bin.gz 比 combined_data.json.gz 旧，改用 json');
+                } else if (response.ok) {
+                    const data = pako.inflate(new Uint8Array(await response.arrayBuffer()));
+                    this.combinedData = parseCombinedDataBin(data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength));
+                    return;
+                }
+            } catch (error) {
+                console.warn('combined_data.bin.gz 加载失败，改用 json:', error);
+            }
+        }
         // 从服务器加载 Gzip 压缩的 JSON 文件
         const response = await fetch(gzipUrl);
         const compressedData = await response.arrayBuffer();
@@ -115,6 +142,10 @@ class VideoProcessor {
     }
 
     handleVideoFrame(videoFrame) {
+        if (!this.firstFrameLogged) {
+            this.firstFrameLogged = true;
+            console.log(`首帧解码: ${(performance.now() - this.loadStart).toFixed(0)} ms`);
+        }
         if (tag_ios17)
         {
             createImageBitmap(videoFrame).then(img => {
@@ -201,7 +232,138 @@ class VideoProcessor {
     }
 }
 
+// combined_data.bin.gz 的段类型，与 talkingface/character_data.py 的 DTYPES 对应（float16 以 Uint16Array 读取）
+const CHARACTER_DTYPES = [Uint8Array, Uint16Array, Float32Array, Int16Array, Int32Array, Uint16Array];
+
+function halfToFloat(h) {
+    const sign = (h & 0x8000) ? -1 : 1;
+    const exponent = (h >> 10) & 0x1f;
+    const fraction = h & 0x3ff;
+    if (exponent === 0) return sign * Math.pow(2, -14) * (fraction / 1024);
+    if (exponent === 31) return fraction ? NaN : sign * Infinity;
+    return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+}
+
+// 解析 combined_data.bin，还原成与 combined_data.json 相同结构的对象
+// 按 Last-Modified 比较 bin.gz 与 json.gz 的修改时间；取不到时间时认为 bin.gz 可用
+async function binNotOlderThanJson(binResponse, jsonUrl) {
+    const binTime = Date.parse(binResponse.headers.get('last-modified'));
+    if (isNaN(binTime)) return true;
+    const jsonResponse = await fetch(jsonUrl, { method: 'HEAD' });
+    if (!jsonResponse.ok) return true;
+    const jsonTime = Date.parse(jsonResponse.headers.get('last-modified'));
+    return isNaN(jsonTime) || binTime >= jsonTime;
+}
+
+function parseCombinedDataBin(buffer) {
+    const view = new DataView(buffer);
+    const decoder = new TextDecoder();
+    if (decoder.decode(new Uint8Array(buffer, 0, 4)) !== 'DHCD') {
+        throw new Error('不是人物数据文件');
+    }
+    const numSections = view.getUint16(6, true);
+    const sections = {};
+    let offset = 8;
+    for (let i = 0; i < numSections; i++) {
+        const name = decoder.decode(new Uint8Array(buffer, offset, 8)).replace(/\0+$/, '');
+        const ArrayType = CHARACTER_DTYPES[view.getUint8(offset + 8)];
+        const ndim = view.getUint8(offset + 9);
+        const shape = [view.getUint32(offset + 12, true), view.getUint32(offset + 16, true),
+                       view.getUint32(offset + 20, true)].slice(0, ndim);
+        const scale = view.getFloat32(offset + 24, true);
+        const nbytes = view.getUint32(offset + 28, true);
+        offset += 32;
+        sections[name] = { data: new ArrayType(buffer, offset, nbytes / ArrayType.BYTES_PER_ELEMENT), shape, scale };
+        offset += nbytes + (4 - nbytes % 4) % 4;
+    }
+
+    const meta = JSON.parse(decoder.decode(sections.meta.data));
+    const mat = sections.mat.data;
+    const rect = sections.rect.data;
+    const vmean = sections.vmean.data;
+    const vdelta = sections.vdelta.data;
+    const scale = sections.vmean.scale;
+    const numFrames = sections.mat.shape[0];
+    const numValues = vmean.length;
+    const json_data = new Array(numFrames);
+    for (let i = 0; i < numFrames; i++) {
+        const points = new Array(16 + numValues);
+        for (let k = 0; k < 16; k++) {
+            points[k] = mat[i * 16 + k];
+        }
+        for (let k = 0; k < numValues; k++) {
+            points[16 + k] = (vmean[k] + vdelta[i * numValues + k]) / scale;
+        }
+        json_data[i] = { rect: Array.from(rect.subarray(i * 4, i * 4 + 4)), points };
+    }
+
+    const face3D_obj = [];
+    const meshv = sections.meshv.data;
+    for (let i = 0; i < meshv.length; i += 5) {
+        face3D_obj.push(`v ${meshv[i].toFixed(3)} ${meshv[i + 1].toFixed(3)} ${meshv[i + 2].toFixed(3)} ` +
+                        `${meshv[i + 3].toFixed(2)} ${meshv[i + 4].toFixed(0)}\n`);
+    }
+    const meshf = sections.meshf.data;
+    for (let i = 0; i < meshf.length; i += 3) {
+        face3D_obj.push(`f ${meshf[i] + 1} ${meshf[i + 1] + 1} ${meshf[i + 2] + 1}\n`);
+    }
+
+    const combinedData = {
+        uid: meta.uid,
+        frame_num: meta.frame_num,
+        face3D_obj,
+        ref_data: Array.from(sections.ref.data, halfToFloat),
+        json_data,
+        authorized: meta.authorized,
+    };
+    if (meta.renditions && meta.renditions.length) {
+        combinedData.renditions = meta.renditions.map(r => {
+            const data = sections[r.section].data;
+            const rects = new Array(numFrames);
+            for (let i = 0; i < numFrames; i++) {
+                rects[i] = Array.from(data.subarray(i * 4, i * 4 + 4));
+            }
+            return { file: r.file, width: r.width, height: r.height, rects };
+        });
+    }
+    return combinedData;
+}
+
+// 按设备能力选择低分辨率视频：所有帧都解码成位图常驻内存，低端设备用小分辨率能明显降低内存和解码时间。
+// URL 参数 ?rendition=480 可以按高度强制指定
+function pickRendition(combinedData) {
+    const renditions = (combinedData.renditions || []).slice().sort((a, b) => a.height - b.height);
+    if (!renditions.length) return null;
+    const forced = new URLSearchParams(window.location.search).get('rendition');
+    if (forced !== null) {
+        return renditions.find(r => r.height === parseInt(forced)) || null;
+    }
+    // 视频最多显示为屏幕高度，再按设备内存 / 核数限制
+    let maxHeight = window.screen.height * (window.devicePixelRatio || 1);
+    if ((navigator.deviceMemory && navigator.deviceMemory <= 2) || (navigator.hardwareConcurrency || 8) <= 2) {
+        maxHeight = Math.min(maxHeight, 480);
+    } else if ((navigator.deviceMemory && navigator.deviceMemory <= 4) || (navigator.hardwareConcurrency || 8) <= 4) {
+        maxHeight = Math.min(maxHeight, 720);
+    }
+    // renditions 包含原视频 01.mp4；取不超过 maxHeight 的最大版本，都超过时用最小的版本
+    const fit = renditions.filter(r => r.height <= maxHeight);
+    return fit.length ? fit[fit.length - 1] : renditions[0];
+}
+
 let asset_dir = "assets";
+let assetManifest = null;
+// 从服务器获取带内容哈希的资源地址，命中浏览器长期缓存；服务器不支持时回退到原地址
+async function versionedUrl(path) {
+    if (assetManifest === null) {
+        try {
+            const response = await fetch("/static_manifest.json", { cache: "no-cache" });
+            assetManifest = response.ok ? await response.json() : {};
+        } catch (error) {
+            assetManifest = {};
+        }
+    }
+    return assetManifest[path] || path;
+}
 let isPaused = false; // 标志位，控制是否暂停处理
 // 获取 characterDropdown 元素
 const characterDropdown = document.getElementById('characterDropdown');
@@ -213,7 +375,8 @@ if (characterDropdown) {
         document.getElementById('startMessage').style.display = 'block';
         asset_dir = this.value;
         console.log('Selected character:', asset_dir);
-        await videoProcessor.init(asset_dir + "/01.mp4", asset_dir + "/combined_data.json.gz");
+        await videoProcessor.init(await versionedUrl(asset_dir + "/01.mp4"), await versionedUrl(asset_dir + "/combined_data.json.gz"),
+                                  await versionedUrl(asset_dir + "/combined_data.bin.gz"));
         await loadCombinedData();
         await setupVertsBuffers();
         isPaused = false;
@@ -289,7 +452,7 @@ function parseObjFile(text) {
 
 async function loadCombinedData() {
     try {
-        let { json_data, ...WasmInputJson } = videoProcessor.combinedData;
+        let { json_data, renditions, ...WasmInputJson } = videoProcessor.combinedData;
 
         let jsonString = JSON.stringify(WasmInputJson);
         // 分配内存
@@ -468,8 +631,9 @@ async function setupVertsBuffers() {
 }
 
 async function newVideoTask() {
-    await videoProcessor.init("assets/01.mp4", "assets/combined_data.json.gz");
-    // 加载 combined_data.json.gz
+    await videoProcessor.init(await versionedUrl("assets/01.mp4"), await versionedUrl("assets/combined_data.json.gz"),
+                              await versionedUrl("assets/combined_data.bin.gz"));
+    // 加载 combined_data（bin.gz 或 json.gz）
     await loadCombinedData();
     await init_gl();
     await setupVertsBuffers();
@@ -7,6 +7,7 @@ let isVoiceMode = true;                 // 默认使用语音模式
 let asr_audio_recorder = new PCMAudioRecorder();
 let isRecording = false;     // 标记当前录音是否向ws传输
 let asr_input_text = "";     // 从ws接收到的ASR识别后的文本
+let conversation_id = "";    // 服务端分配的会话id，用于打断时取消上一轮回答
 let isNewASR = true;          // 开启新一轮的ASR,ASR返回文本要重新单独显示
 let last_voice_time = null;   // 上一次检测到人声的时间
 let last_3_voice_samples = [];
@@ -161,6 +162,9 @@ async function asr_realtime_ws() {
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
             console.log('Received data:', data);
+            if (data.conversation_id) {
+                conversation_id = data.conversation_id;
+            }
             if (data.idx == -1) {
                 console.log('asr round finished: ', asr_input_text);
                 // ws.close();
@@ -324,7 +328,7 @@ async function sendTextMessage(inputValue) {
                 characterName = ""; // 默认值
             }
         }
-        let requestBody = {"input_mode": "text", 'prompt': inputValue, 'voice_id': characterName, 'voice_speed': "" }
+        let requestBody = {"input_mode": "text", 'prompt': inputValue, 'voice_id': characterName, 'voice_speed': "", 'conversation_id': conversation_id }
         try {
             const response = await fetch(server_url, {
                 method: 'POST',
@@ -0,0 +1,142 @@
+// 服务端渲染瘦客户端：/render 推送 MJPEG 帧（4 字节小端 pts 毫秒 + JPEG）和 JSON 控制消息。
+// 帧和音频都按 pts 对齐到同一个 AudioContext 时钟播放。
+const character = new URLSearchParams(location.search).get("character") || "assets";
+const render_url = `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/render?character=${character}`;
+const server_url = `${location.origin}/eb_stream`;
+const JITTER_BUFFER = 0.15;   // 播放延后 150ms，吸收网络抖动
+
+const canvas = document.getElementById('canvas_video');
+const ctx = canvas.getContext('2d');
+const textInput = document.getElementById('text-input');
+const sendButton = document.getElementById('send-button');
+const startButton = document.getElementById('start-button');
+const statusText = document.getElementById('startMessage');
+
+let ws = null;
+let audioContext = null;
+let conversation_id = "";
+let clockBase = null;       // pts=0 对应的 audioContext 时间
+let frameQueue = [];        // 按 pts 递增的 {pts, bitmap}
+let audioSources = [];      // 已排期的音频，clear 时停止
+let sse_controller = null;
+
+function mediaTime() {
+    return (audioContext.currentTime - clockBase) * 1000;
+}
+
+async function onFrame(buffer) {
+    const pts = new DataView(buffer).getUint32(0, true);
+    const bitmap = await createImageBitmap(new Blob([buffer.slice(4)], { type: "image/jpeg" }));
+    if (clockBase === null) {
+        clockBase = audioContext.currentTime - pts / 1000 + JITTER_BUFFER;
+    }
+    // 帧大多按序到达，从尾部插入保持有序
+    let i = frameQueue.length;
+    while (i > 0 && frameQueue[i - 1].pts > pts) i--;
+    frameQueue.splice(i, 0, { pts, bitmap });
+}
+
+async function onAudio(message) {
+    const bytes = Uint8Array.from(atob(message.audio), c => c.charCodeAt(0));
+    const audioBuffer = await audioContext.decodeAudioData(bytes.buffer);
+    const source = audioContext.createBufferSource();
+    source.buffer = audioBuffer;
+    source.connect(audioContext.destination);
+    const when = clockBase === null ? 0 : clockBase + message.pts / 1000;
+    source.start(Math.max(when, audioContext.currentTime));
+    source.onended = () => { audioSources = audioSources.filter(s => s !== source); };
+    audioSources.push(source);
+}
+
+function onClear() {
+    // 回答被打断：停止已排期的音频，服务器随后发送的帧已是空闲帧
+    audioSources.forEach(s => { try { s.stop(); } catch (e) {} });
+    audioSources = [];
+}
+
+function drawLoop() {
+    if (clockBase !== null) {
+        const now = mediaTime();
+        let frame = null;
+        while (frameQueue.length > 0 && frameQueue[0].pts <= now) {
+            if (frame) frame.bitmap.close();
+            frame = frameQueue.shift();
+        }
+        if (frame) {
+            ctx.drawImage(frame.bitmap, 0, 0, canvas.width, canvas.height);
+            frame.bitmap.close();
+        }
+    }
+    requestAnimationFrame(drawLoop);
+}
+
+function connect() {
+    ws = new WebSocket(render_url);
+    ws.binaryType = "arraybuffer";
+    ws.onmessage = (event) => {
+        if (typeof event.data !== "string") {
+            onFrame(event.data);
+            return;
+        }
+        const message = JSON.parse(event.data);
+        if (message.type === "session") {
+            conversation_id = message.conversation_id;
+            canvas.width = message.width;
+            canvas.height = message.height;
+            textInput.disabled = false;
+            sendButton.disabled = false;
+            statusText.textContent = "";
+        } else if (message.type === "audio") {
+            onAudio(message);
+        } else if (message.type === "clear") {
+            onClear();
+        }
+    };
+    ws.onclose = () => {
+        textInput.disabled = true;
+        sendButton.disabled = true;
+        statusText.textContent = "连接已断开";
+    };
+}
+
+async function sendText() {
+    const prompt = textInput.value.trim();
+    if (!prompt) return;
+    textInput.value = "";
+    if (sse_controller) sse_controller.abort();
+    sse_controller = new AbortController();
+    // 音频由 /render 随视频下发，这里只读取文字
+    try {
+        const response = await fetch(server_url, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ input_mode: "text", prompt, voice_id: "", voice_speed: "", conversation_id }),
+            signal: sse_controller.signal
+        });
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let text = "";
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            for (const line of decoder.decode(value, { stream: true }).split("\n")) {
+                if (!line) continue;
+                try { text += JSON.parse(line).text || ""; } catch (e) {}
+            }
+            statusText.textContent = text;
+        }
+    } catch (e) {
+        if (e.name !== "AbortError") console.error(e);
+    }
+}
+
+startButton.addEventListener('click', () => {
+    // AudioContext 需要在用户交互后创建
+    audioContext = new (window.AudioContext || window.webkitAudioContext)();
+    startButton.disabled = true;
+    statusText.textContent = "连接中";
+    connect();
+    requestAnimationFrame(drawLoop);
+});
+sendButton.addEventListener('click', sendText);
+textInput.addEventListener('keydown', (e) => { if (e.key === 'Enter') sendText(); });
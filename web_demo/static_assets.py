@@ -0,0 +1,218 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 需要预压缩的 JS 包
+PRECOMPRESS_FILES = ["js/DHLiveMini.js", "js/mp4box.all.min.js"]
+# 带版本号（?v=<hash>）的请求使用长期缓存
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# 不带版本号的请求每次用 ETag 协商
+REVALIDATE_CACHE = "no-cache"
+_script_src = re.compile(r'(src|href)="((?:js|css)/[^"?]+)"')
+# 预压缩文件后缀与 Content-Encoding，按优先级排列
+VARIANTS = ((".br", "br"), (".gz", "gzip"))
+
+
+def file_digest(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def precompress(static_dir, files=PRECOMPRESS_FILES):
+    """
+    为 JS 包生成 .gz / .br 预压缩文件，源文件更新后重新生成。
+    """
+    for rel in files:
+        src = os.path.join(static_dir, rel)
+        if not os.path.exists(src):
+            continue
+        with open(src, "rb") as f:
+            data = None
+            for ext, compress in ((".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0)),
+                                  (".br", brotli.compress if brotli else None)):
+                dst = src + ext
+                if compress is None:
+                    continue
+                if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+                    continue
+                if data is None:
+                    data = f.read()
+                with open(dst, "wb") as out:
+                    out.write(compress(data))
+
+
+class AssetIndex:
+    """
+    静态文件的内容哈希，作为强 ETag 和 URL 版本号。
+    服务运行中人物素材可能被 process_video.py / generate_character.py 覆盖，
+    哈希按 (大小, mtime) 缓存，文件变化后重新计算。
+    """
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self._hashes = {}   # rel -> ((size, mtime_ns), digest)
+        self.scan()
+
+    def scan(self):
+        """
+        遍历目录，返回所有资源（不含预压缩文件）的相对路径，顺带更新哈希
+        """
+        rels = []
+        for root, _, files in os.walk(self.static_dir):
+            for name in files:
+                if name.endswith((".gz", ".br")) and os.path.exists(os.path.join(root, name[:-3])):
+                    continue
+                rel = os.path.relpath(os.path.join(root, name), self.static_dir).replace(os.sep, "/")
+                if self.digest(rel):
+                    rels.append(rel)
+        return rels
+
+    def digest(self, rel):
+        full_path = os.path.join(self.static_dir, rel)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            self._hashes.pop(rel, None)
+            return None
+        key = (st.st_size, st.st_mtime_ns)
+        cached = self._hashes.get(rel)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = file_digest(full_path)[:16]
+        self._hashes[rel] = (key, digest)
+        return digest
+
+    def etag(self, rel, encoding=None):
+        # 同一资源的不同编码字节不同，压缩版本的 ETag 加上编码后缀
+        digest = self.digest(rel)
+        if not digest:
+            return None
+        return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+    def url(self, rel):
+        digest = self.digest(rel)
+        return f"{rel}?v={digest}" if digest else rel
+
+    def manifest(self):
+        return {rel: self.url(rel) for rel in self.scan()}
+
+
+def _is_fresh_variant(variant, source_stat):
+    try:
+        return os.stat(variant).st_mtime_ns >= source_stat.st_mtime_ns
+    except OSError:
+        return False
+
+
+def _parse_accept_encoding(value):
+    """
+    解析 Accept-Encoding，返回 {编码: q}；q=0 表示明确拒绝该编码。
+    """
+    accepted = {}
+    for item in value.split(","):
+        token, *params = [p.strip() for p in item.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, v = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        accepted[token.lower()] = q
+    return accepted
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    在 StaticFiles 基础上增加：
+    - 基于内容哈希的强 ETag 与 If-None-Match 304；
+    - 带 ?v=<hash> 的 URL 返回 immutable 长期缓存头；
+    - 按 Accept-Encoding 返回预压缩的 .br / .gz；
+    - HTML 中的 js/css 引用改写为带版本号的 URL。
+    mp4 的 Range 请求由 FileResponse 直接按偏移读取文件。
+    """
+
+    def __init__(self, *, directory, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        precompress(directory)
+        self.index = AssetIndex(directory)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        rel = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        if rel.endswith(".html"):
+            # 改写后的 HTML 引用了各资源的版本号，ETag 按改写结果计算
+            with open(full_path, "r", encoding="utf-8") as f:
+                html = f.read()
+            html = _script_src.sub(lambda m: f'{m.group(1)}="{self.index.url(m.group(2))}"', html)
+            etag = '"{}"'.format(hashlib.sha256(html.encode("utf-8")).hexdigest()[:16])
+            headers = {"etag": etag, "cache-control": REVALIDATE_CACHE}
+            if self._etag_matches(request_headers, etag):
+                return Response(status_code=304, headers=headers)
+            return Response(html, status_code=status_code, media_type="text/html", headers=headers)
+
+        # 比源文件旧的预压缩文件已过期（源文件在服务运行中被修改），不再使用
+        variants = [(str(full_path) + ext, encoding) for ext, encoding in VARIANTS
+                    if _is_fresh_variant(str(full_path) + ext, stat_result)]
+        selected = None
+        if variants and "range" not in request_headers:
+            accepted = _parse_accept_encoding(request_headers.get("accept-encoding", ""))
+            for variant, encoding in variants:
+                if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                    selected = (variant, encoding)
+                    break
+
+        etag = self.index.etag(rel, selected[1] if selected else None)
+        headers = {"etag": etag, "cache-control": self._cache_control(scope, rel)} if etag else {}
+        if variants:
+            headers["vary"] = "Accept-Encoding"
+        if etag and self._etag_matches(request_headers, etag):
+            return Response(status_code=304, headers=headers)
+
+        if selected:
+            variant, encoding = selected
+            response = super().file_response(variant, os.stat(variant), scope, status_code)
+            response.headers["content-encoding"] = encoding
+            media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+            if media_type.startswith("text/"):
+                media_type += "; charset=utf-8"
+            response.headers["content-type"] = media_type
+        else:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+
+        response.headers.update(headers)
+        response.headers["cache-control"] = self._cache_control(scope, rel)
+        response.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        return response
+
+    @staticmethod
+    def _etag_matches(request_headers, etag):
+        return etag in [t.strip() for t in request_headers.get("if-none-match", "").split(",")]
+
+    def _cache_control(self, scope, rel):
+        query = scope.get("query_string", b"").decode("latin-1")
+        digest = self.index.digest(rel)
+        if digest and f"v={digest}" in query:
+            return IMMUTABLE_CACHE
+        return REVALIDATE_CACHE
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# 添加 web_demo 目录到 Python 路径，以便导入 voiceapi
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
+
+from voiceapi.tts import get_audio, get_audio_stream, TTSEngineManager
+
+# 对比整句 TTS 与流式 TTS 的首包音频延迟（time-to-first-audio）
+sentences = [
+    "你好，我是你的数字人助手，很高兴认识你。",
+    "今天天气不错，我们可以一起出去走走，顺便聊聊最近的新闻。",
+    "当夜幕降临，星光点点，伴随着微风拂面，我在静谧中感受着时光的流转。",
+]
+
+
+async def measure(rounds):
+    whole, stream = [], []
+    for _ in range(rounds):
+        for text in sentences:
+            st = time.time()
+            await get_audio(text)
+            whole.append(time.time() - st)
+
+            # 只记首块时间，但把流读完，避免合成仍在后台进行、与下一轮重叠
+            st = time.time()
+            first = None
+            async for _ in get_audio_stream(text):
+                if first is None:
+                    first = time.time() - st
+            stream.append(first)
+    return whole, stream
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models-root", type=str, default=os.path.join(os.path.dirname(script_dir), "models"))
+    parser.add_argument("--tts-model", type=str, default="sherpa-onnx-vits-zh-ll")
+    parser.add_argument("--tts-provider", type=str, default="cpu")
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    TTSEngineManager.initialize(args=args)
+    whole, stream = asyncio.run(measure(args.rounds))
+    print(f"whole sentence : mean {sum(whole) / len(whole) * 1000:.1f} ms, max {max(whole) * 1000:.1f} ms")
+    print(f"streaming      : mean {sum(stream) / len(stream) * 1000:.1f} ms, max {max(stream) * 1000:.1f} ms")
@@ -7,6 +7,8 @@ import os
 import asyncio
 import numpy as np
 import threading
+import queue
+from voiceapi.metrics import asr_partial_latency, asr_final_latency
 logger = logging.getLogger(__file__)
 _asr_engines = {}
 
@@ -20,100 +22,262 @@ class ASRResult:
     def to_dict(self):
         return {"text": self.text, "finished": self.finished, "idx": self.idx}
 
-import wave
+class OnlineDecodeScheduler:
+    """
+    流式 ASR 解码调度线程：所有会话的 OnlineStream 都由这一个线程操作，
+    每个 tick 收集所有就绪的流，用 decode_streams 一次性批量解码，
+    再把结果投递回各会话所在事件循环的 outbuf，避免解码阻塞 uvicorn 事件循环。
+    """
+
+    def __init__(self, recognizer: sherpa_onnx.OnlineRecognizer, interval: float = 0.01) -> None:
+        self.recognizer = recognizer
+        self.interval = interval
+        self.commands = queue.Queue()
+        self.sessions = set()
+        self.thread = threading.Thread(target=self._run, name="asr-decode", daemon=True)
+        self.thread.start()
+
+    def submit(self, session, command, samples=None):
+        self.commands.put((session, command, samples, time.time()))
+
+    def _apply(self, session, command, samples, submitted, touched):
+        if command == "open":
+            session.stream = self.recognizer.create_stream()
+            self.sessions.add(session)
+        elif command == "close":
+            self.sessions.discard(session)
+            touched.discard(session)
+        elif session not in self.sessions:
+            return
+        elif command == "vad":
+            session.post(ASRResult("", True, -1))
+            self.recognizer.reset(session.stream)
+        elif command == "audio":
+            session.stream.accept_waveform(session.sample_rate, samples)
+            if session not in touched:
+                session.audio_since = submitted
+                touched.add(session)
+
+    def _drop(self, session, touched, error):
+        # 出错的会话不再解码，并结束其结果队列，其他会话不受影响
+        logger.exception(f"asr: drop stream after decode error: {error}")
+        self.sessions.discard(session)
+        touched.discard(session)
+        session.post(None)
+
+    def _safe_apply(self, session, command, samples, submitted, touched):
+        try:
+            self._apply(session, command, samples, submitted, touched)
+        except Exception as e:
+            self._drop(session, touched, e)
+
+    def _decode(self, touched):
+        ready = [s for s in touched if self.recognizer.is_ready(s.stream)]
+        while ready:
+            try:
+                self.recognizer.decode_streams([s.stream for s in ready])
+            except Exception:
+                # 批量解码失败时逐个重试，找出出错的流
+                for session in ready:
+                    try:
+                        if self.recognizer.is_ready(session.stream):
+                            self.recognizer.decode_stream(session.stream)
+                    except Exception as e:
+                        self._drop(session, touched, e)
+            ready = [s for s in ready if s in touched and self.recognizer.is_ready(s.stream)]
+
+    def _run(self):
+        while True:
+            try:
+                item = self.commands.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            touched = set()
+            self._safe_apply(*item, touched)
+            # 取出当前积压的全部命令，合并到同一个 tick 里处理
+            while True:
+                try:
+                    item = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                self._safe_apply(*item, touched)
+
+            self._decode(touched)
+
+            for session in list(touched):
+                try:
+                    session.on_decoded(self.recognizer)
+                except Exception as e:
+                    self._drop(session, touched, e)
+
+
+class OfflineDecodePool:
+    """
+    非流式 ASR（SenseVoice/Paraformer/Whisper）的解码线程池：各会话 VAD 切出的语音段
+    统一排队，每个工作线程一次取出多个会话的语音段，用 decode_streams 批量解码，
+    再按会话内的顺序把结果送回事件循环，并记录每段的排队+解码延迟。
+    """
+
+    def __init__(self, recognizer: sherpa_onnx.OfflineRecognizer, num_workers: int = 2, max_batch: int = 8) -> None:
+        self.recognizer = recognizer
+        self.max_batch = max_batch
+        self.jobs = queue.Queue()
+        self.threads = [threading.Thread(target=self._run, name=f"asr-offline-{i}", daemon=True)
+                        for i in range(num_workers)]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, session, seq: int, segments: List[np.ndarray], round_end: bool):
+        self.jobs.put((session, seq, segments, round_end, time.time()))
+
+    def _run(self):
+        while True:
+            batch = [self.jobs.get()]
+            segment_count = len(batch[0][2])
+            while segment_count < self.max_batch:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(job)
+                segment_count += len(job[2])
+
+            try:
+                streams = []
+                for session, _, segments, _, _ in batch:
+                    for samples in segments:
+                        stream = self.recognizer.create_stream()
+                        stream.accept_waveform(session.sample_rate, samples)
+                        streams.append(stream)
+                st = time.time()
+                if streams:
+                    self.recognizer.decode_streams(streams)
+                done = time.time()
+                texts = iter([stream.result.text.strip() for stream in streams])
+            except Exception:
+                # 整批按空结果交付，保证各会话的 next_seq 继续推进
+                logger.exception(f"asr: offline decode failed for {segment_count} segments")
+                done = time.time()
+                for session, seq, segments, round_end, enqueued in batch:
+                    session.loop.call_soon_threadsafe(session.deliver, seq, [""] * len(segments), round_end,
+                                                      done - enqueued)
+                continue
+
+            for session, seq, segments, round_end, enqueued in batch:
+                results = [next(texts) for _ in segments]
+                for samples, text in zip(segments, results):
+                    logger.info(f'asr: {len(samples) / session.sample_rate:.2f}s segment "{text}" '
+                                f'latency {(done - enqueued) * 1000:.0f}ms '
+                                f'(decode {(done - st) * 1000:.0f}ms, batch {len(streams)})')
+                session.loop.call_soon_threadsafe(session.deliver, seq, results, round_end, done - enqueued)
+
+
 class ASRStream:
-    def __init__(self, recognizer: Union[sherpa_onnx.OnlineRecognizer | sherpa_onnx.OfflineRecognizer], sample_rate: int) -> None:
+    def __init__(self, recognizer: Union[sherpa_onnx.OnlineRecognizer | sherpa_onnx.OfflineRecognizer], sample_rate: int,
+                 scheduler: Union[OnlineDecodeScheduler, OfflineDecodePool, None] = None) -> None:
         self.recognizer = recognizer
         self.inbuf = asyncio.Queue()
         self.outbuf = asyncio.Queue()
         self.sample_rate = sample_rate
         self.is_closed = False
         self.online = isinstance(recognizer, sherpa_onnx.OnlineRecognizer)
+        self.scheduler = scheduler
+        # 以下状态只在解码调度线程中访问
+        self.stream = None
+        self.last_result = ""
+        self.segment_id = 0
+        self.audio_since = 0.0
+        # 非流式模式下按提交顺序交付解码结果
+        self.next_seq = 0
+        self.pending = {}
 
     async def start(self):
+        self.loop = asyncio.get_running_loop()
         if self.online:
-            asyncio.create_task(self.run_online())
+            logger.info('asr: start real-time recognizer')
+            self.scheduler.submit(self, "open")
         else:
             asyncio.create_task(self.run_offline())
 
-    async def run_online(self):
-        stream = self.recognizer.create_stream()
-        last_result = ""
-        segment_id = 0
-        gggg = 0
-        print('asr: start real-time recognizer')
-        while not self.is_closed:
-            samples = await self.inbuf.get()
-            gggg += len(samples)
-            print("AAAAA", gggg)
-
-            if isinstance(samples, str) and samples == "vad":
-                print("VAD detected")
-
-                self.outbuf.put_nowait(
-                    ASRResult("", True, -1))
-                self.recognizer.reset(stream)
-                continue
-
-            stream.accept_waveform(self.sample_rate, samples)
-            while self.recognizer.is_ready(stream):
-                self.recognizer.decode_stream(stream)
+    def post(self, result: ASRResult):
+        # 由解码调度线程调用，把结果交回事件循环
+        self.loop.call_soon_threadsafe(self.outbuf.put_nowait, result)
 
-            is_endpoint = self.recognizer.is_endpoint(stream)
-            result = self.recognizer.get_result(stream)
+    def on_decoded(self, recognizer: sherpa_onnx.OnlineRecognizer):
+        is_endpoint = recognizer.is_endpoint(self.stream)
+        result = recognizer.get_result(self.stream)
 
-            print("AAAAA2", is_endpoint, result)
+        latency = time.time() - self.audio_since
 
-            if result and (last_result != result):
-                last_result = result
-                print(f' > {segment_id}:{result}')
-                self.outbuf.put_nowait(
-                    ASRResult(result, False, segment_id))
+        if result and (self.last_result != result):
+            self.last_result = result
+            asr_partial_latency.observe(latency)
+            self.post(ASRResult(result, False, self.segment_id))
 
-            if is_endpoint:
-                if result:
-                    print(f'{segment_id}: {result}')
-                    self.outbuf.put_nowait(
-                        ASRResult(result, True, segment_id))
-                    segment_id += 1
-                self.recognizer.reset(stream)
+        if is_endpoint:
+            if result:
+                asr_final_latency.observe(latency)
+                logger.info(f'{self.segment_id}: {result}')
+                self.post(ASRResult(result, True, self.segment_id))
+                self.segment_id += 1
+            recognizer.reset(self.stream)
 
     async def run_offline(self):
-        vad = _asr_engines['vad']
-        segment_id = 0
-        st = None
+        # 每个会话独立的 VAD，共享同一份模型配置
+        vad = create_vad(_asr_engines['vad_config'])
+        seq = 0
         while not self.is_closed:
             samples = await self.inbuf.get()
-            vad.accept_waveform(samples)
+            if samples is None:
+                break
+            round_end = isinstance(samples, str) and samples == "vad"
+            if round_end:
+                vad.flush()
+            else:
+                vad.accept_waveform(samples)
+            segments = []
             while not vad.empty():
-                if not st:
-                    st = time.time()
-                stream = self.recognizer.create_stream()
-                stream.accept_waveform(self.sample_rate, vad.front.samples)
-
+                segments.append(np.array(vad.front.samples, dtype=np.float32))
                 vad.pop()
-                self.recognizer.decode_stream(stream)
-
-                result = stream.result.text.strip()
+            if segments or round_end:
+                self.scheduler.submit(self, seq, segments, round_end)
+                seq += 1
+
+    def deliver(self, seq: int, results: List[str], round_end: bool, latency: float):
+        # 在事件循环中调用；多个工作线程可能乱序完成，这里按 seq 重新排序
+        self.pending[seq] = (results, round_end, latency)
+        while self.next_seq in self.pending:
+            results, round_end, latency = self.pending.pop(self.next_seq)
+            self.next_seq += 1
+            for result in results:
                 if result:
-                    duration = time.time() - st
-                    print(f'{segment_id}:{result} ({duration:.2f}s)')
-                    self.outbuf.put_nowait(ASRResult(result, True, segment_id))
-                    segment_id += 1
-            st = None
+                    asr_final_latency.observe(latency)
+                    self.outbuf.put_nowait(ASRResult(result, True, self.segment_id))
+                    self.segment_id += 1
+            if round_end:
+                self.outbuf.put_nowait(ASRResult("", True, -1))
 
     async def close(self):
         self.is_closed = True
+        if self.online:
+            self.scheduler.submit(self, "close")
+        else:
+            self.inbuf.put_nowait(None)
         self.outbuf.put_nowait(None)
 
     async def write(self, pcm_bytes: bytes):
         pcm_data = np.frombuffer(pcm_bytes, dtype=np.int16)
         samples = pcm_data.astype(np.float32) / 32768.0
-        self.inbuf.put_nowait(samples)
+        if self.online:
+            self.scheduler.submit(self, "audio", samples)
+        else:
+            self.inbuf.put_nowait(samples)
 
     async def vad_touched(self):
-        samples = "vad"
-        self.inbuf.put_nowait(samples)
+        if self.online:
+            self.scheduler.submit(self, "vad")
+        else:
+            self.inbuf.put_nowait("vad")
 
     async def read(self) -> ASRResult:
         return await self.outbuf.get()
@@ -257,16 +421,16 @@ def load_asr_engine(samplerate: int, args) -> sherpa_onnx.OnlineRecognizer:
         cache_engine = create_zipformer(samplerate, args)
     elif args.asr_model == 'sensevoice':
         cache_engine = create_sensevoice(samplerate, args)
-        _asr_engines['vad'] = load_vad_engine(samplerate, args)
+        _asr_engines['vad_config'] = load_vad_config(samplerate, args)
     elif args.asr_model == 'paraformer-trilingual':
         cache_engine = create_paraformer_trilingual(samplerate, args)
-        _asr_engines['vad'] = load_vad_engine(samplerate, args)
+        _asr_engines['vad_config'] = load_vad_config(samplerate, args)
     elif args.asr_model == 'paraformer-en':
         cache_engine = create_paraformer_en(samplerate, args)
-        _asr_engines['vad'] = load_vad_engine(samplerate, args)
+        _asr_engines['vad_config'] = load_vad_config(samplerate, args)
     elif args.asr_model.startswith('whisper-'):
         cache_engine = create_whisper(samplerate, args)
-        _asr_engines['vad'] = load_vad_engine(samplerate, args)  # Use VAD for offline processing
+        _asr_engines['vad_config'] = load_vad_config(samplerate, args)  # Use VAD for offline processing
     else:
         raise ValueError(f"asr: unknown model {args.asr_model}")
     _asr_engines[args.asr_model] = cache_engine
@@ -274,7 +438,7 @@ def load_asr_engine(samplerate: int, args) -> sherpa_onnx.OnlineRecognizer:
     return cache_engine
 
 
-def load_vad_engine(samplerate: int, args, min_silence_duration: float = 0.25, buffer_size_in_seconds: int = 100) -> sherpa_onnx.VoiceActivityDetector:
+def load_vad_config(samplerate: int, args, min_silence_duration: float = 0.25) -> sherpa_onnx.VadModelConfig:
     config = sherpa_onnx.VadModelConfig()
     d = os.path.join(args.models_root, 'silero_vad')
     if not os.path.exists(d):
@@ -284,23 +448,31 @@ def load_vad_engine(samplerate: int, args, min_silence_duration: float = 0.25, b
     config.silero_vad.min_silence_duration = min_silence_duration
     config.sample_rate = samplerate
     config.provider = args.asr_provider
-    config.num_threads = args.threads
+    # 每个会话各有一个 VAD，单线程即可
+    config.num_threads = 1
+    if not config.validate():
+        raise ValueError("vad: invalid config")
+    return config
+
 
-    vad = sherpa_onnx.VoiceActivityDetector(
+def create_vad(config: sherpa_onnx.VadModelConfig, buffer_size_in_seconds: int = 100) -> sherpa_onnx.VoiceActivityDetector:
+    return sherpa_onnx.VoiceActivityDetector(
         config,
         buffer_size_in_seconds=buffer_size_in_seconds)
-    return vad
+
+
+def load_vad_engine(samplerate: int, args, min_silence_duration: float = 0.25, buffer_size_in_seconds: int = 100) -> sherpa_onnx.VoiceActivityDetector:
+    return create_vad(load_vad_config(samplerate, args, min_silence_duration), buffer_size_in_seconds)
 
 
 async def start_asr_stream(samplerate: int, args) -> ASRStream:
     """
     Start a ASR stream
     """
-    print(samplerate, args)
     # 获取全局共享的ASR引擎
     asr_engine = ASREngineManager.get_engine()
 
-    stream = ASRStream(asr_engine, samplerate)
+    stream = ASRStream(asr_engine, samplerate, ASREngineManager.get_scheduler())
     await stream.start()
     return stream
 
@@ -314,6 +486,7 @@ class ASREngineManager:
             if not cls._instance:
                 cls._instance = super().__new__(cls)
                 cls._instance.engine = None
+                cls._instance.scheduler = None
             return cls._instance
 
     @classmethod
@@ -321,6 +494,15 @@ class ASREngineManager:
         instance = cls()
         if instance.engine is None:  # 安全访问属性
             instance.engine = load_asr_engine(samplerate, args)
+            if isinstance(instance.engine, sherpa_onnx.OnlineRecognizer):
+                instance.scheduler = OnlineDecodeScheduler(instance.engine)
+            else:
+                instance.scheduler = OfflineDecodePool(instance.engine, num_workers=getattr(args, 'asr_workers', 2))
+
+    @classmethod
+    def get_scheduler(cls):
+        instance = cls()
+        return instance.scheduler
 
     @classmethod
     def get_engine(cls):
@@ -0,0 +1,82 @@
+import logging
+import threading
+import uuid
+from typing import *
+
+from voiceapi.metrics import Counter, register
+logger = logging.getLogger(__file__)
+
+discarded_tts_cpu = register(Counter("tts_discarded_cpu_seconds_total", "CPU time spent synthesising audio that was cancelled before being sent."))
+cancelled_turns = register(Counter("conversation_cancelled_turns_total", "Responses cancelled by barge-in, a newer request or a client disconnect."))
+
+
+class Turn:
+    """
+    一次 /eb_stream 回答：持有取消标志和上游 LLM 流。
+    cancelled 是 threading.Event，TTS 线程和事件循环都可以检查。
+    """
+
+    def __init__(self, conversation_id: str) -> None:
+        self.conversation_id = conversation_id
+        self.cancelled = threading.Event()
+        self.llm_stream = None
+
+    def cancel(self, reason: str = ""):
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        cancelled_turns.inc()
+        logger.info(f"conversation {self.conversation_id}: turn cancelled ({reason})")
+        stream, self.llm_stream = self.llm_stream, None
+        if stream is not None:
+            try:
+                # openai 的 Stream 会关闭底层 HTTP 连接；生成器则在下一次 next 时结束
+                stream.close()
+            except Exception:
+                pass
+
+    def add_discarded_cpu(self, seconds: float):
+        discarded_tts_cpu.inc(seconds)
+
+
+class ConversationRegistry:
+    """
+    conversation_id -> 正在进行的 Turn。ASR 会话和 /eb_stream 请求通过同一个 id 关联，
+    用户打断（vad）、新一轮请求或断开连接时取消该会话上仍在运行的回答。
+    """
+
+    def __init__(self) -> None:
+        self._turns: Dict[str, Set[Turn]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def start_turn(self, conversation_id: Optional[str]) -> Turn:
+        conversation_id = conversation_id or self.new_id()
+        # 同一会话只保留最新的回答
+        self.cancel(conversation_id, "superseded")
+        turn = Turn(conversation_id)
+        with self._lock:
+            self._turns.setdefault(conversation_id, set()).add(turn)
+        return turn
+
+    def finish_turn(self, turn: Turn):
+        with self._lock:
+            turns = self._turns.get(turn.conversation_id)
+            if turns is not None:
+                turns.discard(turn)
+                if not turns:
+                    del self._turns[turn.conversation_id]
+
+    def cancel(self, conversation_id: Optional[str], reason: str = ""):
+        if not conversation_id:
+            return
+        with self._lock:
+            turns = list(self._turns.get(conversation_id, ()))
+        for turn in turns:
+            turn.cancel(reason)
+
+
+conversations = ConversationRegistry()
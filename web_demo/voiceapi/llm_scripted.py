@@ -0,0 +1,21 @@
+import time
+from types import SimpleNamespace
+
+# 本地脚本化的 LLM 替身：不访问网络，按固定节奏逐字返回预设回答，
+# 返回结构与 openai 流式接口一致（chunk.choices[0].delta.content），用于压测。
+SCRIPTED_ANSWER = "你好，我是你的数字人助手。今天天气不错，适合出去走走，也可以在家里看看书，听听音乐。有什么我可以帮你的吗？"
+
+first_token_delay = 0.3
+token_interval = 0.02
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def llm_stream(prompt):
+    time.sleep(first_token_delay)
+    for i, char in enumerate(SCRIPTED_ANSWER):
+        if i:
+            time.sleep(token_interval)
+        yield _chunk(char)
@@ -0,0 +1,165 @@
+import json
+import time
+import threading
+import uuid
+from typing import *
+
+# 延迟直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    线程安全的累积直方图，按 Prometheus 文本格式输出（_bucket / _sum / _count）。
+    """
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+            cumulative = 0
+            for bound, c in zip(self.buckets, self.counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+            lines.append(f"{self.name}_sum {self.sum}")
+            lines.append(f"{self.name}_count {self.count}")
+        return "\n".join(lines)
+
+
+class Counter:
+    """
+    线程安全的单调递增计数器（Prometheus counter）。
+    """
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> str:
+        with self._lock:
+            return f"# HELP {self.name} {self.help}\n# TYPE {self.name} counter\n{self.name} {self.value}"
+
+
+class Collector:
+    """
+    抓取时才计算的带标签指标：collect() 返回 [(labels, value)]，例如按会话统计的值。
+    """
+
+    def __init__(self, name: str, help: str, collect: Callable[[], List[Tuple[Dict[str, str], float]]],
+                 type: str = "gauge") -> None:
+        self.name = name
+        self.help = help
+        self.type = type
+        self.collect = collect
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self.collect():
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{self.name}{{{label_str}}} {value}" if label_str else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+class Timer:
+    """
+    with Timer(hist, trace, "tts_synthesis"): ...
+    结束时把耗时记入直方图，并可选写入会话 trace。
+    """
+
+    def __init__(self, hist: Histogram, trace: Optional["SessionTrace"] = None, name: str = "") -> None:
+        self.hist = hist
+        self.trace = trace
+        self.name = name or hist.name
+
+    def __enter__(self):
+        self.st = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.st
+        self.hist.observe(self.elapsed)
+        if self.trace is not None:
+            self.trace.mark(self.name, self.elapsed)
+        return False
+
+
+asr_partial_latency = Histogram("asr_partial_latency_seconds", "Time from audio arrival to a partial ASR result.")
+asr_final_latency = Histogram("asr_final_latency_seconds", "Time from audio arrival to a finished ASR segment.")
+llm_first_token = Histogram("llm_time_to_first_token_seconds", "Time from prompt submission to the first LLM token.")
+sentence_split_delay = Histogram("sentence_split_delay_seconds", "Time a sentence waits for its terminating punctuation.")
+tts_synthesis = Histogram("tts_synthesis_seconds", "Time spent in TTS generate per call.")
+tts_encode = Histogram("tts_resample_encode_seconds", "Time spent resampling and WAV/base64 encoding TTS audio.")
+first_audio = Histogram("time_to_first_audio_byte_seconds", "Time from /eb_stream request to the first audio chunk.")
+
+ALL_METRICS = [asr_partial_latency, asr_final_latency, llm_first_token, sentence_split_delay,
+               tts_synthesis, tts_encode, first_audio]
+
+
+def register(metric):
+    ALL_METRICS.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    return "\n".join(h.render() for h in ALL_METRICS) + "\n"
+
+
+_trace_file = None
+_trace_lock = threading.Lock()
+
+
+def set_trace_file(path: Optional[str]):
+    """
+    设置会话 trace 日志文件（JSON Lines）；为 None 时不记录。
+    """
+    global _trace_file
+    _trace_file = path
+
+
+class SessionTrace:
+    """
+    单次请求/会话的延迟记录，close 时以一行 JSON 追加到 trace 文件。
+    """
+
+    def __init__(self, kind: str, session_id: Optional[str] = None) -> None:
+        self.kind = kind
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self.start = time.time()
+        self.events = []
+
+    def mark(self, name: str, value: float):
+        self.events.append({"name": name, "t": round(time.time() - self.start, 4), "value": round(value, 4)})
+
+    def close(self):
+        if _trace_file is None:
+            return
+        record = {"kind": self.kind, "session": self.session_id, "start": self.start, "events": self.events}
+        with _trace_lock:
+            with open(_trace_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
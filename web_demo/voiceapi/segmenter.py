@@ -0,0 +1,87 @@
+from typing import *
+
+# 可以断句的标点；空格只在句子过长需要强制切分时使用
+PUNCTUATION_SET = {
+    '，', '。', '！', '？', '；', '：', '、', '（', '）', '【', '】', '“', '”', '…',
+    ',', '.', '!', '?', ';', ':', '(', ')', '[', ']', '"', "'"
+}
+SOFT_BREAKS = {' ', '\n'}
+
+
+class SentenceSegmenter:
+    """
+    LLM 流式输出的增量断句器：每次 feed 只扫描新到的文字。
+
+    断句策略随回答推进而变化：第一句只要达到 first_min_length 个字就在标点处切出，
+    尽快送去 TTS 降低首包延迟；之后每切出一句，最短句长乘以 growth，直到 max_min_length，
+    让后面的句子更长、韵律更自然，同时 TTS 队列不断档。
+    超过 max_length 仍没有标点时，在最后一个空格/换行处（没有则直接）强制切分。
+    """
+
+    def __init__(self, first_min_length: int = 5, growth: float = 2.0, max_min_length: int = 24,
+                 max_length: int = 60, punctuation: Set[str] = PUNCTUATION_SET) -> None:
+        self.punctuation = punctuation
+        self.growth = growth
+        self.max_min_length = max_min_length
+        self.max_length = max_length
+        self.min_length = first_min_length
+        self._buffer = ""
+        self._scanned = 0
+        self._last_soft = -1
+
+    @property
+    def pending(self) -> str:
+        return self._buffer
+
+    def feed(self, text: str) -> List[str]:
+        """
+        追加新文字，返回本次可以送去合成的完整句子（可能为空）。
+        """
+        self._buffer += text
+        sentences = []
+        i = self._scanned
+        while i < len(self._buffer):
+            char = self._buffer[i]
+            if char in self.punctuation and i + 1 >= self.min_length:
+                sentences.append(self._cut(i + 1))
+                i = 0
+                continue
+            if char in SOFT_BREAKS:
+                self._last_soft = i
+            if i + 1 >= self.max_length:
+                cut = self._last_soft + 1 if self._last_soft > 0 else i + 1
+                sentences.append(self._cut(cut))
+                i = 0
+                continue
+            i += 1
+        self._scanned = len(self._buffer)
+        return sentences
+
+    def flush(self) -> str:
+        """
+        回答结束，返回剩余未成句的文字并重置状态。
+        """
+        rest = self._buffer
+        self._buffer = ""
+        self._scanned = 0
+        self._last_soft = -1
+        return rest
+
+    def _cut(self, end: int) -> str:
+        sentence, self._buffer = self._buffer[:end], self._buffer[end:]
+        self._last_soft = -1
+        self.min_length = min(int(self.min_length * self.growth), self.max_min_length)
+        return sentence
+
+
+def split_sentence(text: str, min_length: int = 10) -> List[str]:
+    """
+    一次性切分完整文本（非流式场景），句长不少于 min_length，丢弃少于 2 个字的尾巴。
+    """
+    segmenter = SentenceSegmenter(first_min_length=min_length, growth=1.0,
+                                  max_min_length=min_length, max_length=max(60, min_length * 4))
+    sentences = segmenter.feed(text)
+    rest = segmenter.flush()
+    if len(rest) >= 2:
+        sentences.append(rest)
+    return sentences
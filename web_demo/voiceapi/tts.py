@@ -5,13 +5,13 @@ import sherpa_onnx
 import logging
 import numpy as np
 import asyncio
-import time
 import soundfile
-from scipy.signal import resample
+from scipy.signal import resample, firwin, lfilter
 import io
 import re
 import threading
 import base64
+from voiceapi.metrics import Timer, tts_synthesis, tts_encode
 logger = logging.getLogger(__file__)
 
 splitter = re.compile(r'[,，。.!?！？;；、\n]')
@@ -115,46 +115,174 @@ class TTSEngineManager:
         return instance.engine,instance.original_sample_rate  # 安全访问属性
 
 
-async def get_audio(text, voice_speed=1.0, voice_id=0, target_sample_rate = 16000):
-    print("run_tts", text, voice_speed, voice_id)
-    # 获取全局共享的ASR引擎
-    tts_engine,original_sample_rate = TTSEngineManager.get_engine()
+def _resample(samples, original_sample_rate, target_sample_rate):
+    if target_sample_rate == original_sample_rate:
+        return np.asarray(samples, dtype=np.float32)
+    num_samples = int(len(samples) * target_sample_rate / original_sample_rate)
+    return resample(samples, num_samples).astype(np.float32)
 
-    # 将同步方法放入线程池执行
-    loop = asyncio.get_event_loop()
-    audio = await loop.run_in_executor(
-        None,
-        lambda: tts_engine.generate(text, voice_id, voice_speed)
-    )
-    # audio = tts_engine.generate(text, voice_id, voice_speed)
-    samples = audio.samples
-    if target_sample_rate != original_sample_rate:
-        num_samples = int(
-            len(samples) * target_sample_rate / original_sample_rate)
-        resampled_chunk = resample(samples, num_samples)
-        audio.samples = resampled_chunk.astype(np.float32)
-        audio.sample_rate = target_sample_rate
 
+class StreamResampler:
+    """
+    流式重采样：逐块输入、逐块输出，块与块之间保留滤波器状态和插值位置，
+    拼接结果与整段重采样一致，不会在块边界产生 FFT 重采样的振铃/爆音。
+    降采样时先用 FIR 低通（lfilter 携带 zi）抗混叠，再按固定步长线性插值。
+    """
+
+    def __init__(self, original_sample_rate, target_sample_rate, num_taps=63):
+        self.step = original_sample_rate / target_sample_rate
+        self.passthrough = original_sample_rate == target_sample_rate
+        self.fir = None
+        if target_sample_rate < original_sample_rate:
+            self.fir = firwin(num_taps, 0.9 * target_sample_rate / original_sample_rate)
+            self.zi = np.zeros(num_taps - 1)
+        self.prev = None  # 上一块最后一个样本（滤波后）
+        self.pos = 0.0  # 下一个输出样本的位置，以 prev 为 0 计
+
+    def process(self, samples):
+        if self.passthrough:
+            return np.asarray(samples, dtype=np.float32)
+        x = np.asarray(samples, dtype=np.float64)
+        if len(x) == 0:
+            return np.zeros(0, dtype=np.float32)
+        if self.fir is not None:
+            x, self.zi = lfilter(self.fir, 1.0, x, zi=self.zi)
+        if self.prev is not None:
+            x = np.concatenate([[self.prev], x])
+        last = len(x) - 1
+        n = int(np.floor((last - self.pos) / self.step)) + 1 if last >= self.pos else 0
+        t = self.pos + np.arange(n) * self.step
+        out = np.interp(t, np.arange(len(x)), x)
+        self.pos += n * self.step - last
+        self.prev = x[-1]
+        return out.astype(np.float32)
+
+
+def _wav_base64(samples, sample_rate):
     output = io.BytesIO()
     # 使用 soundfile 写入 WAV 格式数据（自动生成头部）
     soundfile.write(
         output,
-        audio.samples,  # 音频数据（numpy 数组）
-        samplerate=audio.sample_rate,  # 采样率（如 16000）
+        samples,  # 音频数据（numpy 数组）
+        samplerate=sample_rate,  # 采样率（如 16000）
         subtype="PCM_16",  # 16-bit PCM 编码
         format="WAV"  # WAV 容器格式
     )
-
     # 获取字节数据并 Base64 编码
-    wav_data = output.getvalue()
-    return base64.b64encode(wav_data).decode("utf-8")
-
-    # import wave
-    # import uuid
-    # with wave.open('{}.wav'.format(uuid.uuid4()), 'w') as f:
-    #     f.setnchannels(1)
-    #     f.setsampwidth(2)
-    #     f.setframerate(16000)
-    #     f.writeframes(samples)
-    # return base64.b64encode(samples).decode('utf-8')
+    return base64.b64encode(output.getvalue()).decode("utf-8")
+
+
+def split_clauses(text, min_length=4):
+    """
+    按 splitter 把一句话切成若干小句（保留标点），过短的小句并入下一句，
+    用于流式 TTS：每个小句单独合成，先合成完的先发送。
+    """
+    clauses = []
+    current = ""
+    last = 0
+    for m in splitter.finditer(text):
+        current += text[last:m.end()]
+        last = m.end()
+        if len(current.strip()) >= min_length:
+            clauses.append(current)
+            current = ""
+    current += text[last:]
+    if current.strip():
+        if clauses and len(current.strip()) < min_length:
+            clauses[-1] += current
+        else:
+            clauses.append(current)
+    return clauses
+
+
+def _is_cancelled(turn):
+    return turn is not None and turn.cancelled.is_set()
+
+
+async def get_audio(text, voice_speed=1.0, voice_id=0, target_sample_rate = 16000, trace=None, turn=None):
+    """
+    turn 为 conversation.Turn：排队中的任务被取消后直接跳过，合成中途取消则通过 callback 停止，
+    返回空字符串。
+    """
+    # 获取全局共享的ASR引擎
+    tts_engine,original_sample_rate = TTSEngineManager.get_engine()
+
+    def synthesize():
+        if _is_cancelled(turn):
+            return None
+        cpu = time.thread_time()
+        with Timer(tts_synthesis, trace):
+            audio = tts_engine.generate(text, voice_id, voice_speed,
+                                        callback=lambda samples, progress: 0 if _is_cancelled(turn) else 1)
+        if _is_cancelled(turn):
+            turn.add_discarded_cpu(time.thread_time() - cpu)
+            return None
+        return audio
+
+    # 将同步方法放入线程池执行
+    loop = asyncio.get_event_loop()
+    audio = await loop.run_in_executor(None, synthesize)
+    if audio is None:
+        return ""
+    with Timer(tts_encode, trace):
+        samples = _resample(audio.samples, original_sample_rate, target_sample_rate)
+        return _wav_base64(samples, target_sample_rate)
+
+
+async def get_audio_stream(text, voice_speed=1.0, voice_id=0, target_sample_rate = 16000, trace=None, turn=None):
+    """
+    流式 TTS：把句子按 splitter 切成小句，逐句合成，并通过 generate 的 callback
+    在合成过程中把已生成的音频块送回事件循环，用 StreamResampler 连续地边重采样边返回。
+    每次 yield (小句文本, base64 WAV)，同一小句可能分多块返回，文本只随第一块返回。
+    turn 被取消后停止合成并结束迭代。
+    """
+    tts_engine, original_sample_rate = TTSEngineManager.get_engine()
+    loop = asyncio.get_event_loop()
+    st = time.time()
+    first_audio = None
+    # 整个回复共用一个重采样器，小句之间也保持连续
+    resampler = StreamResampler(original_sample_rate, target_sample_rate)
+
+    for clause in split_clauses(text):
+        if _is_cancelled(turn):
+            return
+        queue = asyncio.Queue()
+
+        def on_samples(samples, progress, queue=queue):
+            # 在 TTS 线程中调用，拷贝后交给事件循环
+            chunk = np.array(samples, dtype=np.float32)
+            loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            return 0 if _is_cancelled(turn) else 1
+
+        def synthesize(clause=clause, queue=queue):
+            cpu = time.thread_time()
+            try:
+                if _is_cancelled(turn):
+                    return
+                with Timer(tts_synthesis, trace):
+                    tts_engine.generate(clause, voice_id, voice_speed, callback=on_samples)
+            finally:
+                if _is_cancelled(turn):
+                    turn.add_discarded_cpu(time.thread_time() - cpu)
+                loop.call_soon_threadsafe(queue.put_nowait, None)
 
+        job = loop.run_in_executor(None, synthesize)
+        clause_text = clause
+        while True:
+            chunk = await queue.get()
+            if chunk is None or _is_cancelled(turn):
+                break
+            with Timer(tts_encode, trace):
+                samples = resampler.process(chunk)
+                base64_string = _wav_base64(samples, target_sample_rate) if len(samples) else None
+            if base64_string is None:
+                continue
+            if first_audio is None:
+                first_audio = time.time() - st
+                logger.info(f"tts: first audio in {first_audio:.3f}s ({len(text)} chars)")
+            yield clause_text, base64_string
+            clause_text = ""
+        if _is_cancelled(turn):
+            return
+        await job
+    logger.info(f"tts: stream finished in {time.time() - st:.3f}s ({len(text)} chars)")